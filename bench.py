@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for pyreq2rpm.  Run all of them with "./bench.py",
+# or name the ones to run: "./bench.py versions".
+
+import os
+import sys
+import timeit
+import warnings
+from pyreq2rpm import pyreq2rpm
+
+# The corpus helper is imported as the tests import it, from the tests
+# directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests'))
+from conftest import read_corpus
+
+def report(label, count, seconds, baseline=None):
+    line = '{:40} {:12.0f} ops/s'.format(label, count / seconds)
+    if baseline:
+        line += '  {:5.1f}x'.format(baseline / seconds)
+    print(line)
+
+def best_of(func, repeat=5, number=1):
+    return min(timeit.repeat(func, repeat=repeat, number=number))
+
+# RpmVersion before the built-in parser, as the baseline: pkg_resources'
+# parse_version() and a mutable object that renders on every str()
+class OriginalRpmVersion():
+    def __init__(self, version_id):
+        from pkg_resources import parse_version
+        version = parse_version(version_id)
+        if isinstance(version._version, str):
+            self.version = version._version
+        else:
+            self.epoch = version._version.epoch
+            self.version = list(version._version.release)
+            self.pre = version._version.pre
+            self.dev = version._version.dev
+            self.post = version._version.post
+
+    def is_legacy(self):
+        return isinstance(self.version, str)
+
+    def __str__(self):
+        if self.is_legacy():
+            return self.version
+        if self.epoch:
+            rpm_epoch = str(self.epoch) + ':'
+        else:
+            rpm_epoch = ''
+        while len(self.version) > 1 and self.version[-1] == 0:
+            self.version.pop()
+        rpm_version = '.'.join(str(x) for x in self.version)
+        if self.pre:
+            rpm_suffix = '~{}'.format(''.join(str(x) for x in self.pre))
+        elif self.dev:
+            rpm_suffix = '~~{}'.format(''.join(str(x) for x in self.dev))
+        elif self.post:
+            rpm_suffix = '^post{}'.format(self.post[1])
+        else:
+            rpm_suffix = ''
+        return '{}{}{}'.format(rpm_epoch, rpm_version, rpm_suffix)
+
+def bench_versions():
+    versions = read_corpus('versions.txt')
+    def render(version_class):
+        return lambda: [str(version_class(x)) for x in versions]
+    results = {'original': render(OriginalRpmVersion)()}
+    times = {'original': best_of(render(OriginalRpmVersion), number=20)}
+    for backend in ('pkg_resources', 'builtin'):
+        pyreq2rpm.set_backend(backend)
+        results[backend] = render(pyreq2rpm.RpmVersion)()
+        times[backend] = best_of(render(pyreq2rpm.RpmVersion), number=20)
+        parse = pyreq2rpm._get_backend().parse_version
+        times[backend + ' parse'] = best_of(lambda: [parse(x) for x in versions], number=20)
+    pyreq2rpm.set_backend('builtin')
+    print('RpmVersion, {} version strings'.format(len(versions)))
+    report('  pkg_resources parse', 20 * len(versions), times['pkg_resources parse'])
+    report('  builtin parse', 20 * len(versions), times['builtin parse'], times['pkg_resources parse'])
+    report('  original RpmVersion', 20 * len(versions), times['original'])
+    report('  RpmVersion, pkg_resources', 20 * len(versions), times['pkg_resources'], times['original'])
+    report('  RpmVersion, builtin', 20 * len(versions), times['builtin'], times['original'])
+    print('  identical output: {}'.format(results['builtin'] == results['pkg_resources'] ==
+                                          results['original']))
+
+def bench_requirements():
+    requirements = read_corpus('requirements.txt')
+    def convert():
+        return [pyreq2rpm.convert_requirement(x) for x in requirements]
+    results = {}
+    times = {}
+    for backend in ('pkg_resources', 'builtin'):
+        pyreq2rpm.set_backend(backend)
+        parse = pyreq2rpm._get_backend().parse_requirement
+        times[backend + ' parse'] = best_of(lambda: [parse(x) for x in requirements], number=5)
+        results[backend] = convert()
+        times[backend] = best_of(convert, number=5)
+    pyreq2rpm.set_backend('builtin')
+    print('convert_requirement, {} requirements'.format(len(requirements)))
+    for label in ('parse', ''):
+        baseline = times[('pkg_resources ' + label).strip()]
+        report('  pkg_resources ' + label, 5 * len(requirements), baseline)
+        report('  builtin ' + label, 5 * len(requirements), times[('builtin ' + label).strip()], baseline)
+    print('  identical output: {}'.format(results['builtin'] == results['pkg_resources']))
+
+def bench_convert():
+    # Specifiers as they appear in the requirement corpus
+    specs = []
+    for req in read_corpus('requirements.txt'):
+        parsed_req = pyreq2rpm.parse_requirement(req)
+        specs.extend((parsed_req.name, op, version) for op, version in parsed_req.specs)
+    def fast():
+        return [pyreq2rpm.convert(*x) for x in specs]
+    def full():
+        return [pyreq2rpm.OPERATORS[x[1]](*x) for x in specs]
+    full_time = best_of(full, number=20)
+    print('convert, {} specifiers'.format(len(specs)))
+    report('  general path', 20 * len(specs), full_time)
+    report('  with plain release fast path', 20 * len(specs), best_of(fast, number=20), full_time)
+    print('  identical output: {}'.format(fast() == full()))
+
+def bench_cache():
+    # A mass rebuild sees the same requirements over and over
+    requirements = read_corpus('requirements.txt') * 20
+    def convert():
+        return [pyreq2rpm.convert_requirement(x) for x in requirements]
+    uncached = best_of(convert)
+    pyreq2rpm.enable_cache()
+    cached = best_of(convert)
+    info = pyreq2rpm.cache_info()
+    pyreq2rpm.disable_cache()
+    print('convert_requirement, {} requirements'.format(len(requirements)))
+    report('  uncached', len(requirements), uncached)
+    report('  cached', len(requirements), cached, uncached)
+    for layer, layer_info in info.items():
+        print('  {:12} {}'.format(layer, layer_info))
+
+def bench_batch():
+    import itertools
+    import time
+    import tracemalloc
+    requirements = read_corpus('requirements.txt')
+    count = 500000
+    # Inputs are generated lazily, as if read from a large file
+    items = itertools.islice(itertools.cycle(requirements), count)
+    tracemalloc.start()
+    start = time.perf_counter()
+    errors = sum(1 for x in pyreq2rpm.convert_requirements(items) if x.error)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('convert_requirements, {} streamed requirements'.format(count))
+    report('  stream', count, seconds)
+    print('  errors: {}, peak traced memory: {:.1f} KiB'.format(errors, peak / 1024))
+
+def bench_tree():
+    import tempfile
+    from pyreq2rpm import parallel
+    requirements = read_corpus('requirements.txt')
+    count = 2000
+    with tempfile.TemporaryDirectory() as root:
+        # A synthetic buildroot with a few dozen requirements per
+        # distribution, drawn from the corpus
+        for index in range(count):
+            dist_info = os.path.join(root, 'site-packages', 'pkg{}-1.0.dist-info'.format(index))
+            os.makedirs(dist_info)
+            with open(os.path.join(dist_info, 'METADATA'), 'w') as f:
+                f.write('Name: pkg{}\n'.format(index))
+                for offset in range(30):
+                    requirement = requirements[(index * 7 + offset) % len(requirements)]
+                    f.write('Requires-Dist: {}\n'.format(requirement))
+        cpus = os.cpu_count() or 1
+        worker_counts = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1)))
+        print('convert_tree, {} distributions, {} CPUs'.format(count, cpus))
+        for result in parallel.measure_scaling(root, worker_counts):
+            print('  {:2} workers {:8.3f} s  {:5.2f}x  efficiency {:4.0%}'.format(*result))
+
+def bench_metadata():
+    import email.parser
+    import tempfile
+    from pyreq2rpm import metadata
+    requirements = read_corpus('requirements.txt')
+    def email_requirements(path):
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            return email.parser.HeaderParser().parse(f).get_all('Requires-Dist', [])
+    with tempfile.TemporaryDirectory() as root:
+        for label, body_size in (('short description', 2000), ('large description', 500000)):
+            paths = []
+            for index in range(50):
+                path = os.path.join(root, '{}-{}'.format(body_size, index))
+                with open(path, 'w') as f:
+                    f.write('Metadata-Version: 2.1\nName: pkg{}\nVersion: 1.0\n'.format(index))
+                    for offset in range(30):
+                        f.write('Requires-Dist: {}\n'.format(requirements[(index + offset) % len(requirements)]))
+                    f.write('Provides-Extra: test\n\n')
+                    f.write(('Lorem ipsum dolor sit amet.\n' * (body_size // 28)))
+                paths.append(path)
+            expected = [email_requirements(x) for x in paths]
+            scanned = [metadata.scan_metadata(x).requires_dist for x in paths]
+            baseline = best_of(lambda: [email_requirements(x) for x in paths], number=3)
+            scan = best_of(lambda: [metadata.scan_metadata(x) for x in paths], number=3)
+            print('Requires-Dist from METADATA, {}'.format(label))
+            report('  email.parser', 3 * len(paths), baseline)
+            report('  scan_metadata', 3 * len(paths), scan, baseline)
+            print('  identical output: {}'.format(scanned == expected))
+
+def bench_sdist():
+    import glob
+    import io
+    import random
+    import shutil
+    import tarfile
+    import tempfile
+    import time
+    import tracemalloc
+    from pyreq2rpm import archives, metadata
+    requirements = read_corpus('requirements.txt')
+    rng = random.Random(0)
+    count = 20
+    def measure(func):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, seconds, peak
+    def extract_all(paths, root):
+        results = []
+        for path in paths:
+            target = tempfile.mkdtemp(dir=root)
+            with tarfile.open(path) as sdist:
+                sdist.extractall(target)
+            requires = glob.glob(os.path.join(target, '*', '*.egg-info', 'requires.txt'))
+            results.append(metadata.scan_requires_txt(requires[0]))
+            shutil.rmtree(target)
+        return results
+    with tempfile.TemporaryDirectory() as root:
+        # setuptools puts the egg-info near the front of an sdist,
+        # followed by the sources
+        paths = []
+        for index in range(count):
+            path = os.path.join(root, 'pkg{}-1.0.tar.gz'.format(index))
+            with tarfile.open(path, 'w:gz') as sdist:
+                members = [('PKG-INFO', b'Metadata-Version: 2.1\nName: pkg\nVersion: 1.0\n'),
+                           ('pkg.egg-info/requires.txt',
+                            '\n'.join(rng.sample(requirements, 20)).encode('utf-8'))]
+                members += [('pkg/module{}.py'.format(x), rng.randbytes(50000)) for x in range(100)]
+                for name, data in members:
+                    info = tarfile.TarInfo('pkg{}-1.0/{}'.format(index, name))
+                    info.size = len(data)
+                    sdist.addfile(info, io.BytesIO(data))
+            paths.append(path)
+        expected, extract_seconds, extract_peak = measure(lambda: extract_all(paths, root))
+        streamed, stream_seconds, stream_peak = measure(
+            lambda: [archives.read_sdist_requirements(x) for x in paths])
+        print('Requirements from {} sdists of 5 MB'.format(count))
+        report('  extractall', count, extract_seconds)
+        report('  streaming', count, stream_seconds, extract_seconds)
+        print('  peak traced memory: extractall {:.0f} KiB, streaming {:.0f} KiB'.format(
+            extract_peak / 1024, stream_peak / 1024))
+        print('  identical output: {}'.format(streamed == expected))
+        for workers in (1, 4):
+            seconds = best_of(lambda: archives.convert_sdists(paths, workers), repeat=3)
+            report('  convert_sdists, {} workers'.format(workers), count, seconds)
+
+def _rss_kib():
+    # Private (anonymous) and file-backed resident memory, Linux only
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            name, _, value = line.partition(':')
+            if name in ('RssAnon', 'RssFile'):
+                values[name] = int(value.split()[0])
+    return values['RssAnon'], values['RssFile']
+
+def _table_worker(args):
+    mode, versions, table_path = args
+    from pyreq2rpm import versiontable
+    import time
+    anon, shared = _rss_kib()
+    start = time.perf_counter()
+    if mode == 'table':
+        pyreq2rpm.set_version_table(versiontable.VersionTable(table_path))
+    else:
+        pyreq2rpm.enable_cache(len(versions))
+    for version_id in versions:
+        pyreq2rpm.convert('foo', '~=', version_id)
+        pyreq2rpm.convert('foo', '!=', version_id)
+    seconds = time.perf_counter() - start
+    after_anon, after_shared = _rss_kib()
+    return after_anon - anon, after_shared - shared, seconds
+
+def bench_table():
+    import multiprocessing
+    import tempfile
+    from pyreq2rpm import versiontable
+    versions = ['{}.{}.{}{}'.format(major, minor, micro, suffix)
+                for major in range(1, 41) for minor in range(25) for micro in range(10)
+                for suffix in ('a1', 'rc2', '.post1', '.dev3')]
+    workers = 4
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'versions.table')
+        seconds = best_of(lambda: versiontable.build_table(versions, path), repeat=1)
+        print('Version table, {} versions, {:.1f} MiB, built in {:.1f} s'.format(
+            len(versions), os.path.getsize(path) / 2 ** 20, seconds))
+        context = multiprocessing.get_context('spawn')
+        for mode in ('cache', 'table'):
+            # Fresh workers for each mode
+            with context.Pool(workers) as pool:
+                results = pool.map(_table_worker, [(mode, versions, path)] * workers)
+            anon = sum(x[0] for x in results) / workers
+            shared = sum(x[1] for x in results) / workers
+            seconds = sum(x[2] for x in results) / workers
+            print('  {:5}  per worker: private RSS +{:7.1f} MiB, '
+                  'shared file RSS +{:5.1f} MiB, {:.2f} s'.format(
+                      mode, anon / 1024, shared / 1024, seconds))
+
+def bench_encoding():
+    import json
+    import pickle
+    from pyreq2rpm import encoding
+    versions = [pyreq2rpm.RpmVersion(x) for x in read_corpus('versions.txt')]
+    expressions = []
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            converted = pyreq2rpm.convert_requirement(requirement)
+        except ValueError:
+            continue
+        if 'Invalid version' not in converted:
+            expressions.append(converted)
+    def version_fields(version):
+        return [version.epoch, version.version, version.pre, version.dev, version.post]
+    def json_version(data):
+        epoch, release, pre, dev, post = json.loads(data)
+        tuple_or_none = lambda x: None if x is None else tuple(x)
+        return pyreq2rpm.RpmVersion._from_fields(
+            epoch, release if isinstance(release, str) else tuple(release),
+            tuple_or_none(pre), tuple_or_none(dev), tuple_or_none(post))
+    formats = {
+        'RpmVersion': (versions, [
+            ('pickle', lambda: [pickle.dumps(x) for x in versions], pickle.loads),
+            ('json', lambda: [json.dumps(version_fields(x)).encode() for x in versions],
+             json_version),
+            ('encoding', lambda: [encoding.encode_version(x) for x in versions], encoding.decode_version)]),
+        'expressions': (expressions, [
+            ('pickle', lambda: [pickle.dumps(expressions)], pickle.loads),
+            ('json', lambda: [json.dumps(expressions).encode()], json.loads),
+            ('encoding', lambda: [encoding.encode_expressions(expressions)], encoding.decode_expressions)]),
+    }
+    for label, (values, codecs) in formats.items():
+        print('Encoding {} {}'.format(len(values), label))
+        for name, encode, decode in codecs:
+            encoded = encode()
+            size = sum(len(x) for x in encoded)
+            encode_seconds = best_of(encode, number=20)
+            decode_seconds = best_of(lambda: [decode(x) for x in encoded], number=20)
+            print('  {:10} {:7} bytes  encode {:8.1f} us  decode {:8.1f} us'.format(
+                name, size, encode_seconds / 20 * 1e6, decode_seconds / 20 * 1e6))
+
+def bench_simplify():
+    from pyreq2rpm import simplify
+    requirements = []
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            if 'Invalid version' not in pyreq2rpm.convert_requirement(requirement):
+                requirements.append(requirement)
+        except ValueError:
+            pass
+    def clauses(expression):
+        return expression.count(' or ') + expression.count(' with ') + 1
+    joined = [pyreq2rpm.convert_requirement(x) for x in requirements]
+    simplified = []
+    unsatisfiable = 0
+    for requirement in requirements:
+        try:
+            simplified.append(simplify.convert_requirement(requirement))
+        except simplify.Unsatisfiable:
+            unsatisfiable += 1
+    print('simplify, {} requirements'.format(len(requirements)))
+    joined_time = best_of(lambda: [pyreq2rpm.convert_requirement(x) for x in requirements])
+    def convert_simplified():
+        for requirement in requirements:
+            try:
+                simplify.convert_requirement(requirement)
+            except simplify.Unsatisfiable:
+                pass
+    report('  joined', len(requirements), joined_time)
+    report('  simplified', len(requirements), best_of(convert_simplified), joined_time)
+    print('  clauses: {} joined, {} simplified, {} unsatisfiable'.format(
+        sum(clauses(x) for x in joined), sum(clauses(x) for x in simplified), unsatisfiable))
+    print('  characters: {} joined, {} simplified'.format(
+        sum(len(x) for x in joined), sum(len(x) for x in simplified)))
+
+def bench_markers():
+    from pyreq2rpm import dependencies, markers
+    requirements = [x for x in read_corpus('requirements.txt') if ';' in x]
+    targets = [{'python_version': x, 'python_full_version': x + '.0', 'platform_machine': machine}
+               for x in ('3.9', '3.10', '3.11', '3.12', '3.13') for machine in ('x86_64', 'aarch64')]
+    environments = [markers.marker_environment(x) for x in targets]
+    def interpreted():
+        results = []
+        for environment in environments:
+            converted = []
+            for requirement in requirements:
+                parsed = pyreq2rpm.parse_requirement(requirement)
+                if markers._evaluate(markers.parse_marker(parsed.marker), environment):
+                    names = dependencies._dependency_names(parsed, dependencies.DEFAULT_NAMESPACE)
+                    converted.extend(x[2] for x in dependencies._convert_names(requirement, parsed, names))
+            results.append(converted)
+        return results
+    def batch():
+        return dependencies.environments_dependencies(requirements, None, environments, errors=[])
+    count = len(requirements) * len(environments)
+    print('Marker evaluation, {} requirements in {} environments'.format(len(requirements),
+                                                                       len(environments)))
+    interpreted_time = best_of(interpreted)
+    report('  parse and evaluate per environment', count, interpreted_time)
+    report('  compiled, batch', count, best_of(batch), interpreted_time)
+
+def bench_namespaces():
+    from pyreq2rpm import dependencies
+    requirements = read_corpus('requirements.txt')
+    namespaces = ['python3dist', 'python3.12dist', 'python3.13dist', 'pypi']
+    print('Namespaces, {} requirements'.format(len(requirements)))
+    single = best_of(lambda: dependencies.requirements_dependencies(requirements, None, errors=[]))
+    report('  requirements_dependencies, 1 namespace', len(requirements), single)
+    for count in (1, 2, 4):
+        selected = namespaces[:count]
+        separate = best_of(lambda: [dependencies.requirements_dependencies(requirements, None, x, errors=[])
+                                    for x in selected])
+        fanned = best_of(lambda: dependencies.namespaces_dependencies(requirements, None, selected, errors=[]))
+        report('  {} namespaces, converted separately'.format(count), len(requirements), separate, single)
+        report('  {} namespaces, converted once'.format(count), len(requirements), fanned, single)
+
+def bench_expression():
+    from pyreq2rpm import expression
+    requirements = []
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            pyreq2rpm.convert_requirement(requirement)
+            requirements.append(requirement)
+        except ValueError:
+            pass
+    print('Expression nodes, {} requirements'.format(len(requirements)))
+    strings = best_of(lambda: [pyreq2rpm.convert_requirement(x) for x in requirements])
+    report('  convert_requirement', len(requirements), strings)
+    report('  convert_requirement_node', len(requirements),
+           best_of(lambda: [pyreq2rpm.convert_requirement_node(x) for x in requirements]), strings)
+    # Code that needs the structure either has nodes, or parses strings
+    converted = [pyreq2rpm.convert_requirement(x) for x in requirements]
+    report('  parse_expression of rendered strings', len(requirements),
+           best_of(lambda: [expression.parse_expression(x) for x in converted]))
+
+def bench_reverse():
+    from pyreq2rpm import reverse
+    expressions = []
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            converted = pyreq2rpm.convert_requirement(requirement)
+        except ValueError:
+            continue
+        if 'Invalid version' not in converted:
+            expressions.append(converted)
+    print('reverse_expression, {} dependencies'.format(len(expressions)))
+    uncached = best_of(lambda: [reverse._reverse(x) for x in expressions])
+    report('  uncached', len(expressions), uncached)
+    report('  cached', len(expressions),
+           best_of(lambda: [reverse.reverse_expression(x) for x in expressions]), uncached)
+    requirements = read_corpus('requirements.txt')
+    report('  verify_round_trip', len(requirements),
+           best_of(lambda: reverse.verify_round_trip(requirements)))
+
+BENCHMARKS = {'versions': bench_versions,
+              'requirements': bench_requirements,
+              'convert': bench_convert,
+              'cache': bench_cache,
+              'batch': bench_batch,
+              'tree': bench_tree,
+              'metadata': bench_metadata,
+              'sdist': bench_sdist,
+              'table': bench_table,
+              'encoding': bench_encoding,
+              'simplify': bench_simplify,
+              'markers': bench_markers,
+              'namespaces': bench_namespaces,
+              'expression': bench_expression,
+              'reverse': bench_reverse}
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore')
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
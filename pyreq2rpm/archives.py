@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Reading requirements from distribution archives without unpacking
+# them.
+#
+# A wheel is a zip file with its metadata in
+# <name>-<version>.dist-info/METADATA.  Only the central directory and
+# that one member are read.
+#
+# An sdist is usually a compressed tar file, which has no index, so its
+# members are read in one streaming pass that stops as soon as the
+# requirements are known.  setuptools writes them to
+# <name>-<version>/*.egg-info/requires.txt (or src/*.egg-info), and
+# metadata 2.2 and later may list them in <name>-<version>/PKG-INFO.
+
+import concurrent.futures
+import os
+import re
+import tarfile
+import zipfile
+
+from pyreq2rpm.dependencies import DEFAULT_NAMESPACE, requirements_dependencies
+from pyreq2rpm.metadata import parse_metadata_headers, parse_requires_txt
+
+class InvalidArchive(ValueError):
+    pass
+
+DEFAULT_WORKERS = 8
+
+_wheel_name_regex = re.compile(r'[^-]+-[^-]+')
+
+def _find_wheel_metadata(names, filename):
+    candidates = [x for x in names
+                  if x.endswith('.dist-info/METADATA') and x.count('/') == 1]
+    if len(candidates) > 1:
+        # Prefer the directory named after the wheel
+        match = _wheel_name_regex.match(filename)
+        prefix = match.group().lower().replace('-', '_') if match else ''
+        named = [x for x in candidates
+                 if x[:-len('.dist-info/METADATA')].lower().replace('-', '_') == prefix]
+        candidates = named or candidates
+    if len(candidates) != 1:
+        raise InvalidArchive('{}: cannot find one .dist-info/METADATA'.format(filename))
+    return candidates[0]
+
+# Return the Requires-Dist values of a wheel.
+def read_wheel_requirements(path):
+    try:
+        with zipfile.ZipFile(path) as wheel:
+            member = _find_wheel_metadata(wheel.namelist(), os.path.basename(path))
+            return parse_metadata_headers(wheel.read(member)).requires_dist
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError) as e:
+        raise InvalidArchive('{}: {}'.format(path, e))
+
+SDIST_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar', '.zip')
+
+_requires_txt_regex = re.compile(r'[^/]+/(?:src/)?[^/]+\.egg-info/requires\.txt\Z')
+_pkg_info_regex = re.compile(r'[^/]+/PKG-INFO\Z')
+_metadata_version_regex = re.compile(rb'^Metadata-Version:[ \t]*([0-9]+)\.([0-9]+)', re.MULTILINE | re.IGNORECASE)
+_dynamic_regex = re.compile(rb'^Dynamic:[ \t]*Requires-Dist[ \t]*\r?$', re.MULTILINE | re.IGNORECASE)
+
+def _static_requirements(pkg_info):
+    # From metadata 2.2, fields not marked Dynamic are final, so an
+    # sdist's PKG-INFO is authoritative even without Requires-Dist
+    match = _metadata_version_regex.search(pkg_info)
+    if not match or (int(match.group(1)), int(match.group(2))) < (2, 2):
+        return False
+    return not _dynamic_regex.search(pkg_info)
+
+def _sdist_requirements(members):
+    # members yields (name, read) pairs in archive order
+    requirements = None
+    for name, read in members:
+        if _requires_txt_regex.match(name):
+            return parse_requires_txt(read().decode('utf-8', 'surrogateescape'))
+        if requirements is None and _pkg_info_regex.match(name):
+            pkg_info = read()
+            requirements = parse_metadata_headers(pkg_info).requires_dist
+            if requirements or _static_requirements(pkg_info):
+                return requirements
+    if requirements is None:
+        raise InvalidArchive('cannot find PKG-INFO')
+    return requirements
+
+def _tar_members(archive):
+    for member in archive:
+        if member.isfile():
+            yield member.name, archive.extractfile(member).read
+
+def _zip_members(archive):
+    for name in archive.namelist():
+        yield name, lambda name=name: archive.read(name)
+
+# Return the requirements of an sdist, reading no further into the
+# archive than necessary.
+def read_sdist_requirements(path):
+    try:
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                return _sdist_requirements(_zip_members(archive))
+        # 'r|*' reads the compressed stream once, front to back
+        with tarfile.open(path, 'r|*') as archive:
+            return _sdist_requirements(_tar_members(archive))
+    except (InvalidArchive, tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as e:
+        raise InvalidArchive('{}: {}'.format(path, e))
+
+def _convert_archive(path, read, namespace, environment):
+    errors = []
+    try:
+        requirements = read(path)
+    except InvalidArchive as e:
+        return path, [], [str(e)]
+    return path, requirements_dependencies(requirements, path, namespace, environment, errors), errors
+
+def _find_archives(paths, suffixes):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, x) for x in sorted(os.listdir(path))
+                         if x.endswith(suffixes))
+        else:
+            found.append(path)
+    return found
+
+def _convert_archives(paths, suffixes, read, workers, namespace, environment):
+    paths = _find_archives(paths, suffixes)
+    if workers is None:
+        workers = DEFAULT_WORKERS
+    # Decompression and file I/O release the GIL, so threads overlap
+    # them without the cost of a process pool
+    with concurrent.futures.ThreadPoolExecutor(max(1, workers)) as executor:
+        return list(executor.map(lambda x: _convert_archive(x, read, namespace, environment), paths))
+
+# Return a list of (path, dependencies, errors) for each archive in paths,
+# which may name archive files or directories holding them.  Results
+# are in input order, with the archives of a directory sorted by name.
+# At most workers archives are read at once.
+def convert_wheels(paths, workers=None, namespace=DEFAULT_NAMESPACE, environment=None):
+    return _convert_archives(paths, ('.whl',), read_wheel_requirements, workers, namespace, environment)
+
+def convert_sdists(paths, workers=None, namespace=DEFAULT_NAMESPACE, environment=None):
+    return _convert_archives(paths, SDIST_SUFFIXES, read_sdist_requirements, workers, namespace, environment)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# An rpm dependency generator.
+#
+# rpm runs generators with the list of packaged files on stdin, one
+# path per line, and reads dependencies from stdout.  With
+# "%__pythondist_protocol multifile" rpm expects the dependencies of
+# each file to follow a ";<path>" line instead.
+
+import argparse
+import sys
+
+from pyreq2rpm.dependencies import DEFAULT_NAMESPACE, MergeStats, generate
+
+def _read_paths(stream):
+    for line in stream:
+        line = line.rstrip('\n')
+        if line:
+            yield line
+
+def _convert_trees(roots, workers, namespace, errors, cache, version_table):
+    from pyreq2rpm.parallel import convert_tree
+    for root in roots:
+        for path, dependencies, path_errors in convert_tree(root, workers, namespace, cache=cache,
+                                                            version_table=version_table):
+            errors.extend(path_errors)
+            yield path, dependencies
+
+def _convert_archives(kind, paths, workers, namespace, errors):
+    from pyreq2rpm import archives
+    convert = archives.convert_wheels if kind == 'wheels' else archives.convert_sdists
+    for path, dependencies, path_errors in convert(paths, workers, namespace):
+        errors.extend(path_errors)
+        yield path, dependencies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pyreq2rpm',
+                                     description='Generate rpm dependencies from Python distribution metadata')
+    parser.add_argument('--multifile', action='store_true',
+                        help='print ";<path>" before the dependencies of each file')
+    parser.add_argument('--namespace', action='append',
+                        help='dependency name wrapper, which may be given more than once '
+                             '(default: {})'.format(DEFAULT_NAMESPACE))
+    parser.add_argument('--tree', action='append', metavar='ROOT',
+                        help='convert every distribution installed under ROOT')
+    parser.add_argument('--wheels', action='append', metavar='PATH',
+                        help='convert a wheel, or every wheel in a directory')
+    parser.add_argument('--sdists', action='append', metavar='PATH',
+                        help='convert an sdist, or every sdist in a directory')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes for --tree (default: one per CPU), '
+                             'or archives read at once for --wheels and --sdists (default: 8)')
+    parser.add_argument('--cache', metavar='DATABASE',
+                        help='reuse conversions of identical metadata stored in an SQLite DATABASE')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='report the --cache hit rate and time saved on stderr')
+    parser.add_argument('--merge', action='store_true',
+                        help='combine the requirements of each project into one dependency')
+    parser.add_argument('--merge-stats', action='store_true',
+                        help='report the number of clauses that --merge removed on stderr')
+    parser.add_argument('--version-table', metavar='PATH',
+                        help='look up rendered versions in a table written by pyreq2rpm-versiontable, '
+                             'shared by the --tree workers')
+    parser.add_argument('paths', nargs='*',
+                        help='files to examine (default: read from stdin)')
+    args = parser.parse_args(argv)
+    if args.merge and (args.tree or args.wheels or args.sdists):
+        parser.error('--merge cannot be used with --tree, --wheels or --sdists')
+    args.namespace = args.namespace or [DEFAULT_NAMESPACE]
+    if len(args.namespace) > 1 and (args.tree or args.wheels or args.sdists):
+        parser.error('--namespace can only be given once with --tree, --wheels or --sdists')
+
+    table = None
+    if args.version_table:
+        from pyreq2rpm.pyreq2rpm import set_version_table
+        from pyreq2rpm.versiontable import VersionTable
+        try:
+            table = VersionTable(args.version_table)
+        except (OSError, ValueError) as e:
+            parser.error('--version-table: {}'.format(e))
+        set_version_table(table)
+    cache = None
+    if args.cache:
+        from pyreq2rpm.diskcache import ResultCache
+        cache = ResultCache(args.cache)
+    try:
+        return _main(args, cache)
+    finally:
+        if cache is not None:
+            if args.cache_stats:
+                print(cache.stats, file=sys.stderr)
+            cache.close()
+        if table is not None:
+            set_version_table(None)
+            table.close()
+
+def _main(args, cache):
+    errors = []
+    merge_stats = MergeStats()
+    if args.tree:
+        results = _convert_trees(args.tree, args.jobs, args.namespace[0], errors, cache, args.version_table)
+    elif args.wheels:
+        results = _convert_archives('wheels', args.wheels, args.jobs, args.namespace[0], errors)
+    elif args.sdists:
+        results = _convert_archives('sdists', args.sdists, args.jobs, args.namespace[0], errors)
+    else:
+        paths = args.paths or _read_paths(sys.stdin)
+        namespace = args.namespace[0] if len(args.namespace) == 1 else args.namespace
+        results = generate(paths, namespace, errors=errors, cache=cache, merge=args.merge,
+                           merge_stats=merge_stats)
+    printed = set()
+    for path, dependencies in results:
+        if args.multifile:
+            print(';{}'.format(path))
+            for dependency in dependencies:
+                print(dependency)
+        else:
+            for dependency in dependencies:
+                if dependency not in printed:
+                    printed.add(dependency)
+                    print(dependency)
+    for error in errors:
+        print(error, file=sys.stderr)
+    if args.merge_stats:
+        print(merge_stats, file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
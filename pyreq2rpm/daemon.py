@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# A long-lived conversion server and its client.
+#
+# Starting an interpreter for every generator run costs more than the
+# conversions themselves.  The server imports everything once, enables
+# and pre-warms the conversion caches, and answers requests on a Unix
+# socket.  The client only needs the standard library; it converts
+# in-process when no server is listening.
+#
+# The protocol is line based: each request is one JSON object,
+#   {"requirements": [<requirement string or [name, op, version]>, ...]}
+# and each response is one JSON object,
+#   {"results": [[<output or null>, <error or null>], ...]}
+# with errors as reported by convert_requirements().  A connection may
+# carry any number of requests.
+#
+# Another user who could answer on the socket could forge every
+# dependency, so clients only connect to, and servers only replace,
+# sockets owned by the current user.  Without $XDG_RUNTIME_DIR the
+# socket is kept in a directory under the temporary directory that only
+# the current user can enter.
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+
+class UnsafeSocket(OSError):
+    pass
+
+# Seconds that convert() waits for a server before converting
+# in-process
+DEFAULT_TIMEOUT = 30
+
+def _private_directory():
+    return os.path.join(tempfile.gettempdir(), 'pyreq2rpm-{}'.format(os.getuid()))
+
+def default_socket_path():
+    path = os.environ.get('PYREQ2RPM_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'pyreq2rpm.sock')
+    return os.path.join(_private_directory(), 'pyreq2rpm.sock')
+
+# Create the directory for the default socket, or check that an
+# existing one belongs to the current user and is closed to others.
+def _make_private_directory(path):
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise UnsafeSocket('{} is not a private directory'.format(path))
+
+def _check_owner(path):
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise UnsafeSocket('{} is not a socket owned by the current user'.format(path))
+
+def _convert(items):
+    from pyreq2rpm.pyreq2rpm import convert_requirements
+    return [[x.output, x.error] for x in convert_requirements(items)]
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                items = json.loads(line)['requirements']
+                response = {'results': _convert(items)}
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': 'Invalid request: {}'.format(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class ConversionServer(socketserver.ThreadingUnixStreamServer):
+    # Each connection has its own thread, sharing the conversion caches
+    daemon_threads = True
+
+    def __init__(self, path, cache_size=None, warm=()):
+        from pyreq2rpm import pyreq2rpm
+        if cache_size is None:
+            cache_size = pyreq2rpm.DEFAULT_CACHE_SIZE
+        if not pyreq2rpm.cache_enabled():
+            pyreq2rpm.enable_cache(cache_size)
+        for item in warm:
+            try:
+                pyreq2rpm.convert_requirement(item)
+            except ValueError:
+                pass
+        if os.path.dirname(path) == _private_directory():
+            _make_private_directory(os.path.dirname(path))
+        _remove_stale_socket(path)
+        super().__init__(path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+# A socket file left by a server that exited without cleaning up would
+# make bind() fail.  Refuse to replace one that a server still answers,
+# or anything but a socket of the current user's.
+def _remove_stale_socket(path):
+    if not os.path.lexists(path):
+        return
+    _check_owner(path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError('A server is already listening on {}'.format(path))
+    finally:
+        probe.close()
+
+class Client():
+    def __init__(self, path=None, timeout=None):
+        self.path = path or default_socket_path()
+        _check_owner(self.path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(self.path)
+        except OSError:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile('rwb')
+
+    def convert(self, items):
+        items = list(items)
+        request = json.dumps({'requirements': items})
+        self._file.write(request.encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Server closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        try:
+            results = [tuple(x) for x in response['results']]
+        except (KeyError, TypeError) as e:
+            raise ValueError('Invalid response: {}'.format(e))
+        if len(results) != len(items) or any(len(x) != 2 for x in results):
+            raise ValueError('Invalid response: wrong number of results')
+        return results
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Convert items through the server at path, or in-process if none is
+# listening, the connection fails, the server does not answer within
+# timeout seconds or its answer is an error.  Returns a list of
+# (output, error) pairs.
+def convert(items, path=None, timeout=DEFAULT_TIMEOUT):
+    items = list(items)
+    try:
+        with Client(path, timeout) as client:
+            return client.convert(items)
+    except (OSError, ValueError):
+        return [tuple(x) for x in _convert(items)]
+
+def _read_lines(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+def serve_main(argv=None):
+    parser = argparse.ArgumentParser(prog='pyreq2rpm-daemon',
+                                     description='Serve requirement conversions on a Unix socket')
+    parser.add_argument('--socket', default=None,
+                        help='socket path (default: $PYREQ2RPM_SOCKET, or pyreq2rpm.sock in $XDG_RUNTIME_DIR '
+                             'or a private temporary directory)')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='entries per conversion cache layer')
+    parser.add_argument('--warm', type=argparse.FileType('r'), action='append', default=[],
+                        help='file of requirements to convert at startup')
+    args = parser.parse_args(argv)
+
+    warm = []
+    for warm_file in args.warm:
+        warm.extend(_read_lines(warm_file))
+        warm_file.close()
+    server = ConversionServer(args.socket or default_socket_path(), args.cache_size, warm)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def client_main(argv=None):
+    parser = argparse.ArgumentParser(prog='pyreq2rpm-client',
+                                     description='Convert requirements using a running pyreq2rpm-daemon')
+    parser.add_argument('--socket', default=None,
+                        help='socket path (default: $PYREQ2RPM_SOCKET, or pyreq2rpm.sock in $XDG_RUNTIME_DIR '
+                             'or a private temporary directory)')
+    parser.add_argument('requirements', nargs='*',
+                        help='requirements to convert (default: read from stdin)')
+    args = parser.parse_args(argv)
+
+    items = args.requirements or list(_read_lines(sys.stdin))
+    status = 0
+    for item, (output, error) in zip(items, convert(items, args.socket)):
+        if error:
+            print('{}: {}'.format(item, error), file=sys.stderr)
+            status = 1
+        else:
+            print(output)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(client_main())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Conversion of Python distribution requirements to rpm dependencies,
+# for the generator in cli and for the parallel, archive and index
+# front ends.
+
+import collections
+import functools
+import re
+
+from pyreq2rpm.markers import ALIASES, InvalidMarker, evaluate_marker, evaluate_marker_batch, marker_environment
+from pyreq2rpm.metadata import find_metadata, read_requirements, requirements_file
+from pyreq2rpm.pyreq2rpm import (InvalidRequirement, convert_specifiers, convert_specifiers_nodes, get_backend,
+                                 parse_requirement)
+
+DEFAULT_NAMESPACE = 'python3dist'
+
+_normalize_regex = re.compile('[-_.]+')
+
+# https://www.python.org/dev/peps/pep-0503/#normalized-names
+@functools.lru_cache(maxsize=4096)
+def normalize_name(name):
+    return _normalize_regex.sub('-', name).lower()
+
+def _dependency_names(parsed, namespace):
+    name = normalize_name(parsed.name)
+    if parsed.extras:
+        return ['{}({}[{}])'.format(namespace, name, extra) for extra in sorted(parsed.extras)]
+    return ['{}({})'.format(namespace, name)]
+
+def _convert_names(requirement, parsed, names):
+    # Return (dependency name, specifiers, dependency) for each name
+    converted = []
+    for dependency_name in names:
+        dependency = convert_specifiers(dependency_name, parsed.specs)
+        if 'Invalid version' in dependency:
+            raise InvalidRequirement('Invalid version in {!r}'.format(requirement))
+        converted.append((dependency_name, parsed.specs, dependency))
+    return converted
+
+def _convert_requirement(requirement, namespace, environment):
+    parsed = parse_requirement(requirement)
+    if parsed.marker is not None and not evaluate_marker(parsed.marker, environment):
+        return []
+    return _convert_names(requirement, parsed, _dependency_names(parsed, namespace))
+
+# Return the rpm dependencies for one requirement string, which may be
+# empty if its marker excludes it from the environment.
+def requirement_dependencies(requirement, namespace=DEFAULT_NAMESPACE, environment=None):
+    return [x[2] for x in _convert_requirement(requirement, namespace, environment)]
+
+# Return the rpm dependencies for a distribution's requirement strings,
+# without duplicates.  Requirements that cannot be converted raise an
+# error, or are described in errors, prefixed with source unless it is
+# None, if a list is given.
+def requirements_dependencies(requirements, source, namespace=DEFAULT_NAMESPACE,
+                              environment=None, errors=None):
+    dependencies = []
+    for requirement in requirements:
+        try:
+            for dependency in requirement_dependencies(requirement, namespace, environment):
+                if dependency not in dependencies:
+                    dependencies.append(dependency)
+        except (InvalidRequirement, InvalidMarker) as e:
+            if errors is None:
+                raise
+            errors.append(str(e) if source is None else '{}: {}'.format(source, e))
+    return dependencies
+
+# As requirements_dependencies(), for each of a list of environments at
+# once.  Returns a list of dependencies for each environment.  Each
+# requirement is parsed, and its marker compiled, once.
+def environments_dependencies(requirements, source, environments, namespace=DEFAULT_NAMESPACE,
+                              errors=None):
+    environments = [marker_environment(x) for x in environments]
+    results = [[] for _ in environments]
+    for requirement in requirements:
+        try:
+            parsed = parse_requirement(requirement)
+            if parsed.marker is None:
+                selected = [True] * len(environments)
+            else:
+                selected = evaluate_marker_batch(parsed.marker, environments)
+            if not any(selected):
+                continue
+            converted = _convert_names(requirement, parsed, _dependency_names(parsed, namespace))
+        except (InvalidRequirement, InvalidMarker) as e:
+            if errors is None:
+                raise
+            errors.append(str(e) if source is None else '{}: {}'.format(source, e))
+            continue
+        for dependencies, is_selected in zip(results, selected):
+            if is_selected:
+                for _, _, dependency in converted:
+                    if dependency not in dependencies:
+                        dependencies.append(dependency)
+    return results
+
+# As requirements_dependencies(), for each of a list of namespaces at
+# once.  Returns a list of dependencies for each namespace.  Each
+# requirement is converted once, and the expression renamed for every
+# dependency name.
+def namespaces_dependencies(requirements, source, namespaces, environment=None, errors=None):
+    results = [[] for _ in namespaces]
+    if not namespaces:
+        return results
+    for requirement in requirements:
+        try:
+            parsed = parse_requirement(requirement)
+            if parsed.marker is not None and not evaluate_marker(parsed.marker, environment):
+                continue
+            names = [x for namespace in namespaces for x in _dependency_names(parsed, namespace)]
+            nodes = convert_specifiers_nodes(names, parsed.specs)
+            if 'Invalid version' in nodes[0].text():
+                raise InvalidRequirement('Invalid version in {!r}'.format(requirement))
+        except (InvalidRequirement, InvalidMarker) as e:
+            if errors is None:
+                raise
+            errors.append(str(e) if source is None else '{}: {}'.format(source, e))
+            continue
+        # Every namespace has the same number of names
+        count = len(names) // len(namespaces)
+        for index, node in enumerate(nodes):
+            dependencies = results[index // count]
+            dependency = node.text()
+            if dependency not in dependencies:
+                dependencies.append(dependency)
+    return results
+
+MergedDependencies = collections.namedtuple('MergedDependencies', ['dependencies', 'removed'])
+
+def _clauses(dependency):
+    return dependency.count(' with ') + dependency.count(' or ') + 1
+
+# As requirements_dependencies(), but with one dependency for each
+# project, and each extra of a project, that the requirements name.
+# The specifiers of all of its requirements are combined by
+# simplify.simplify_specifiers().  removed is the number of clauses
+# saved against requirements_dependencies().  Requirements that no
+# version satisfies together are errors, and keep their separate
+# dependencies.
+def merge_requirements(requirements, source, namespace=DEFAULT_NAMESPACE,
+                       environment=None, errors=None):
+    from pyreq2rpm.simplify import Unsatisfiable, simplify_specifiers
+    groups = {}
+    for requirement in requirements:
+        try:
+            converted = _convert_requirement(requirement, namespace, environment)
+        except (InvalidRequirement, InvalidMarker) as e:
+            if errors is None:
+                raise
+            errors.append(str(e) if source is None else '{}: {}'.format(source, e))
+            continue
+        for dependency_name, specs, dependency in converted:
+            group_specs, separate = groups.setdefault(dependency_name, ([], []))
+            group_specs.extend(specs)
+            if dependency not in separate:
+                separate.append(dependency)
+    dependencies = []
+    removed = 0
+    for dependency_name, (specs, separate) in groups.items():
+        if len(separate) == 1:
+            dependencies.append(separate[0])
+            continue
+        try:
+            dependency = simplify_specifiers(dependency_name, specs)
+        except Unsatisfiable as e:
+            if errors is None:
+                raise
+            errors.append(str(e) if source is None else '{}: {}'.format(source, e))
+            dependencies.extend(separate)
+            continue
+        dependencies.append(dependency)
+        removed += sum(_clauses(x) for x in separate) - _clauses(dependency)
+    return MergedDependencies(dependencies, removed)
+
+class MergeStats():
+    def __init__(self):
+        self.removed = 0
+
+    def __str__(self):
+        return 'merge: {} clauses removed'.format(self.removed)
+
+# Return the dependencies and the number of clauses that merging
+# removed.  namespace may be a list of namespaces, whose dependencies
+# are concatenated.
+def _dependencies(requirements, source, namespace, environment, errors, merge):
+    namespaces = [namespace] if isinstance(namespace, str) else namespace
+    if not merge:
+        if len(namespaces) == 1:
+            return requirements_dependencies(requirements, source, namespaces[0], environment, errors), 0
+        results = namespaces_dependencies(requirements, source, namespaces, environment, errors)
+        return [x for dependencies in results for x in dependencies], 0
+    dependencies = []
+    removed = 0
+    for index, x in enumerate(namespaces):
+        # Errors are the same for every namespace
+        merged = merge_requirements(requirements, source, x, environment, errors if index == 0 else [])
+        dependencies.extend(merged.dependencies)
+        removed += merged.removed
+    return dependencies, removed
+
+# Marker variables that change with every kernel update, by the
+# spellings that markers may use for them
+_VOLATILE_VARIABLES = {x: [x.encode('ascii')] + [y.encode('ascii') for y, z in ALIASES.items() if z == x]
+                       for x in ('platform_release', 'platform_version')}
+
+# The options that conversions depend on, for diskcache keys.  The
+# values of volatile marker variables are kept apart, and only enter the
+# key of content that mentions them (see content_options()), so that
+# cached results survive kernel updates.
+def cache_options(namespace=DEFAULT_NAMESPACE, environment=None, merge=False):
+    environment = marker_environment(environment)
+    volatile = {x: environment.pop(x, None) for x in _VOLATILE_VARIABLES}
+    return {'namespace': namespace, 'environment': environment, 'volatile': volatile,
+            'backend': get_backend(), 'merge': merge}
+
+# The options of cache_options() for the key of content
+def content_options(options, content):
+    volatile = {x: y for x, y in options['volatile'].items()
+                if any(z in content for z in _VOLATILE_VARIABLES[x])}
+    return dict(options, volatile=volatile)
+
+# Return the format and content of the file that declares the
+# requirements of a .dist-info or .egg-info path, for diskcache keys.
+def metadata_content(metadata):
+    source = requirements_file(metadata)
+    if source is None:
+        return 'none', b''
+    with open(source, 'rb') as f:
+        content = f.read()
+    return ('requires.txt' if source.endswith('requires.txt') else 'METADATA'), content
+
+# Return the dependencies of the distribution at a .dist-info or
+# .egg-info path, in namespace, or in each of a list of namespaces,
+# using cache, a diskcache.ResultCache, if given.
+# With merge, dependencies are combined by merge_requirements(), and
+# the clauses removed are counted in merge_stats, a MergeStats, if
+# given.
+def convert_metadata(metadata, namespace=DEFAULT_NAMESPACE, environment=None, errors=None,
+                     cache=None, options=None, merge=False, merge_stats=None):
+    if cache is None:
+        dependencies, removed = _dependencies(read_requirements(metadata), metadata,
+                                              namespace, environment, errors, merge)
+    else:
+        def convert():
+            messages = []
+            dependencies, removed = _dependencies(read_requirements(metadata), None,
+                                                  namespace, environment, messages, merge)
+            # Unmerged results are shared with parallel.convert_tree()
+            return [dependencies, messages, removed] if merge else [dependencies, messages]
+        if options is None:
+            options = cache_options(namespace, environment, merge)
+        kind, content = metadata_content(metadata)
+        value = cache.convert(kind, content, content_options(options, content), convert)
+        dependencies, messages = value[:2]
+        removed = value[2] if merge else 0
+        if messages and errors is None:
+            raise InvalidRequirement(messages[0])
+        if errors is not None:
+            errors.extend('{}: {}'.format(metadata, x) for x in messages)
+    if merge_stats is not None:
+        merge_stats.removed += removed
+    return dependencies
+
+# Yield (path, dependencies) for each distribution named in paths.  A
+# distribution's metadata is read once, for the first path within it.
+# Metadata that cannot be read raises OSError, or is described in
+# errors, if a list is given, and skipped.
+def generate(paths, namespace=DEFAULT_NAMESPACE, environment=None, errors=None, cache=None,
+             merge=False, merge_stats=None):
+    seen = set()
+    options = None if cache is None else cache_options(namespace, environment, merge)
+    for path in paths:
+        metadata = find_metadata(path)
+        if metadata is None or metadata in seen:
+            continue
+        seen.add(metadata)
+        try:
+            dependencies = convert_metadata(metadata, namespace, environment, errors, cache, options,
+                                            merge, merge_stats)
+        except OSError as e:
+            if errors is None:
+                raise
+            errors.append('{}: {}'.format(e.filename or metadata, e.strerror or e))
+            continue
+        yield path, dependencies
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# A persistent cache of converted distributions, shared by builds.
+#
+# Entries map a hash of the file that declares a distribution's
+# requirements, the converter's version and the conversion options to
+# the resulting dependencies and error messages.  Because the key
+# covers everything that determines the result, entries never need to
+# be invalidated, only pruned.
+#
+# The database uses write-ahead logging, so concurrent builds can read
+# while one writes, and writers wait for each other instead of failing.
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+'''
+
+_converter_version = None
+
+# The installed version, qualified by a digest of the module sources
+# so that unreleased changes to the converter also change the key.
+def converter_version():
+    global _converter_version
+    if _converter_version is None:
+        try:
+            import importlib.metadata
+            version = importlib.metadata.version('pyreq2rpm')
+        except Exception:
+            version = '0'
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.py'))):
+            with open(path, 'rb') as source:
+                digest.update(source.read())
+        _converter_version = '{}+{}'.format(version, digest.hexdigest()[:16])
+    return _converter_version
+
+class CacheStats():
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return 'cache: {} hits, {} misses ({:.1%} hit rate), {:.3f} s saved'.format(
+            self.hits, self.misses, self.hit_rate(), self.seconds_saved)
+
+class ResultCache():
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, timeout=60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        self._version = converter_version()
+        # Access times of hits, written in one transaction by prune() or
+        # close(), so that readers do not wait for each other's writes
+        self._accessed = {}
+
+    def key(self, kind, content, options):
+        # kind names the format of content, options are the conversion
+        # options, as a JSON-serializable value
+        digest = hashlib.sha256()
+        for part in (self._version, kind, json.dumps(options, sort_keys=True)):
+            digest.update(part.encode('utf-8') + b'\0')
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key):
+        row = self._connection.execute('SELECT value, seconds FROM results WHERE key = ?',
+                                       (key,)).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.stats.seconds_saved += row[1]
+        self._accessed[key] = time.time()
+        return json.loads(row[0])
+
+    def put(self, key, value, seconds):
+        value = json.dumps(value)
+        self._accessed.pop(key, None)
+        self._connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                 (key, value, seconds, len(key) + len(value), time.time()))
+
+    # Return the cached result of convert(), which must return a
+    # JSON-serializable value, calling it on a miss.
+    def convert(self, kind, content, options, convert):
+        key = self.key(kind, content, options)
+        value = self.get(key)
+        if value is None:
+            start = time.perf_counter()
+            value = convert()
+            self.put(key, value, time.perf_counter() - start)
+        return value
+
+    def size(self):
+        return self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    # Remove the least recently used entries until the cached results
+    # take at most max_bytes, which defaults to the cache's own limit.
+    # Returns the number of entries removed; without a limit, none are.
+    def prune(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        if max_bytes is None:
+            return 0
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._write_accessed()
+            excess = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0] - max_bytes
+            removed = 0
+            if excess > 0:
+                rows = connection.execute('SELECT key, size FROM results ORDER BY accessed')
+                doomed = []
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= size
+                connection.executemany('DELETE FROM results WHERE key = ?', doomed)
+                removed = len(doomed)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return removed
+
+    def _write_accessed(self):
+        accessed = [(x, key) for key, x in self._accessed.items()]
+        self._connection.executemany('UPDATE results SET accessed = MAX(accessed, ?) WHERE key = ?',
+                                     accessed)
+        self._accessed.clear()
+
+    def close(self):
+        if self.max_bytes is not None:
+            self.prune()
+        elif self._accessed:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._write_accessed()
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
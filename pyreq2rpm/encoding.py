@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# A compact binary encoding for RpmVersion values and converted
+# dependencies, for moving them between processes or into caches
+# without pickling or re-parsing.
+#
+# Integers are unsigned LEB128 varints: seven bits per byte, least
+# significant group first, high bit set on all but the last byte.
+# Strings are a varint byte length followed by UTF-8.  Every encoded
+# value starts with a format byte, currently FORMAT_VERSION, and
+# decoders reject formats they do not know.
+#
+# RpmVersion:
+#   format, flags byte, then the fields that flags announce:
+#     LEGACY   the version string, and nothing else
+#     EPOCH    varint epoch
+#     (always) varint release length, varint release components
+#     PRE      letter, varint number
+#     DEV      letter, varint number
+#     POST     letter, varint number
+#   A letter is one byte indexing LETTERS, or 0xff and a string.
+#
+# Dependency expressions, as returned by convert_requirement():
+#   format, varint string count, strings, varint expression count,
+#   expressions.  Names and versions are indexes into the string table,
+#   so a name repeated across clauses is stored once.  An expression
+#   is a node:
+#     NODE_NAME       varint name                 "name"
+#     NODE_ATOM + op  varint name, varint version "name op version"
+#                     where op indexes RPM_OPERATORS
+#     NODE_WITH       varint count, count nodes   "(a with b ...)"
+#     NODE_OR         varint count, count nodes   "(a or b ...)"
+#   Decoders reject nodes nested deeper than MAX_DEPTH.
+#
+# Decoders accept bytes, bytearray, memoryview or anything else that
+# supports the buffer protocol, and read it in place.
+
+from pyreq2rpm.expression import Atom, Or, With, parse_expression
+from pyreq2rpm.pyreq2rpm import RpmVersion
+
+FORMAT_VERSION = 1
+
+FLAG_LEGACY = 0x01
+FLAG_EPOCH = 0x02
+FLAG_PRE = 0x04
+FLAG_DEV = 0x08
+FLAG_POST = 0x10
+
+LETTERS = ('a', 'b', 'rc', 'dev', 'post')
+_LETTER_CODES = {letter: code for code, letter in enumerate(LETTERS)}
+_OTHER_LETTER = 0xff
+
+RPM_OPERATORS = ('<', '<=', '=', '>=', '>')
+_OPERATOR_CODES = {operator: code for code, operator in enumerate(RPM_OPERATORS)}
+
+NODE_NAME = 0
+NODE_ATOM = 1
+NODE_WITH = NODE_ATOM + len(RPM_OPERATORS)
+NODE_OR = NODE_WITH + 1
+
+MAX_DEPTH = 64
+
+class DecodeError(ValueError):
+    pass
+
+def _write_varint(out, value):
+    if value < 0:
+        raise ValueError('Cannot encode negative integer {}'.format(value))
+    while value > 0x7f:
+        out.append(0x80 | (value & 0x7f))
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    try:
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value, pos
+            shift += 7
+    except IndexError:
+        raise DecodeError('Truncated integer')
+
+def _write_string(out, value):
+    encoded = value.encode('utf-8', 'surrogateescape')
+    _write_varint(out, len(encoded))
+    out += encoded
+
+def _read_string(data, pos):
+    length, pos = _read_varint(data, pos)
+    end = pos + length
+    if end > len(data):
+        raise DecodeError('Truncated string')
+    return str(data[pos:end], 'utf-8', 'surrogateescape'), end
+
+def _write_letter(out, letter, number):
+    code = _LETTER_CODES.get(letter)
+    if code is None:
+        out.append(_OTHER_LETTER)
+        _write_string(out, letter)
+    else:
+        out.append(code)
+    _write_varint(out, number)
+
+def _read_letter(data, pos):
+    try:
+        code = data[pos]
+    except IndexError:
+        raise DecodeError('Truncated version')
+    pos += 1
+    if code == _OTHER_LETTER:
+        letter, pos = _read_string(data, pos)
+    elif code < len(LETTERS):
+        letter = LETTERS[code]
+    else:
+        raise DecodeError('Unknown letter code {}'.format(code))
+    number, pos = _read_varint(data, pos)
+    return (letter, number), pos
+
+def _check_format(data):
+    data = memoryview(data).cast('B')
+    if not len(data):
+        raise DecodeError('No data')
+    if data[0] != FORMAT_VERSION:
+        raise DecodeError('Unsupported format {}'.format(data[0]))
+    return data
+
+def _write_version(out, version):
+    if version.is_legacy():
+        out.append(FLAG_LEGACY)
+        _write_string(out, version.version)
+        return
+    flags = ((FLAG_EPOCH if version.epoch else 0) | (FLAG_PRE if version.pre else 0) |
+             (FLAG_DEV if version.dev else 0) | (FLAG_POST if version.post else 0))
+    out.append(flags)
+    if version.epoch:
+        _write_varint(out, version.epoch)
+    _write_varint(out, len(version.version))
+    for component in version.version:
+        _write_varint(out, component)
+    for flag, field in ((FLAG_PRE, version.pre), (FLAG_DEV, version.dev), (FLAG_POST, version.post)):
+        if flags & flag:
+            _write_letter(out, *field)
+
+def _read_version(data, pos):
+    try:
+        flags = data[pos]
+    except IndexError:
+        raise DecodeError('Truncated version')
+    pos += 1
+    if flags & FLAG_LEGACY:
+        version, pos = _read_string(data, pos)
+        return RpmVersion._from_fields(0, version, None, None, None), pos
+    epoch = 0
+    if flags & FLAG_EPOCH:
+        epoch, pos = _read_varint(data, pos)
+    length, pos = _read_varint(data, pos)
+    release = []
+    for _ in range(length):
+        component, pos = _read_varint(data, pos)
+        release.append(component)
+    fields = []
+    for flag in (FLAG_PRE, FLAG_DEV, FLAG_POST):
+        field = None
+        if flags & flag:
+            field, pos = _read_letter(data, pos)
+        fields.append(field)
+    return RpmVersion._from_fields(epoch, tuple(release), *fields), pos
+
+def encode_version(version):
+    out = bytearray([FORMAT_VERSION])
+    _write_version(out, version)
+    return bytes(out)
+
+def decode_version(data):
+    data = _check_format(data)
+    version, end = _read_version(data, 1)
+    if end != len(data):
+        raise DecodeError('Trailing data')
+    return version
+
+def _write_node(out, node, strings):
+    def index(value):
+        return strings.setdefault(value, len(strings))
+    if isinstance(node, (With, Or)):
+        out.append(NODE_WITH if isinstance(node, With) else NODE_OR)
+        _write_varint(out, len(node.children))
+        for child in node.children:
+            _write_node(out, child, strings)
+    elif not isinstance(node, Atom):
+        raise ValueError('Cannot encode {!r}'.format(node))
+    elif node.operator is None:
+        out.append(NODE_NAME)
+        _write_varint(out, index(node.name))
+    else:
+        out.append(NODE_ATOM + _OPERATOR_CODES[node.operator])
+        _write_varint(out, index(node.name))
+        _write_varint(out, index(node.evr))
+
+def _lookup(strings, index):
+    if index >= len(strings):
+        raise DecodeError('Unknown string {}'.format(index))
+    return strings[index]
+
+def _read_node(data, pos, strings, depth=0):
+    try:
+        tag = data[pos]
+        pos += 1
+        if tag == NODE_WITH or tag == NODE_OR:
+            if depth >= MAX_DEPTH:
+                raise DecodeError('Expression nested deeper than {}'.format(MAX_DEPTH))
+            count, pos = _read_varint(data, pos)
+            children = []
+            for _ in range(count):
+                child, pos = _read_node(data, pos, strings, depth + 1)
+                children.append(child)
+            joiner = ' with ' if tag == NODE_WITH else ' or '
+            return '({})'.format(joiner.join(children)), pos
+        name, pos = _read_varint(data, pos)
+        if tag == NODE_NAME:
+            return _lookup(strings, name), pos
+        if tag >= NODE_WITH:
+            raise DecodeError('Unknown node {}'.format(tag))
+        version, pos = _read_varint(data, pos)
+        return '{} {} {}'.format(_lookup(strings, name), RPM_OPERATORS[tag - NODE_ATOM],
+                                 _lookup(strings, version)), pos
+    except IndexError:
+        raise DecodeError('Truncated expression')
+
+# Encode a list of dependencies, as strings returned by
+# convert_requirement() or as expression nodes, into one value with a
+# shared string table.  Strings are parsed into nodes first.
+def encode_expressions(expressions):
+    expressions = list(expressions)
+    strings = {}
+    body = bytearray()
+    for expression in expressions:
+        if isinstance(expression, str):
+            expression = parse_expression(expression)
+        _write_node(body, expression, strings)
+    out = bytearray([FORMAT_VERSION])
+    _write_varint(out, len(strings))
+    for string in strings:
+        _write_string(out, string)
+    _write_varint(out, len(expressions))
+    out += body
+    return bytes(out)
+
+def decode_expressions(data):
+    data = _check_format(data)
+    count, pos = _read_varint(data, 1)
+    strings = []
+    for _ in range(count):
+        string, pos = _read_string(data, pos)
+        strings.append(string)
+    count, pos = _read_varint(data, pos)
+    expressions = []
+    for _ in range(count):
+        expression, pos = _read_node(data, pos, strings)
+        expressions.append(expression)
+    if pos != len(data):
+        raise DecodeError('Trailing data')
+    return expressions
+
+def encode_expression(expression):
+    return encode_expressions([expression])
+
+def decode_expression(data):
+    expressions = decode_expressions(data)
+    if len(expressions) != 1:
+        raise DecodeError('Expected one expression, found {}'.format(len(expressions)))
+    return expressions[0]
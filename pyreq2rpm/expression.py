@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Converted dependencies as trees of nodes.
+#
+# An Atom is a dependency on a name, optionally limited by an rpm
+# operator and an EVR string.  With and Or nodes combine a tuple of
+# child nodes, and INVALID stands for a specifier that cannot be
+# converted.  Nodes are immutable, so the converters and their caches
+# share them freely.
+#
+# rename() returns a node with the same structure on another name, so
+# that a conversion can be rendered for several names.
+#
+# str() renders a node in rpm's rich dependency syntax every time it is
+# called.  text() renders it once and keeps the string on the node, and
+# on its children, for later calls.  The string converters in pyreq2rpm
+# return text() of the nodes they build.
+
+import re
+
+class Node():
+    __slots__ = ('_text',)
+
+    def text(self):
+        text = self._text
+        if text is None:
+            text = self._render()
+            _set_text(self, text)
+        return text
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Expression nodes are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Expression nodes are immutable')
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self).__name__, self._key()))
+
+class Atom(Node):
+    __slots__ = ('name', 'operator', 'evr')
+
+    # Nodes are built through the slot descriptors, which bypass
+    # __setattr__
+    def __init__(self, name, operator=None, evr=None):
+        _set_name(self, name)
+        _set_operator(self, operator)
+        _set_evr(self, evr)
+        _set_text(self, None)
+
+    def __reduce__(self):
+        return (Atom, (self.name, self.operator, self.evr))
+
+    def _key(self):
+        return (self.name, self.operator, self.evr)
+
+    def rename(self, name):
+        return Atom(name, self.operator, self.evr)
+
+    def __str__(self):
+        if self.operator is None:
+            return self.name
+        return '{} {} {}'.format(self.name, self.operator, self.evr)
+
+    _render = __str__
+
+    def __repr__(self):
+        if self.operator is None:
+            return 'Atom({!r})'.format(self.name)
+        return 'Atom({!r}, {!r}, {!r})'.format(self.name, self.operator, self.evr)
+
+class _Boolean(Node):
+    __slots__ = ('children',)
+    joiner = None
+
+    def __init__(self, children):
+        _set_children(self, tuple(children))
+        _set_text(self, None)
+
+    def __reduce__(self):
+        return (type(self), (self.children,))
+
+    def _key(self):
+        return self.children
+
+    def rename(self, name):
+        return type(self)([x.rename(name) for x in self.children])
+
+    def __str__(self):
+        return '({})'.format(self.joiner.join(str(x) for x in self.children))
+
+    def _render(self):
+        return '(' + self.joiner.join([x.text() for x in self.children]) + ')'
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, list(self.children))
+
+class With(_Boolean):
+    __slots__ = ()
+    joiner = ' with '
+
+class Or(_Boolean):
+    __slots__ = ()
+    joiner = ' or '
+
+class Invalid(Node):
+    __slots__ = ()
+
+    def __init__(self):
+        _set_text(self, 'Invalid version')
+
+    def __reduce__(self):
+        return 'INVALID'
+
+    def _key(self):
+        return ()
+
+    def rename(self, name):
+        return self
+
+    def __str__(self):
+        return 'Invalid version'
+
+    def __repr__(self):
+        return 'INVALID'
+
+_set_text = Node._text.__set__
+_set_name, _set_operator, _set_evr = [getattr(Atom, x).__set__ for x in ('name', 'operator', 'evr')]
+_set_children = _Boolean.children.__set__
+
+INVALID = Invalid()
+
+# Rendered dependencies are parsed back into nodes.  Names may hold one
+# parenthesized group, as in python3dist(foo[bar]).
+_atom_regex = re.compile(r'([^\s()]+(?:\([^\s()]*\))?)(?: (<=|>=|<|>|=) ([^\s()]+))?')
+_boolean_regex = re.compile(r' (with|or) ')
+
+def _parse_expression(text, pos):
+    if text.startswith('(', pos):
+        children = []
+        pos += 1
+        joiner = None
+        while True:
+            child, pos = _parse_expression(text, pos)
+            children.append(child)
+            if text.startswith(')', pos):
+                break
+            match = _boolean_regex.match(text, pos)
+            if match is None or joiner not in (None, match.group(1)):
+                raise ValueError('Cannot parse {!r}'.format(text))
+            joiner = match.group(1)
+            pos = match.end()
+        if joiner is None:
+            raise ValueError('Cannot parse {!r}'.format(text))
+        return (With if joiner == 'with' else Or)(children), pos + 1
+    if text.startswith('Invalid version', pos):
+        return INVALID, pos + len('Invalid version')
+    match = _atom_regex.match(text, pos)
+    if match is None:
+        raise ValueError('Cannot parse {!r}'.format(text))
+    return Atom(*match.groups()), match.end()
+
+def parse_expression(text):
+    node, end = _parse_expression(text, 0)
+    if end != len(text):
+        raise ValueError('Cannot parse {!r}'.format(text))
+    return node
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Fetching requirements from a package index without downloading
+# distributions.
+#
+# A project's files are listed by the JSON simple API (PEP 691).  Files
+# whose core metadata is served separately (PEP 658, PEP 714) have it at
+# <file url>.metadata, which is all that is needed for Requires-Dist.
+#
+# Requests are made with asyncio over HTTP/1.1 keep-alive connections,
+# which are pooled per host and bounded by a concurrency limit.
+# Connecting, and each exchange of a request and its response, are
+# limited to a timeout, so that a stalled host fails only its own
+# requests.
+
+import asyncio
+import collections
+import hashlib
+import json
+import ssl
+import urllib.parse
+
+from pyreq2rpm.dependencies import DEFAULT_NAMESPACE, normalize_name, requirements_dependencies
+from pyreq2rpm.metadata import parse_metadata_headers
+from pyreq2rpm.pyreq2rpm import canonical_version
+
+class FetchError(OSError):
+    pass
+
+SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+DEFAULT_CONCURRENCY = 10
+# Seconds
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+
+Response = collections.namedtuple('Response', ['status', 'headers', 'body'])
+
+FetchResult = collections.namedtuple('FetchResult', ['project', 'version', 'dependencies', 'errors'])
+
+class ConnectionPool():
+    # At most limit requests are in flight at once.  Idle connections are
+    # kept per (scheme, host, port) and reused by later requests.  A
+    # timeout of None waits forever.
+    def __init__(self, limit=DEFAULT_CONCURRENCY, ssl_context=None, timeout=DEFAULT_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+        self.connections = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        self._idle = collections.defaultdict(list)
+        self._ssl_context = ssl_context
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            context = self._ssl_context or ssl.create_default_context()
+            connection = await asyncio.open_connection(host, port, ssl=context)
+        else:
+            connection = await asyncio.open_connection(host, port)
+        self.connections += 1
+        return connection
+
+    async def _exchange(self, reader, writer, request, head):
+        writer.write(request)
+        await writer.drain()
+        return await _read_response(reader, head)
+
+    async def request(self, url, accept='*/*', method='GET'):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise FetchError('Unsupported URL: {}'.format(url))
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        request = ('{} {} HTTP/1.1\r\nHost: {}\r\nAccept: {}\r\n'
+                   'Accept-Encoding: identity\r\nConnection: keep-alive\r\n\r\n').format(
+                       method, target, _host(parts), accept).encode('ascii')
+        async with self._semaphore:
+            idle = self._idle[key]
+            # A pooled connection may have been closed by the server; a
+            # new one is only tried once
+            while True:
+                reused = bool(idle)
+                if reused:
+                    reader, writer = idle.pop()
+                else:
+                    try:
+                        reader, writer = await asyncio.wait_for(self._connect(key), self.timeout)
+                    except asyncio.TimeoutError:
+                        raise FetchError('{}: timed out connecting'.format(url))
+                    except OSError as e:
+                        raise FetchError('{}: {}'.format(url, e))
+                try:
+                    response, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, request, method == 'HEAD'), self.timeout)
+                except asyncio.TimeoutError:
+                    writer.close()
+                    raise FetchError('{}: timed out'.format(url))
+                except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+                    writer.close()
+                    if reused:
+                        continue
+                    raise FetchError('{}: {}'.format(url, e))
+                break
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+        return response
+
+    async def get(self, url, accept='*/*'):
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self.request(url, accept)
+            if response.status in (301, 302, 303, 307, 308) and 'location' in response.headers:
+                url = urllib.parse.urljoin(url, response.headers['location'])
+                continue
+            if response.status != 200:
+                raise FetchError('{}: HTTP {}'.format(url, response.status))
+            return url, response
+        raise FetchError('{}: too many redirects'.format(url))
+
+    def close(self):
+        for connections in self._idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+# The Host header never carries the userinfo of the URL
+def _host(parts):
+    host = parts.hostname
+    if ':' in host:
+        host = '[{}]'.format(host)
+    if parts.port is not None:
+        host += ':{}'.format(parts.port)
+    return host
+
+async def _read_head(reader):
+    status_line = await reader.readuntil(b'\r\n')
+    version, status = status_line.split(None, 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return version, int(status), headers
+
+# Responses to HEAD, and 1xx, 204 and 304 responses, never have a body,
+# whatever their headers say.  Interim 1xx responses are skipped.
+async def _read_response(reader, head=False):
+    version, status, headers = await _read_head(reader)
+    while 100 <= status < 200:
+        version, status, headers = await _read_head(reader)
+    if head or status in (204, 304):
+        body = b''
+        keep_alive = True
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = []
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                # Skip trailers
+                while await reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                break
+            body.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b''.join(body)
+        keep_alive = True
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+        keep_alive = True
+    else:
+        body = await reader.read()
+        keep_alive = False
+    if headers.get('connection', '').lower() == 'close' or version == b'HTTP/1.0':
+        keep_alive = False
+    return Response(status, headers, body), keep_alive
+
+def _file_version(filename, project):
+    # Wheels are <name>-<version>-..., sdists <name>-<version>.<ext>
+    if filename.endswith('.whl'):
+        parts = filename.split('-')
+        return parts[1] if len(parts) >= 5 else None
+    for suffix in ('.tar.gz', '.zip', '.tar.bz2', '.tar.xz', '.tgz', '.tar'):
+        if filename.endswith(suffix):
+            name, _, version = filename[:-len(suffix)].rpartition('-')
+            return version if normalize_name(name) == project else None
+    return None
+
+def _core_metadata(file_info):
+    # PEP 714 renamed the key from data-dist-info-metadata
+    for key in ('core-metadata', 'data-dist-info-metadata', 'dist-info-metadata'):
+        if key in file_info:
+            return file_info[key]
+    return False
+
+def _select_file(files, project, version):
+    wanted = canonical_version(version)
+    candidates = [x for x in files
+                  if _core_metadata(x) and not x.get('yanked')
+                  and _file_version(x['filename'], project) is not None
+                  and canonical_version(_file_version(x['filename'], project)) == wanted]
+    # Wheel metadata is static, so prefer it over an sdist's
+    candidates.sort(key=lambda x: not x['filename'].endswith('.whl'))
+    return candidates[0] if candidates else None
+
+class IndexClient():
+    def __init__(self, index_url, concurrency=DEFAULT_CONCURRENCY, ssl_context=None,
+                 timeout=DEFAULT_TIMEOUT):
+        self.index_url = index_url.rstrip('/') + '/'
+        self.pool = ConnectionPool(concurrency, ssl_context, timeout)
+        self._projects = {}
+
+    async def project_files(self, project):
+        # Each project page is fetched once, however many versions are
+        # requested
+        project = normalize_name(project)
+        if project not in self._projects:
+            self._projects[project] = asyncio.ensure_future(self._fetch_project(project))
+        return await self._projects[project]
+
+    async def _fetch_project(self, project):
+        url, response = await self.pool.get(self.index_url + project + '/', SIMPLE_JSON)
+        content_type = response.headers.get('content-type', '').split(';')[0].strip()
+        if content_type != SIMPLE_JSON:
+            raise FetchError('{}: unexpected content type {!r}'.format(url, content_type))
+        try:
+            files = json.loads(response.body)['files']
+        except (ValueError, KeyError, TypeError) as e:
+            raise FetchError('{}: invalid project page: {}'.format(url, e))
+        if not isinstance(files, list):
+            raise FetchError('{}: invalid project page: files is not a list'.format(url))
+        for file_info in files:
+            if not (isinstance(file_info, dict) and isinstance(file_info.get('filename'), str)
+                    and isinstance(file_info.get('url'), str)):
+                raise FetchError('{}: invalid project page: bad file entry {!r}'.format(url, file_info))
+            file_info['url'] = urllib.parse.urljoin(url, file_info['url'])
+        return files
+
+    async def metadata(self, project, version):
+        files = await self.project_files(project)
+        file_info = _select_file(files, normalize_name(project), version)
+        if file_info is None:
+            raise FetchError('{} {}: no file with separate metadata'.format(project, version))
+        url = urllib.parse.urldefrag(file_info['url'])[0] + '.metadata'
+        url, response = await self.pool.get(url)
+        expected = _core_metadata(file_info)
+        if isinstance(expected, dict) and 'sha256' in expected:
+            if hashlib.sha256(response.body).hexdigest() != expected['sha256']:
+                raise FetchError('{}: sha256 mismatch'.format(url))
+        return response.body
+
+    async def requirements(self, project, version, namespace=DEFAULT_NAMESPACE, environment=None):
+        errors = []
+        try:
+            requirements = parse_metadata_headers(await self.metadata(project, version)).requires_dist
+        except (FetchError, OSError, asyncio.IncompleteReadError) as e:
+            return FetchResult(project, version, [], [str(e)])
+        dependencies = requirements_dependencies(requirements, '{} {}'.format(project, version),
+                                                 namespace, environment, errors)
+        return FetchResult(project, version, dependencies, errors)
+
+    def close(self):
+        self.pool.close()
+
+async def fetch_requirements_async(index_url, releases, concurrency=DEFAULT_CONCURRENCY,
+                                   namespace=DEFAULT_NAMESPACE, environment=None, ssl_context=None,
+                                   timeout=DEFAULT_TIMEOUT):
+    client = IndexClient(index_url, concurrency, ssl_context, timeout)
+    try:
+        return await asyncio.gather(*[client.requirements(project, version, namespace, environment)
+                                      for project, version in releases])
+    finally:
+        client.close()
+
+# Return a FetchResult for each (project, version) in releases, in the
+# same order.  timeout is in seconds, for each connection and request.
+def fetch_requirements(index_url, releases, concurrency=DEFAULT_CONCURRENCY,
+                       namespace=DEFAULT_NAMESPACE, environment=None, ssl_context=None,
+                       timeout=DEFAULT_TIMEOUT):
+    return asyncio.run(fetch_requirements_async(index_url, releases, concurrency,
+                                                namespace, environment, ssl_context, timeout))
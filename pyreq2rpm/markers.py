@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Environment markers, as accepted by pkg_resources.
+# https://www.python.org/dev/peps/pep-0508/#environment-markers
+#
+# A parsed marker is a list of items separated by 'and' or 'or'.  Each
+# item is either a (lhs, op, rhs) tuple or a nested list for a
+# parenthesized expression.  Variables are Variable instances, values
+# are plain strings.
+
+import collections
+import re
+
+class InvalidMarker(ValueError):
+    pass
+
+Variable = collections.namedtuple('Variable', ['name'])
+
+# Order matters: the first variable that prefixes the input wins, as in
+# the grammar used by pkg_resources.
+VARIABLES = ('implementation_version',
+             'platform_python_implementation',
+             'implementation_name',
+             'python_full_version',
+             'platform_release',
+             'platform_version',
+             'platform_machine',
+             'platform_system',
+             'python_version',
+             'sys_platform',
+             'os_name',
+             'os.name',
+             'sys.platform',
+             'platform.version',
+             'platform.machine',
+             'platform.python_implementation',
+             'python_implementation',
+             'extra')
+
+ALIASES = {'os.name': 'os_name',
+           'sys.platform': 'sys_platform',
+           'platform.version': 'platform_version',
+           'platform.machine': 'platform_machine',
+           'platform.python_implementation': 'platform_python_implementation',
+           'python_implementation': 'platform_python_implementation'}
+
+_whitespace_regex = re.compile('[ \t\n\r]*')
+_variable_regex = re.compile('|'.join(re.escape(x) for x in VARIABLES))
+_value_regex = re.compile('\'([^\'\n\r]*)\'|"([^"\n\r]*)"')
+_op_regex = re.compile('===|==|>=|<=|!=|~=|>|<|not in|in')
+_boolop_regex = re.compile('and|or')
+
+def _parse_var(text, pos):
+    pos = _whitespace_regex.match(text, pos).end()
+    match = _variable_regex.match(text, pos)
+    if match:
+        return Variable(ALIASES.get(match.group(), match.group())), match.end()
+    match = _value_regex.match(text, pos)
+    if match:
+        value = match.group(1)
+        return match.group(2) if value is None else value, match.end()
+    return None, pos
+
+def _parse_atom(text, pos):
+    lhs, end = _parse_var(text, pos)
+    if lhs is not None:
+        op = _op_regex.match(text, _whitespace_regex.match(text, end).end())
+        if op is None:
+            return None, pos
+        rhs, end = _parse_var(text, op.end())
+        if rhs is None:
+            return None, pos
+        return (lhs, op.group(), rhs), end
+    start = _whitespace_regex.match(text, pos).end()
+    if not text.startswith('(', start):
+        return None, pos
+    markers, end = parse_marker_expression(text, start + 1)
+    if markers is None:
+        return None, pos
+    end = _whitespace_regex.match(text, end).end()
+    if not text.startswith(')', end):
+        return None, pos
+    return markers, end + 1
+
+# Parse the longest marker expression starting at pos.  Returns the
+# parsed marker and the position after its last token, or (None, pos)
+# if there is no marker expression at pos.
+def parse_marker_expression(text, pos=0):
+    atom, end = _parse_atom(text, pos)
+    if atom is None:
+        return None, pos
+    markers = [atom]
+    while True:
+        boolop = _boolop_regex.match(text, _whitespace_regex.match(text, end).end())
+        if boolop is None:
+            break
+        rest, rest_end = parse_marker_expression(text, boolop.end())
+        if rest is None:
+            break
+        markers.append(boolop.group())
+        markers.extend(rest)
+        end = rest_end
+    return markers, end
+
+def parse_marker(text):
+    markers, end = parse_marker_expression(text)
+    if markers is None or _whitespace_regex.match(text, end).end() != len(text):
+        raise InvalidMarker('Invalid marker: {!r}'.format(text))
+    return markers
+
+# Marker evaluation follows packaging.markers: comparisons are done as
+# PEP 440 version specifiers when the right hand side forms a valid
+# specifier, and as plain string comparisons otherwise.  As in current
+# packaging, specifiers match pre-releases in the environment.
+
+class UndefinedComparison(ValueError):
+    pass
+
+class UndefinedEnvironmentName(ValueError):
+    pass
+
+def _format_full_version(info):
+    version = '{0.major}.{0.minor}.{0.micro}'.format(info)
+    if info.releaselevel != 'final':
+        version += info.releaselevel[0] + str(info.serial)
+    return version
+
+def default_environment():
+    import os
+    import platform
+    import sys
+    return {'implementation_name': sys.implementation.name,
+            'implementation_version': _format_full_version(sys.implementation.version),
+            'os_name': os.name,
+            'platform_machine': platform.machine(),
+            'platform_release': platform.release(),
+            'platform_system': platform.system(),
+            'platform_version': platform.version(),
+            'python_full_version': platform.python_version(),
+            'platform_python_implementation': platform.python_implementation(),
+            'python_version': '.'.join(platform.python_version_tuple()[:2]),
+            'sys_platform': sys.platform}
+
+_extra_separator_regex = re.compile('[-_.]+')
+
+def _normalize_extra(extra):
+    return _extra_separator_regex.sub('-', extra).lower()
+
+def _version_key(fields):
+    # Sort key following the PEP 440 ordering rules
+    epoch, release, pre, dev, post = fields
+    release = list(release)
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    if pre is None and post is None and dev is not None:
+        pre_key = (-1, '', 0)
+    elif pre is None:
+        pre_key = (1, '', 0)
+    else:
+        pre_key = (0,) + pre
+    post_key = (-1, 0) if post is None else (0, post[1])
+    dev_key = (1, 0) if dev is None else (0, dev[1])
+    return (epoch, tuple(release), pre_key, post_key, dev_key)
+
+def _prefix_match(fields, prefix):
+    release = fields[1] + (0,) * max(0, len(prefix[1]) - len(fields[1]))
+    return fields[0] == prefix[0] and release[:len(prefix[1])] == prefix[1]
+
+def _contains(operator, spec_version, version):
+    from pyreq2rpm.pyreq2rpm import _parse_version_fields
+    if operator == '===':
+        return version.lower() == spec_version.lower()
+    fields = _parse_version_fields(version)
+    if isinstance(fields, str):
+        # Not a PEP 440 version, nothing matches
+        return False
+    if spec_version.endswith('.*'):
+        matched = _prefix_match(fields, _parse_version_fields(spec_version[:-2]))
+        return matched if operator == '==' else not matched
+    spec_fields = _parse_version_fields(spec_version)
+    # Environment values are always allowed to be pre-releases, so that
+    # markers evaluate the same on a pre-release of Python
+    key = _version_key(fields)
+    spec_key = _version_key(spec_fields)
+    if operator == '==':
+        return key == spec_key
+    if operator == '!=':
+        return key != spec_key
+    if operator == '<=':
+        return key <= spec_key
+    if operator == '>=':
+        return key >= spec_key
+    if operator == '<':
+        # Pre-releases of the specified version do not match, unless it
+        # is a pre-release itself
+        if spec_fields[2] is None and spec_fields[3] is None:
+            return key < _version_key(spec_fields[:3] + (('dev', 0),) + spec_fields[4:])
+        return key < spec_key
+    if operator == '>':
+        # Post-releases of the specified version, including their dev
+        # releases, do not match, unless it is a post-release itself
+        return key > spec_key and not (fields[4] is not None and spec_fields[3:] == (None, None) and
+                                       _version_key(fields[:3] + (None, None)) == spec_key)
+    # ~=
+    prefix = (spec_fields[0], spec_fields[1][:-1])
+    return key >= spec_key and _prefix_match(fields, prefix)
+
+_STRING_OPERATORS = {'in': lambda lhs, rhs: lhs in rhs,
+                     'not in': lambda lhs, rhs: lhs not in rhs,
+                     '<': lambda lhs, rhs: lhs < rhs,
+                     '<=': lambda lhs, rhs: lhs <= rhs,
+                     '==': lambda lhs, rhs: lhs == rhs,
+                     '!=': lambda lhs, rhs: lhs != rhs,
+                     '>=': lambda lhs, rhs: lhs >= rhs,
+                     '>': lambda lhs, rhs: lhs > rhs}
+
+def _evaluate_op(lhs, operator, rhs):
+    from pyreq2rpm.pyreq2rpm import _full_specifier_regex
+    if operator not in ('in', 'not in'):
+        match = _full_specifier_regex.match(operator + rhs)
+        if match:
+            return _contains(operator, match.group('version').strip(), lhs)
+    if operator not in _STRING_OPERATORS:
+        raise UndefinedComparison('Undefined {!r} on {!r} and {!r}'.format(operator, lhs, rhs))
+    return _STRING_OPERATORS[operator](lhs, rhs)
+
+def _resolve(value, environment):
+    if isinstance(value, Variable):
+        try:
+            return environment[value.name]
+        except KeyError:
+            raise UndefinedEnvironmentName(value.name)
+    return value
+
+def _evaluate(markers, environment):
+    groups = [[]]
+    for marker in markers:
+        if isinstance(marker, list):
+            groups[-1].append(_evaluate(marker, environment))
+        elif isinstance(marker, tuple):
+            lhs, operator, rhs = marker
+            lhs_value = _resolve(lhs, environment)
+            rhs_value = _resolve(rhs, environment)
+            if Variable('extra') in (lhs, rhs):
+                lhs_value = _normalize_extra(lhs_value)
+                rhs_value = _normalize_extra(rhs_value)
+            groups[-1].append(_evaluate_op(lhs_value, operator, rhs_value))
+        elif marker == 'or':
+            groups.append([])
+    return any(all(group) for group in groups)
+
+_default_marker_environment = None
+
+# default_environment() is computed once, it does not change while
+# running.  The result is shared and must not be modified.
+def _default_environment():
+    global _default_marker_environment
+    if _default_marker_environment is None:
+        environment = default_environment()
+        environment['extra'] = ''
+        _default_marker_environment = environment
+    return _default_marker_environment
+
+# Return the environment that markers are evaluated in: environment
+# values override default_environment(), and 'extra' defaults to '',
+# which selects requirements outside of any extra.
+def marker_environment(environment=None):
+    current_environment = dict(_default_environment())
+    if environment:
+        current_environment.update(environment)
+    return current_environment
+
+# Return a marker environment for a target Python version, such as
+# '3.12', with values overriding the rest of marker_environment().
+def python_environment(python_version, **values):
+    environment = {'python_version': python_version,
+                   'python_full_version': python_version + '.0',
+                   'implementation_version': python_version + '.0'}
+    environment.update(values)
+    return marker_environment(environment)
+
+# Markers are compiled to nested closures.  Literal values are
+# normalized, and literal right hand sides are matched as specifiers,
+# once at compile time instead of on every evaluation.
+
+def _compile_value(value, is_extra):
+    if isinstance(value, Variable):
+        if is_extra:
+            return lambda environment: _normalize_extra(_resolve(value, environment))
+        return lambda environment: _resolve(value, environment)
+    if is_extra:
+        value = _normalize_extra(value)
+    return lambda environment: value
+
+def _compile_op(lhs, operator, rhs):
+    from pyreq2rpm.pyreq2rpm import _full_specifier_regex
+    is_extra = Variable('extra') in (lhs, rhs)
+    lhs_value = _compile_value(lhs, is_extra)
+    rhs_value = _compile_value(rhs, is_extra)
+    if isinstance(rhs, Variable):
+        return lambda environment: _evaluate_op(lhs_value(environment), operator, rhs_value(environment))
+    rhs = rhs_value(None)
+    if operator not in ('in', 'not in'):
+        match = _full_specifier_regex.match(operator + rhs)
+        if match:
+            version = match.group('version').strip()
+            return lambda environment: _contains(operator, version, lhs_value(environment))
+    if operator not in _STRING_OPERATORS:
+        def undefined(environment):
+            raise UndefinedComparison('Undefined {!r} on {!r} and {!r}'.format(
+                operator, lhs_value(environment), rhs))
+        return undefined
+    string_operator = _STRING_OPERATORS[operator]
+    return lambda environment: string_operator(lhs_value(environment), rhs)
+
+def _compile(markers):
+    groups = [[]]
+    for marker in markers:
+        if isinstance(marker, list):
+            groups[-1].append(_compile(marker))
+        elif isinstance(marker, tuple):
+            groups[-1].append(_compile_op(*marker))
+        elif marker == 'or':
+            groups.append([])
+    return lambda environment: any(all(x(environment) for x in group) for group in groups)
+
+MARKER_CACHE_SIZE = 1024
+
+_compiled_markers = None
+
+# Return a function that evaluates marker text in an environment
+# returned by marker_environment().  Compiled markers are cached by
+# their text.
+def compile_marker(text):
+    global _compiled_markers
+    compiled_markers = _compiled_markers
+    if compiled_markers is None:
+        from pyreq2rpm.pyreq2rpm import LRUCache
+        compiled_markers = _compiled_markers = LRUCache(MARKER_CACHE_SIZE)
+    evaluate = compiled_markers.get(text)
+    if evaluate is None:
+        evaluate = _compile(parse_marker(text))
+        compiled_markers.put(text, evaluate)
+    return evaluate
+
+def evaluate_marker(marker, environment=None):
+    # marker is marker text or a marker parsed by parse_marker()
+    environment = marker_environment(environment) if environment else _default_environment()
+    if isinstance(marker, str):
+        return compile_marker(marker)(environment)
+    return _evaluate(marker, environment)
+
+# Evaluate a marker in each of a list of environments returned by
+# marker_environment() or python_environment(), compiling it once.
+def evaluate_marker_batch(marker, environments):
+    evaluate = compile_marker(marker)
+    return [evaluate(x) for x in environments]
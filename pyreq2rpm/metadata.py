@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Locating and reading installed distribution metadata.
+#
+# A .dist-info directory holds METADATA with Requires-Dist headers.  An
+# .egg-info directory holds PKG-INFO and, for requirements, requires.txt
+# in pkg_resources' section format.  An .egg-info may also be a single
+# file in PKG-INFO format.
+#
+# Files are memory-mapped and searched as bytes: only the headers that
+# are needed are decoded, and the description body after the header
+# block is never read.
+
+import collections
+import contextlib
+import mmap
+import os
+import re
+
+METADATA_SUFFIXES = ('.dist-info', '.egg-info')
+
+# Return the .dist-info or .egg-info path that a file belongs to, or
+# None if the path is not part of any distribution's metadata.
+def find_metadata(path):
+    path = os.path.normpath(path)
+    if path.endswith(METADATA_SUFFIXES):
+        return path
+    parent = os.path.dirname(path)
+    if parent.endswith(METADATA_SUFFIXES):
+        return parent
+    return None
+
+MetadataHeaders = collections.namedtuple('MetadataHeaders', ['requires_dist', 'provides_extra'])
+
+# Header names are case insensitive.  A value may continue on following
+# lines that start with whitespace.  Headers are found by the newline
+# that precedes them, which is much faster than a multiline ^ anchor.
+_HEADER_PATTERN = rb'(requires-dist|provides-extra):[ \t]*([^\r\n]*)((?:\r?\n[ \t][^\r\n]*)*)'
+_first_header_regex = re.compile(_HEADER_PATTERN, re.IGNORECASE)
+_header_regex = re.compile(rb'\n' + _HEADER_PATTERN, re.IGNORECASE)
+_fold_regex = re.compile(rb'\r?\n')
+
+# The header block ends at the first empty line.  Line endings are
+# taken from the first line, so the body is never searched.
+def _header_end(mapped):
+    newline = mapped.find(b'\n')
+    if newline <= 0:
+        return 0 if newline == 0 else len(mapped)
+    separator = b'\n\r\n' if mapped[newline - 1:newline] == b'\r' else b'\n\n'
+    if newline == 1 and separator == b'\n\r\n':
+        return 0
+    end = mapped.find(separator, newline - 1)
+    return len(mapped) if end < 0 else end
+
+@contextlib.contextmanager
+def _mapped(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def _decode(value):
+    return value.decode('utf-8', 'surrogateescape')
+
+# Return the Requires-Dist and Provides-Extra values of METADATA or
+# PKG-INFO content, in the order they appear.  data may be bytes, a
+# memoryview or a memory map.
+def parse_metadata_headers(data):
+    requires_dist = []
+    provides_extra = []
+    end = _header_end(data)
+    first = _first_header_regex.match(data, 0, end)
+    matches = _header_regex.finditer(data, 0, end)
+    for match in ([first] if first else []) + list(matches):
+        name, value, folded = match.groups()
+        if folded:
+            value += _fold_regex.sub(b'', folded)
+        values = requires_dist if name.lower() == b'requires-dist' else provides_extra
+        values.append(_decode(value.rstrip()))
+    return MetadataHeaders(requires_dist, provides_extra)
+
+def scan_metadata(path):
+    with _mapped(path) as mapped:
+        return parse_metadata_headers(mapped)
+
+# Return the requirements of a requires.txt file as Requires-Dist
+# strings.
+def scan_requires_txt(path):
+    with _mapped(path) as mapped:
+        return parse_requires_txt(_decode(mapped[:]))
+
+# Convert requires.txt content to a list of Requires-Dist strings.
+# Sections are named [extra], [:marker] or [extra:marker].
+def parse_requires_txt(text):
+    requirements = []
+    marker = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            extra, _, section_marker = line[1:-1].strip().partition(':')
+            markers = []
+            if extra:
+                markers.append('extra == "{}"'.format(extra))
+            if section_marker:
+                markers.append(section_marker)
+            if len(markers) == 2:
+                markers = ['({})'.format(x) for x in markers]
+            marker = ' and '.join(markers) or None
+            continue
+        if marker is None:
+            requirements.append(line)
+        elif ';' in line:
+            requirement, _, line_marker = line.partition(';')
+            requirements.append('{}; ({}) and ({})'.format(requirement.rstrip(), line_marker.strip(), marker))
+        else:
+            requirements.append('{}; {}'.format(line, marker))
+    return requirements
+
+# Return the file that holds the requirements of a .dist-info or
+# .egg-info path, or None if it declares none.
+def requirements_file(path):
+    if path.endswith('.dist-info'):
+        return os.path.join(path, 'METADATA')
+    if os.path.isdir(path):
+        requires = os.path.join(path, 'requires.txt')
+        return requires if os.path.exists(requires) else None
+    return path
+
+# Return the requirement strings declared by a .dist-info or .egg-info
+# path, in the order they appear.
+def read_requirements(path):
+    source = requirements_file(path)
+    if source is None:
+        return []
+    if source.endswith('requires.txt'):
+        return scan_requires_txt(source)
+    return scan_metadata(source).requires_dist
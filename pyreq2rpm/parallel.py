@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Conversion of whole site-packages or buildroot trees.
+#
+# Each distribution is read, parsed and converted independently, so the
+# work is spread over a process pool.  Distributions are collected and
+# sorted before any work is submitted and results are returned in that
+# order, so the output does not depend on scheduling.
+
+import collections
+import concurrent.futures
+import os
+import time
+
+from pyreq2rpm.dependencies import (DEFAULT_NAMESPACE, cache_options, content_options,
+                                    metadata_content, requirements_dependencies)
+from pyreq2rpm.metadata import METADATA_SUFFIXES, read_requirements
+
+# Per-distribution work is small, so tasks are batched to keep the
+# pool's IPC overhead down, while leaving several batches per worker
+# so that uneven distributions still balance.
+MAX_CHUNKSIZE = 64
+
+# Return the sorted metadata paths of every distribution under root.
+def find_distributions(root):
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for dirname in dirnames:
+            if dirname.endswith(METADATA_SUFFIXES):
+                found.append(os.path.join(dirpath, dirname))
+        for filename in filenames:
+            if filename.endswith('.egg-info'):
+                found.append(os.path.join(dirpath, filename))
+        # Metadata directories hold no further distributions
+        dirnames[:] = sorted(x for x in dirnames if not x.endswith(METADATA_SUFFIXES))
+    found.sort()
+    return found
+
+def chunksize(count, workers):
+    return max(1, min(MAX_CHUNKSIZE, count // (workers * 4)))
+
+def _init_worker(cache_size, version_table):
+    from pyreq2rpm import pyreq2rpm
+    if cache_size and not pyreq2rpm.cache_enabled():
+        pyreq2rpm.enable_cache(cache_size)
+    if version_table:
+        from pyreq2rpm.versiontable import VersionTable
+        pyreq2rpm.set_version_table(VersionTable(version_table))
+
+def _convert_distribution(path, namespace):
+    # Error messages are returned without the path, as they are cached.
+    # Dependencies are None if the metadata could not be read.
+    start = time.perf_counter()
+    messages = []
+    try:
+        requirements = read_requirements(path)
+    except OSError as e:
+        return None, [str(e)], time.perf_counter() - start
+    dependencies = requirements_dependencies(requirements, None, namespace, errors=messages)
+    return dependencies, messages, time.perf_counter() - start
+
+# Return a list of (path, dependencies, errors) for each distribution
+# under root, in sorted path order.  workers=1 converts in-process.
+# A distribution whose metadata cannot be read has no dependencies and
+# one error, and is not cached.
+# With cache, a diskcache.ResultCache, distributions are looked up
+# before any work is submitted, and only misses are converted.
+# version_table is the path of a versiontable file for the workers to
+# share.
+def convert_tree(root, workers=None, namespace=DEFAULT_NAMESPACE, cache_size=None, cache=None,
+                 version_table=None):
+    from pyreq2rpm.pyreq2rpm import DEFAULT_CACHE_SIZE
+    if cache_size is None:
+        cache_size = DEFAULT_CACHE_SIZE
+    paths = find_distributions(root)
+    converted = {}
+    keys = {}
+    if cache is not None:
+        options = cache_options(namespace)
+        for path in paths:
+            try:
+                kind, content = metadata_content(path)
+                key = cache.key(kind, content, content_options(options, content))
+            except OSError:
+                # Reported by _convert_distribution()
+                continue
+            value = cache.get(key)
+            if value is None:
+                keys[path] = key
+            else:
+                converted[path] = value
+    pending = [x for x in paths if x not in converted]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending)))
+    if workers == 1:
+        results = [_convert_distribution(x, namespace) for x in pending]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                    initargs=(cache_size, version_table)) as executor:
+            results = list(executor.map(_convert_distribution, pending, [namespace] * len(pending),
+                                        chunksize=chunksize(len(pending), workers)))
+    for path, (dependencies, messages, seconds) in zip(pending, results):
+        if dependencies is None:
+            converted[path] = [[], messages]
+            continue
+        converted[path] = [dependencies, messages]
+        if cache is not None:
+            cache.put(keys[path], converted[path], seconds)
+    return [(x, converted[x][0], ['{}: {}'.format(x, y) for y in converted[x][1]]) for x in paths]
+
+# Time convert_tree() for each worker count.  speedup is relative to the
+# first count, and efficiency is speedup divided by the relative number
+# of workers, so 1.0 means perfect scaling.
+
+ScalingResult = collections.namedtuple('ScalingResult', ['workers', 'seconds', 'speedup', 'efficiency'])
+
+def measure_scaling(root, worker_counts, namespace=DEFAULT_NAMESPACE):
+    results = []
+    expected = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        converted = convert_tree(root, workers, namespace)
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected = converted
+            base_workers, base_seconds = workers, seconds
+        elif converted != expected:
+            raise RuntimeError('Output with {} workers differs from {} workers'.format(workers, base_workers))
+        speedup = base_seconds / seconds
+        results.append(ScalingResult(workers, seconds, speedup, speedup * base_workers / workers))
+    return results
@@ -22,89 +22,774 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from pkg_resources import Requirement, parse_version
+import collections
+import os
+import re
+import sys
+import threading
+from pyreq2rpm.expression import INVALID, Atom, Node, Or, With
+from pyreq2rpm.markers import parse_marker_expression
 
-class RpmVersion():
-    def __init__(self, version_id):
-        version = parse_version(version_id)
-        if isinstance(version._version, str):
-            self.version = version._version
+# The version and requirement parsers are imported from a backend on
+# first use, so that importing this module only loads the standard
+# library.  Importing pkg_resources scans every installed distribution,
+# which is far more expensive than converting a few requirements.
+# The backend can be selected with set_backend() or the
+# PYREQ2RPM_BACKEND environment variable.
+
+# Backends' parse_version() returns either the original string for
+# versions that do not follow PEP 440, or a tuple in the field order of
+# _Version.  Their new_version() returns the RpmVersion for a string.
+_Version = collections.namedtuple('_Version', ['epoch', 'release', 'pre', 'dev', 'post'])
+_Backend = collections.namedtuple('_Backend', ['parse_version', 'parse_requirement', 'new_version'])
+
+# https://www.python.org/dev/peps/pep-0440/#appendix-b-parsing-version-strings-with-regular-expressions
+VERSION_PATTERN = r"""
+    v?
+    (?:
+        (?:(?P<epoch>[0-9]+)!)?                           # epoch
+        (?P<release>[0-9]+(?:\.[0-9]+)*)                  # release segment
+        (?P<pre>                                          # pre-release
+            [-_\.]?
+            (?P<pre_l>(a|b|c|rc|alpha|beta|pre|preview))
+            [-_\.]?
+            (?P<pre_n>[0-9]+)?
+        )?
+        (?P<post>                                         # post release
+            (?:-(?P<post_n1>[0-9]+))
+            |
+            (?:
+                [-_\.]?
+                (?P<post_l>post|rev|r)
+                [-_\.]?
+                (?P<post_n2>[0-9]+)?
+            )
+        )?
+        (?P<dev>                                          # dev release
+            [-_\.]?
+            (?P<dev_l>dev)
+            [-_\.]?
+            (?P<dev_n>[0-9]+)?
+        )?
+    )
+    (?:\+(?P<local>[a-z0-9]+(?:[-_\.][a-z0-9]+)*))?       # local version
+"""
+
+_version_regex = re.compile(r'^\s*' + VERSION_PATTERN + r'\s*$',
+                            re.VERBOSE | re.IGNORECASE)
+# Most versions are a plain release segment, which needs no other fields
+_release_regex = re.compile(r'[0-9]+(?:\.[0-9]+)*\Z')
+
+_LETTER_NORMALIZATION = {'alpha': 'a', 'beta': 'b', 'c': 'rc', 'pre': 'rc',
+                         'preview': 'rc', 'rev': 'post', 'r': 'post'}
+
+def _parse_letter_version(letter, number):
+    if letter:
+        letter = letter.lower()
+        return (_LETTER_NORMALIZATION.get(letter, letter), int(number or 0))
+    if number:
+        # Implicit post release, e.g. 1.0-1
+        return ('post', int(number))
+    return None
+
+def _parse_version_fields(version_id):
+    if _release_regex.match(version_id):
+        return (0, tuple(map(int, version_id.split('.'))), None, None, None)
+    match = _version_regex.match(version_id)
+    if match is None:
+        # Not a PEP 440 version, handled the same way as LegacyVersion
+        return version_id
+    return _match_fields(match)
+
+def _match_fields(match):
+    epoch, release, pre_l, pre_n, post_n1, post_l, post_n2, dev_l, dev_n = match.group(
+        'epoch', 'release', 'pre_l', 'pre_n', 'post_n1', 'post_l', 'post_n2', 'dev_l', 'dev_n')
+    post_n = post_n1 or post_n2
+    return (int(epoch) if epoch else 0,
+            tuple(map(int, release.split('.'))),
+            _parse_letter_version(pre_l, pre_n) if pre_l else None,
+            _parse_letter_version(dev_l, dev_n) if dev_l else None,
+            _parse_letter_version(post_l, post_n) if post_l or post_n else None)
+
+# Requirements are tokenized in a single pass, following the grammar
+# used by pkg_resources so that exactly the same strings are accepted.
+# https://www.python.org/dev/peps/pep-0508/
+
+class InvalidRequirement(ValueError):
+    pass
+
+ParsedRequirement = collections.namedtuple('ParsedRequirement',
+                                           ['name', 'extras', 'specs', 'marker', 'url'])
+
+SPECIFIER_PATTERN = r"""
+    (?P<operator>(~=|==|!=|<=|>=|<|>|===))
+    (?P<version>
+        (?:
+            # The identity operator matches any string
+            (?<====)
+            \s*
+            [^\s]*
+        )
+        |
+        (?:
+            # Equality operators allow wild cards and local versions
+            (?<===|!=)
+            \s*
+            v?
+            (?:[0-9]+!)?
+            [0-9]+(?:\.[0-9]+)*
+            (?:
+                [-_\.]?
+                (a|b|c|rc|alpha|beta|pre|preview)
+                [-_\.]?
+                [0-9]*
+            )?
+            (?:
+                (?:-[0-9]+)|(?:[-_\.]?(post|rev|r)[-_\.]?[0-9]*)
+            )?
+            (?:
+                (?:[-_\.]?dev[-_\.]?[0-9]*)?
+                (?:\+[a-z0-9]+(?:[-_\.][a-z0-9]+)*)?
+                |
+                \.\*
+            )?
+        )
+        |
+        (?:
+            # The compatible operator requires at least two release components
+            (?<=~=)
+            \s*
+            v?
+            (?:[0-9]+!)?
+            [0-9]+(?:\.[0-9]+)+
+            (?:
+                [-_\.]?
+                (a|b|c|rc|alpha|beta|pre|preview)
+                [-_\.]?
+                [0-9]*
+            )?
+            (?:
+                (?:-[0-9]+)|(?:[-_\.]?(post|rev|r)[-_\.]?[0-9]*)
+            )?
+            (?:[-_\.]?dev[-_\.]?[0-9]*)?
+        )
+        |
+        (?:
+            # Ordered comparisons allow neither wild cards nor local versions
+            (?<!==|!=|~=)
+            \s*
+            v?
+            (?:[0-9]+!)?
+            [0-9]+(?:\.[0-9]+)*
+            (?:
+                [-_\.]?
+                (a|b|c|rc|alpha|beta|pre|preview)
+                [-_\.]?
+                [0-9]*
+            )?
+            (?:
+                (?:-[0-9]+)|(?:[-_\.]?(post|rev|r)[-_\.]?[0-9]*)
+            )?
+            (?:[-_\.]?dev[-_\.]?[0-9]*)?
+        )
+    )
+"""
+
+# Legacy specifiers accept nearly any version string
+LEGACY_SPECIFIER_PATTERN = r"""
+    (?P<operator>(==|!=|<=|>=|<|>))
+    \s*
+    (?P<version>[^,;\s)]*)
+"""
+
+_specifier_regex = re.compile(SPECIFIER_PATTERN, re.VERBOSE | re.IGNORECASE)
+_legacy_specifier_regex = re.compile(LEGACY_SPECIFIER_PATTERN, re.VERBOSE | re.IGNORECASE)
+_full_specifier_regex = re.compile(r'^\s*' + SPECIFIER_PATTERN + r'\s*$',
+                                   re.VERBOSE | re.IGNORECASE)
+_full_legacy_specifier_regex = re.compile(r'^\s*' + LEGACY_SPECIFIER_PATTERN + r'\s*$',
+                                          re.VERBOSE | re.IGNORECASE)
+_whitespace_regex = re.compile('[ \t\n\r]*')
+_identifier_regex = re.compile('[A-Za-z0-9]+(?:[-_.]*[A-Za-z0-9]+)*')
+_url_regex = re.compile('[^ ]+')
+_local_separator_regex = re.compile('[._-]')
+
+def _requirement_line(req):
+    # Comments, blank lines and continuations are handled like
+    # pkg_resources.parse_requirements(), which must yield exactly one
+    # requirement.
+    lines = []
+    continued = False
+    for line in req.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        line = line.partition(' #')[0]
+        if continued:
+            lines[-1] = lines[-1][:-2].strip() + line
         else:
-            self.epoch = version._version.epoch
-            self.version = list(version._version.release)
-            self.pre = version._version.pre
-            self.dev = version._version.dev
-            self.post = version._version.post
-            # version.local is ignored as it is not expected to appear
-            # in public releases
-            # https://www.python.org/dev/peps/pep-0440/#local-version-identifiers
+            lines.append(line)
+        continued = lines[-1].endswith('\\')
+    if continued:
+        lines.pop()
+    if len(lines) != 1:
+        raise InvalidRequirement('Expected one requirement: {!r}'.format(req))
+    # pyparsing expands tabs before parsing
+    return lines[0].expandtabs()
+
+# Return a value that is equal for spellings of the same version, such
+# as 1.0, 1.0.0 and 1.0.0.0, or version_id itself if it is not a PEP 440
+# version.
+def canonical_version(version_id):
+    match = _version_regex.match(version_id)
+    if match is None:
+        return version_id
+    epoch, release, pre, dev, post = _parse_version_fields(version_id)
+    release = list(release)
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    local = match.group('local')
+    if local:
+        local = tuple(int(x) if x.isdigit() else x.lower()
+                      for x in _local_separator_regex.split(local))
+    return (epoch, tuple(release), pre, dev, post, local)
+
+def _parse_specs(raw_specs):
+    specs = []
+    seen = set()
+    for spec in raw_specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        match = _full_specifier_regex.match(spec)
+        legacy = match is None
+        if legacy:
+            match = _full_legacy_specifier_regex.match(spec)
+            if match is None:
+                raise InvalidRequirement('Invalid specifier: {!r}'.format(spec))
+        operator = match.group('operator').strip()
+        version = match.group('version').strip()
+        # Specifiers that only differ in the spelling of their version
+        # are duplicates.  The first one is kept.
+        key = (legacy, operator, canonical_version(version))
+        if key not in seen:
+            seen.add(key)
+            specs.append((operator, version))
+    return specs
+
+def _parse_specifier_token(line, pos):
+    # Both grammars are tried and the longest match wins
+    pos = _whitespace_regex.match(line, pos).end()
+    match = _specifier_regex.match(line, pos)
+    legacy_match = _legacy_specifier_regex.match(line, pos)
+    if legacy_match and (match is None or legacy_match.end() > match.end()):
+        match = legacy_match
+    return match
+
+def _parse_extras(line, pos):
+    extras = []
+    pos = _whitespace_regex.match(line, pos).end()
+    match = _identifier_regex.match(line, pos)
+    while match:
+        extras.append(re.sub('[^A-Za-z0-9.-]+', '_', match.group()).lower())
+        pos = _whitespace_regex.match(line, match.end()).end()
+        if not line.startswith(',', pos):
+            break
+        match = _identifier_regex.match(line, _whitespace_regex.match(line, pos + 1).end())
+    pos = _whitespace_regex.match(line, pos).end()
+    if not line.startswith(']', pos):
+        return None, pos
+    return tuple(collections.OrderedDict.fromkeys(extras)), pos + 1
+
+def _check_url(url):
+    import urllib.parse
+    try:
+        parsed_url = urllib.parse.urlparse(url)
+    except ValueError:
+        return False
+    if parsed_url.scheme == 'file':
+        return urllib.parse.urlunparse(parsed_url) == url
+    return bool(parsed_url.scheme and parsed_url.netloc)
+
+def parse_requirement(req):
+    line = _requirement_line(req)
+    match = _identifier_regex.match(line, _whitespace_regex.match(line).end())
+    if match is None:
+        raise InvalidRequirement('Invalid requirement: {!r}'.format(req))
+    name = re.sub('[^A-Za-z0-9.]+', '-', match.group())
+    extras = ()
+    specs = []
+    marker = None
+    url = None
+    pos = _whitespace_regex.match(line, match.end()).end()
+    if line.startswith('[', pos):
+        extras, pos = _parse_extras(line, pos + 1)
+        if extras is None:
+            raise InvalidRequirement('Invalid extras: {!r}'.format(req))
+        pos = _whitespace_regex.match(line, pos).end()
+    if line.startswith('@', pos):
+        match = _url_regex.match(line, _whitespace_regex.match(line, pos + 1).end())
+        if match is None or not _check_url(match.group()):
+            raise InvalidRequirement('Invalid URL: {!r}'.format(req))
+        url = match.group()
+        pos = _whitespace_regex.match(line, match.end()).end()
+    else:
+        parenthesized = line.startswith('(', pos)
+        match = _parse_specifier_token(line, pos + 1 if parenthesized else pos)
+        if match:
+            raw_specs = [match.group()]
+            pos = match.end()
+            while True:
+                comma = _whitespace_regex.match(line, pos).end()
+                if not line.startswith(',', comma):
+                    break
+                match = _parse_specifier_token(line, comma + 1)
+                if match is None:
+                    break
+                raw_specs.append(match.group())
+                pos = match.end()
+            pos = _whitespace_regex.match(line, pos).end()
+            if parenthesized:
+                if not line.startswith(')', pos):
+                    raise InvalidRequirement('Expected ")": {!r}'.format(req))
+                pos = _whitespace_regex.match(line, pos + 1).end()
+            # Identity specifiers may have swallowed commas
+            specs = _parse_specs(','.join(raw_specs).split(','))
+        elif parenthesized:
+            raise InvalidRequirement('Invalid specifier: {!r}'.format(req))
+    if line.startswith(';', pos):
+        markers, end = parse_marker_expression(line, pos + 1)
+        if markers is None:
+            raise InvalidRequirement('Invalid marker: {!r}'.format(req))
+        marker = line[_whitespace_regex.match(line, pos + 1).end():end]
+        pos = _whitespace_regex.match(line, end).end()
+    if pos != len(line):
+        raise InvalidRequirement('Unexpected text at {}: {!r}'.format(pos, req))
+    return ParsedRequirement(name, extras, specs, marker, url)
+
+def _load_builtin():
+    def parse_requirement_fields(req):
+        parsed_req = parse_requirement(req)
+        return parsed_req.name, parsed_req.specs
+
+    return _Backend(_parse_version_fields, parse_requirement_fields, _new_builtin_version)
+
+def _load_pkg_resources():
+    from pkg_resources import Requirement, parse_version
+
+    def parse_version_fields(version_id):
+        version = parse_version(version_id)._version
+        if isinstance(version, str):
+            # LegacyVersion stores the original string in _version
+            return version
+        return _Version(version.epoch, version.release, version.pre, version.dev, version.post)
+
+    def parse_requirement_fields(req):
+        parsed_req = Requirement.parse(req)
+        return parsed_req.project_name, parsed_req.specs
+
+    def new_version(version_id):
+        return _version_from_fields(parse_version_fields(version_id))
+
+    return _Backend(parse_version_fields, parse_requirement_fields, new_version)
+
+def _load_packaging():
+    from packaging.requirements import Requirement
+    from packaging.version import InvalidVersion, Version
+
+    def parse_version_fields(version_id):
+        try:
+            version = Version(version_id)
+        except InvalidVersion:
+            # packaging has no LegacyVersion, keep the string as-is
+            return version_id
+        # Match the tuple layout used by pkg_resources
+        return _Version(version.epoch,
+                        version.release,
+                        version.pre,
+                        None if version.dev is None else ('dev', version.dev),
+                        None if version.post is None else ('post', version.post))
+
+    def parse_requirement_fields(req):
+        parsed_req = Requirement(req.strip())
+        project_name = re.sub('[^A-Za-z0-9.]+', '-', parsed_req.name)
+        return project_name, [(spec.operator, spec.version)
+                              for spec in parsed_req.specifier]
+
+    def new_version(version_id):
+        return _version_from_fields(parse_version_fields(version_id))
+
+    return _Backend(parse_version_fields, parse_requirement_fields, new_version)
+
+BACKENDS = {'builtin': _load_builtin,
+            'pkg_resources': _load_pkg_resources,
+            'packaging': _load_packaging}
+
+_backend_name = os.environ.get('PYREQ2RPM_BACKEND', 'builtin')
+_backend = None
+
+def set_backend(name):
+    global _backend_name, _backend
+    if name not in BACKENDS:
+        raise ValueError('Unknown backend: {}'.format(name))
+    _backend_name = name
+    _backend = None
+    # Cached results may depend on the backend
+    caches = _caches
+    if caches is not None:
+        for cache in caches.values():
+            cache.clear_entries()
+
+def get_backend():
+    return _backend_name
+
+def _get_backend():
+    global _backend
+    # Read the global once: set_backend() may reset it from another
+    # thread at any time
+    backend = _backend
+    if backend is None:
+        backend = _backend = BACKENDS[_backend_name]()
+    return backend
+
+# Conversions can be memoized in three bounded LRU caches:
+#   'requirement': requirement string -> convert_requirement() result
+#   'convert': (name, operator, version_id) -> convert_node() result
+#   'version': version string -> RpmVersion
+# Caching is off until enable_cache() is called.
+#
+# Every conversion is safe to run from several threads at once: cached
+# values are immutable, each cache serializes access with its own lock,
+# and functions read the global _caches once so that enable_cache() and
+# disable_cache() can be called concurrently with conversions.
+
+CACHE_LAYERS = ('requirement', 'convert', 'version')
+DEFAULT_CACHE_SIZE = 4096
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+class LRUCache():
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear_entries(self):
+        with self._lock:
+            self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self.maxsize, len(self._entries))
+
+_caches = None
+_caches_lock = threading.Lock()
+
+def _cache_sizes(maxsize):
+    # maxsize is either one size for every layer, or a dict of sizes
+    # by layer name
+    if isinstance(maxsize, dict):
+        unknown = set(maxsize) - set(CACHE_LAYERS)
+        if unknown:
+            raise ValueError('Unknown cache layer: {}'.format(', '.join(sorted(unknown))))
+        sizes = dict.fromkeys(CACHE_LAYERS, DEFAULT_CACHE_SIZE)
+        sizes.update(maxsize)
+    else:
+        sizes = dict.fromkeys(CACHE_LAYERS, maxsize)
+    for size in sizes.values():
+        if size < 0:
+            raise ValueError('Invalid cache size: {}'.format(size))
+    return sizes
+
+def enable_cache(maxsize=DEFAULT_CACHE_SIZE):
+    global _caches
+    sizes = _cache_sizes(maxsize)
+    with _caches_lock:
+        if _caches is None:
+            _caches = {layer: LRUCache(sizes[layer]) for layer in CACHE_LAYERS}
+        else:
+            for layer, cache in _caches.items():
+                cache.resize(sizes[layer])
+
+def disable_cache():
+    global _caches
+    with _caches_lock:
+        _caches = None
+
+def cache_enabled():
+    return _caches is not None
+
+def cache_info():
+    caches = _caches
+    if caches is None:
+        return {}
+    return {layer: cache.info() for layer, cache in caches.items()}
+
+def cache_clear():
+    caches = _caches
+    if caches is not None:
+        for cache in caches.values():
+            cache.clear()
+
+def cache_resize(maxsize):
+    caches = _caches
+    if caches is None:
+        raise ValueError('Caching is not enabled')
+    sizes = _cache_sizes(maxsize)
+    for layer, cache in caches.items():
+        cache.resize(sizes[layer])
+
+class RpmVersion():
+    # RpmVersion is an immutable value, so instances can be shared
+    # between callers and kept in the version cache.  The rendered
+    # string is computed when the version is built, and the hash on
+    # first use.  Plain releases parsed by the built-in backend keep the
+    # version string in place of their fields, and are split into
+    # fields when one is first read; str() never needs them.
+    __slots__ = ('_fields', '_hash', '_str')
+
+    def __new__(cls, version_id):
+        caches = _caches
+        if caches is None:
+            return (_backend or _get_backend()).new_version(version_id)
+        cache = caches['version']
+        version = cache.get(version_id)
+        if version is None:
+            version = (_backend or _get_backend()).new_version(version_id)
+            cache.put(version_id, version)
+        return version
+
+    @classmethod
+    def _from_fields(cls, epoch, version, pre, dev, post):
+        return _new_version((epoch, version, pre, dev, post),
+                            _render_fields(epoch, version, pre, dev, post))
+
+    def _get_fields(self):
+        fields = self._fields
+        if type(fields) is str:
+            fields = (0, tuple(map(int, fields.split('.'))), None, None, None)
+            _set_fields(self, fields)
+        return fields
+
+    epoch = property(lambda self: self._get_fields()[0])
+    version = property(lambda self: self._get_fields()[1])
+    pre = property(lambda self: self._get_fields()[2])
+    dev = property(lambda self: self._get_fields()[3])
+    post = property(lambda self: self._get_fields()[4])
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RpmVersion is immutable')
+
+    __delattr__ = __setattr__
+
+    def __reduce__(self):
+        return (self._from_fields, self._get_fields())
 
     def is_legacy(self):
-        return isinstance(self.version, str)
+        return isinstance(self._get_fields()[1], str)
+
+    def replace(self, **fields):
+        values = dict(zip(('epoch', 'version', 'pre', 'dev', 'post'), self._get_fields()))
+        unknown = set(fields) - set(values)
+        if unknown:
+            raise TypeError('Unknown fields: {}'.format(', '.join(sorted(unknown))))
+        values.update(fields)
+        if not isinstance(values['version'], str):
+            values['version'] = tuple(values['version'])
+        return self._from_fields(**values)
 
     def increment(self):
-        self.version[-1] += 1
-        self.pre = None
-        self.dev = None
-        self.post = None
-        return self
+        epoch, release = self._get_fields()[:2]
+        return self._from_fields(epoch, release[:-1] + (release[-1] + 1,), None, None, None)
+
+    def __eq__(self, other):
+        if not isinstance(other, RpmVersion):
+            return NotImplemented
+        return self._get_fields() == other._get_fields()
+
+    def __hash__(self):
+        value = self._hash
+        if value is None:
+            value = hash(self._get_fields())
+            _set_hash(self, value)
+        return value
+
+    def __repr__(self):
+        return '<RpmVersion {}>'.format(self)
 
     def __str__(self):
-        if self.is_legacy():
-            return self.version
-        if self.epoch:
-            rpm_epoch = str(self.epoch) + ':'
-        else:
-            rpm_epoch = ''
-        while len(self.version) > 1 and self.version[-1] == 0:
-            self.version.pop()
-        rpm_version = '.'.join(str(x) for x in self.version)
-        if self.pre:
-            rpm_suffix = '~{}'.format(''.join(str(x) for x in self.pre))
-        elif self.dev:
-            rpm_suffix = '~~{}'.format(''.join(str(x) for x in self.dev))
-        elif self.post:
-            rpm_suffix = '^post{}'.format(self.post[1])
-        else:
-            rpm_suffix = ''
-        return '{}{}{}'.format(rpm_epoch, rpm_version, rpm_suffix)
+        return self._str
 
-def convert_compatible(name, operator, version_id):
+_new_object = object.__new__
+_set_fields, _set_hash, _set_str = [getattr(RpmVersion, x).__set__ for x in ('_fields', '_hash', '_str')]
+
+# Versions are built without calling RpmVersion(), writing the slots
+# through their descriptors, which skips __setattr__ and is faster than
+# object.__setattr__.  fields is a tuple in the field order of _Version,
+# or a plain release string.
+def _new_version(fields, rendered):
+    self = _new_object(RpmVersion)
+    _set_fields(self, fields)
+    _set_hash(self, None)
+    _set_str(self, rendered)
+    return self
+
+def _render_fields(epoch, version, pre, dev, post):
+    if isinstance(version, str):
+        # LegacyVersions are rendered as-is
+        return sys.intern(version)
+    end = len(version)
+    while end > 1 and version[end - 1] == 0:
+        end -= 1
+    rpm_version = '.'.join(map(str, version[:end]))
+    if epoch:
+        rpm_version = str(epoch) + ':' + rpm_version
+    if pre:
+        rpm_version += '~' + pre[0] + str(pre[1])
+    elif dev:
+        rpm_version += '~~' + dev[0] + str(dev[1])
+    elif post:
+        rpm_version += '^post' + str(post[1])
+    return sys.intern(rpm_version)
+
+# Build an RpmVersion from the fields returned by a backend's
+# parse_version().
+def _version_from_fields(version):
+    if isinstance(version, str):
+        return _new_version((0, version, None, None, None), sys.intern(version))
+    # version.local is ignored as it is not expected to appear
+    # in public releases
+    # https://www.python.org/dev/peps/pep-0440/#local-version-identifiers
+    epoch, release, pre, dev, post = version
+    if type(release) is not tuple:
+        release = tuple(release)
+    return _new_version((epoch, release, pre, dev, post), _render_fields(epoch, release, pre, dev, post))
+
+# The built-in parser renders versions in PEP 440 normal form, such as
+# 1.0, 2!1.0rc1 or 1.0.post1.dev2, straight from the version string.
+# Plain releases, the most common form, are matched first.
+_normal_release_regex = re.compile(r'(?:0|[1-9][0-9]*)(?:\.(?:0|[1-9][0-9]*))*\Z')
+_normal_version_regex = re.compile(r"""
+    (?:(?P<epoch>[1-9][0-9]*)!)?
+    (?P<release>(?:0|[1-9][0-9]*)(?:\.(?:0|[1-9][0-9]*))*)
+    (?!\.?[0-9])                  # no backtracking into the release
+    (?:(?P<pre_l>a|b|rc)(?P<pre_n>0|[1-9][0-9]*))?
+    (?:\.post(?P<post_n>0|[1-9][0-9]*))?
+    (?:\.dev(?P<dev_n>0|[1-9][0-9]*))?
+    \Z
+""", re.VERBOSE)
+
+def _new_builtin_version(version_id):
+    if _normal_release_regex.match(version_id):
+        rendered = version_id
+        while rendered.endswith('.0'):
+            rendered = rendered[:-2]
+        return _new_version(version_id, sys.intern(rendered))
+    match = _normal_version_regex.match(version_id)
+    if match is None:
+        match = _version_regex.match(version_id)
+        if match is None:
+            return _new_version((0, version_id, None, None, None), sys.intern(version_id))
+        fields = _match_fields(match)
+        return _new_version(fields, _render_fields(*fields))
+    epoch, release, pre_l, pre_n, post_n, dev_n = match.groups()
+    rendered = release
+    while rendered.endswith('.0'):
+        rendered = rendered[:-2]
+    release = tuple(map(int, release.split('.')))
+    if epoch is None:
+        epoch = 0
+    else:
+        rendered = epoch + ':' + rendered
+        epoch = int(epoch)
+    pre = dev = post = None
+    if pre_l is not None:
+        pre = (pre_l, int(pre_n))
+        rendered += '~' + pre_l + pre_n
+    if dev_n is not None:
+        dev = ('dev', int(dev_n))
+        if pre is None:
+            rendered += '~~dev' + dev_n
+    if post_n is not None:
+        post = ('post', int(post_n))
+        if pre is None and dev is None:
+            rendered += '^post' + post_n
+    return _new_version((epoch, release, pre, dev, post), sys.intern(rendered))
+
+# The converters build expression nodes.  The convert_* functions
+# render them, for callers that want strings.
+
+def _compatible(name, operator, version_id):
     if version_id.endswith('.*'):
-        return 'Invalid version'
+        return INVALID
     version = RpmVersion(version_id)
     if version.is_legacy():
         # LegacyVersions are not supported in this context
-        return 'Invalid version'
+        return INVALID
     if len(version.version) == 1:
-        return 'Invalid version'
-    upper_version = RpmVersion(version_id)
-    upper_version.version.pop()
-    upper_version.increment()
-    return '({} >= {} with {} < {})'.format(
-        name, version, name, upper_version)
+        return INVALID
+    upper_version = version.replace(version=version.version[:-1]).increment()
+    return With((Atom(name, '>=', str(version)), Atom(name, '<', str(upper_version))))
 
-def convert_equal(name, operator, version_id):
+def _equal(name, operator, version_id):
     if version_id.endswith('.*'):
         version_id = version_id[:-2] + '.0'
-        return convert_compatible(name, '~=', version_id)
+        return _compatible(name, '~=', version_id)
     version = RpmVersion(version_id)
-    return '{} = {}'.format(name, version)
+    return Atom(name, '=', str(version))
 
-def convert_arbitrary_equal(name, operator, version_id):
+def _arbitrary_equal(name, operator, version_id):
     if version_id.endswith('.*'):
-        return 'Invalid version'
+        return INVALID
     version = RpmVersion(version_id)
-    return '{} = {}'.format(name, version)
+    return Atom(name, '=', str(version))
 
-def convert_not_equal(name, operator, version_id):
+def _not_equal(name, operator, version_id):
     if version_id.endswith('.*'):
         version_id = version_id[:-2]
         version = RpmVersion(version_id)
         if version.is_legacy():
             # LegacyVersions are not supported in this context
-            return 'Invalid version'
-        version_gt = RpmVersion(version_id).increment()
+            return INVALID
+        version_gt = version.increment()
         version_gt_operator = '>='
         # Prevent dev and pre-releases from satisfying a < requirement
         version = '{}~~'.format(version)
@@ -112,10 +797,9 @@ def convert_not_equal(name, operator, version_id):
         version = RpmVersion(version_id)
         version_gt = version
         version_gt_operator = '>'
-    return '({} < {} or {} {} {})'.format(
-        name, version, name, version_gt_operator, version_gt)
+    return Or((Atom(name, '<', str(version)), Atom(name, version_gt_operator, str(version_gt))))
 
-def convert_ordered(name, operator, version_id):
+def _ordered(name, operator, version_id):
     if version_id.endswith('.*'):
         # PEP 440 does not define semantics for prefix matching
         # with ordered comparisons
@@ -142,7 +826,22 @@ def convert_ordered(name, operator, version_id):
         # Prevent post-releases from satisfying a > requirement
         if operator == '>' and not version.pre and not version.dev and not version.post:
             version = '{}.0'.format(version)
-    return '{} {} {}'.format(name, operator, version)
+    return Atom(name, operator, str(version))
+
+def convert_compatible(name, operator, version_id):
+    return _compatible(name, operator, version_id).text()
+
+def convert_equal(name, operator, version_id):
+    return _equal(name, operator, version_id).text()
+
+def convert_arbitrary_equal(name, operator, version_id):
+    return _arbitrary_equal(name, operator, version_id).text()
+
+def convert_not_equal(name, operator, version_id):
+    return _not_equal(name, operator, version_id).text()
+
+def convert_ordered(name, operator, version_id):
+    return _ordered(name, operator, version_id).text()
 
 OPERATORS = {'~=': convert_compatible,
              '==': convert_equal,
@@ -153,18 +852,226 @@ OPERATORS = {'~=': convert_compatible,
              '>=': convert_ordered,
              '>':  convert_ordered}
 
+_NODE_OPERATORS = {'~=': _compatible,
+                   '==': _equal,
+                   '===': _arbitrary_equal,
+                   '!=': _not_equal,
+                   '<=': _ordered,
+                   '<':  _ordered,
+                   '>=': _ordered,
+                   '>':  _ordered}
+
+# Most specifiers use a plain release segment, with no epoch, pre, post
+# or dev components.  Those are rendered directly from the string,
+# following the same rules as the converters above.  Release numbers
+# with leading zeros take the general path.
+_plain_release_regex = re.compile(r'((?:0|[1-9][0-9]*)(?:\.(?:0|[1-9][0-9]*))*)(\.\*)?\Z')
+
+def _render_release(release):
+    while release.endswith('.0'):
+        release = release[:-2]
+    return release
+
+def _increment_release(release):
+    head, dot, last = release.rpartition('.')
+    return '{}{}{}'.format(head, dot, int(last) + 1)
+
+def _convert_plain_release(name, operator, version_id):
+    match = _plain_release_regex.match(version_id)
+    if match is None:
+        return None
+    release, wildcard = match.groups()
+    if operator == '~=':
+        if wildcard or '.' not in release:
+            return INVALID
+        return With((Atom(name, '>=', _render_release(release)),
+                     Atom(name, '<', _increment_release(release.rpartition('.')[0]))))
+    version = _render_release(release)
+    if operator == '==':
+        if wildcard:
+            return With((Atom(name, '>=', version), Atom(name, '<', _increment_release(release))))
+        return Atom(name, '=', version)
+    if operator == '===':
+        if wildcard:
+            return INVALID
+        return Atom(name, '=', version)
+    if operator == '!=':
+        if wildcard:
+            return Or((Atom(name, '<', version + '~~'), Atom(name, '>=', _increment_release(release))))
+        return Or((Atom(name, '<', version), Atom(name, '>', version)))
+    if wildcard:
+        # see the notes on prefix matching in _ordered
+        if operator == '>':
+            operator = '>='
+        if operator == '<=':
+            operator = '<'
+    if operator == '<':
+        return Atom(name, '<', version + '~~')
+    if operator == '>':
+        return Atom(name, '>', version + '.0')
+    return Atom(name, operator, version)
+
+# A table of pre-rendered versions, such as a
+# versiontable.VersionTable, may be consulted before versions are
+# parsed.  Its convert_node() returns None for versions it does not
+# hold.
+_version_table = None
+
+def set_version_table(table):
+    global _version_table
+    _version_table = table
+
+def _convert(name, operator, version_id):
+    converted = _convert_plain_release(name, operator, version_id)
+    if converted is None:
+        table = _version_table
+        if table is not None:
+            converted = table.convert_node(name, operator, version_id)
+        if converted is None:
+            converted = _NODE_OPERATORS[operator](name, operator, version_id)
+    return converted
+
+# Return the expression node for one (operator, version) specifier.
+# Nodes are shared through the "convert" cache, along with their
+# rendered text.
+def convert_node(name, operator, version_id):
+    caches = _caches
+    if caches is None:
+        return _convert(name, operator, version_id)
+    cache = caches['convert']
+    key = (name, operator, version_id)
+    converted = cache.get(key)
+    if converted is None:
+        converted = _convert(name, operator, version_id)
+        cache.put(key, converted)
+    return converted
+
 def convert(name, operator, version_id):
-    return OPERATORS[operator](name, operator, version_id)
+    return convert_node(name, operator, version_id).text()
 
 def convert_requirement(req):
-    parsed_req = Requirement.parse(req)
+    caches = _caches
+    if caches is None:
+        return _convert_requirement(req)
+    cache = caches['requirement']
+    converted = cache.get(req)
+    if converted is None:
+        converted = _convert_requirement(req)
+        cache.put(req, converted)
+    return converted
+
+def _convert_requirement(req):
+    return convert_requirement_node(req).text()
+
+def convert_requirement_node(req):
+    project_name, specs = _get_backend().parse_requirement(req)
+    return convert_specifiers_node(project_name, specs)
+
+# Combine the conversions of several (operator, version) specifiers for
+# one project into a single rpm dependency, with clauses sorted by their
+# rendered text.
+def convert_specifiers_node(name, specs):
     reqs = []
-    for spec in parsed_req.specs:
-        reqs.append(convert(parsed_req.project_name, spec[0], spec[1]))
+    for spec in specs:
+        reqs.append(convert_node(name, spec[0], spec[1]))
+    return _combine_nodes(name, reqs)
+
+def _combine_nodes(name, reqs):
     if len(reqs) == 0:
-        return parsed_req.project_name
+        return Atom(name)
     if len(reqs) == 1:
         return reqs[0]
     else:
-        reqs.sort()
-        return '({})'.format(' with '.join(reqs))
+        reqs.sort(key=Node.text)
+        return With(reqs)
+
+# As convert_specifiers_node(), for each of a list of names.  The
+# specifiers are converted once, for the first name, and the nodes
+# renamed for the others.
+def convert_specifiers_nodes(names, specs):
+    reqs = [convert_node(names[0], spec[0], spec[1]) for spec in specs]
+    results = [_combine_nodes(names[0], list(reqs))]
+    for name in names[1:]:
+        results.append(_combine_nodes(name, [x.rename(name) for x in reqs]))
+    return results
+
+def convert_specifiers(name, specs):
+    return convert_specifiers_node(name, specs).text()
+
+# Batch conversion.  convert_requirements() consumes any iterable lazily
+# and yields one ConversionResult per item, so a bad line never stops
+# the stream.  error is None, 'invalid-requirement', 'invalid-operator'
+# or 'invalid-version'.
+
+ConversionResult = collections.namedtuple('ConversionResult', ['input', 'output', 'error'])
+
+def _convert_item(item):
+    try:
+        if isinstance(item, str):
+            converted = convert_requirement(item)
+        else:
+            name, operator, version_id = item
+            if not all(isinstance(x, str) for x in (name, operator, version_id)):
+                return None, 'invalid-requirement'
+            if operator not in OPERATORS:
+                return None, 'invalid-operator'
+            converted = convert(name, operator, version_id)
+    except (TypeError, ValueError):
+        return None, 'invalid-requirement'
+    if 'Invalid version' in converted:
+        return None, 'invalid-version'
+    return converted, None
+
+def _convert_cached(item, cache):
+    # Items that cannot be made into a hashable key, such as None, are
+    # converted, or rather rejected, without the cache
+    key = item
+    if not isinstance(item, str):
+        try:
+            key = tuple(item)
+            hash(key)
+        except TypeError:
+            return ConversionResult(item, *_convert_item(item))
+    result = cache.get(key)
+    if result is None:
+        result = _convert_item(key)
+        cache.put(key, result)
+    return ConversionResult(item, *result)
+
+def convert_requirements(iterable, cache_size=DEFAULT_CACHE_SIZE):
+    # Items are requirement strings or (name, operator, version_id)
+    # tuples.  Repeated items are converted once, using a bounded
+    # cache private to this call.  Malformed items are reported as
+    # invalid-requirement.
+    cache = LRUCache(cache_size)
+    for item in iterable:
+        yield _convert_cached(item, cache)
+
+def _convert_chunk(chunk, cache):
+    return [_convert_cached(item, cache) for item in chunk]
+
+def convert_requirements_threaded(iterable, max_workers=None, chunksize=256,
+                                  cache_size=DEFAULT_CACHE_SIZE):
+    # Like convert_requirements(), with chunks of items converted by a
+    # pool of threads that share one cache.  Results are yielded in
+    # input order, and only a few chunks per thread are read ahead of
+    # the consumer.  Conversions run in parallel on free-threaded
+    # builds of CPython.
+    import concurrent.futures
+    import itertools
+    if max_workers is None:
+        # The ThreadPoolExecutor default
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    cache = LRUCache(cache_size)
+    iterator = iter(iterable)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        pending = collections.deque()
+        while True:
+            while len(pending) < max_workers * 2:
+                chunk = list(itertools.islice(iterator, chunksize))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_convert_chunk, chunk, cache))
+            if not pending:
+                return
+            yield from pending.popleft().result()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Reverse conversion, from rpm dependencies back to PEP 440 specifiers.
+#
+# The converters lose information: ~= and ==V.* render the same, as do
+# == and ===, pre-releases hide dev and post components, and trailing
+# zeros are dropped.  So a dependency is reversed to one specifier set
+# that converts back to it, not necessarily to the one it came from.
+# verify_round_trip() checks that over a corpus of requirements.
+
+import collections
+import re
+import sys
+
+from pyreq2rpm.expression import Atom, Node, Or, With, parse_expression
+from pyreq2rpm.pyreq2rpm import LRUCache, convert_requirement, convert_specifiers
+
+class IrreversibleExpression(ValueError):
+    pass
+
+ReversedDependency = collections.namedtuple('ReversedDependency', ['name', 'specs'])
+
+# The versions that the converters render
+_evr_regex = re.compile(r'(?:([0-9]+):)?([0-9]+(?:\.[0-9]+)*)'
+                        r'(?:~(a|b|rc)([0-9]+)|~~(dev)([0-9]+)|\^post([0-9]+))?\Z')
+
+def _parse_evr(evr):
+    # Return (epoch, release tuple, suffix) or None for legacy versions
+    match = _evr_regex.match(evr)
+    if match is None:
+        return None
+    epoch, release, pre, pre_number, dev, dev_number, post_number = match.groups()
+    if pre:
+        suffix = '{}{}'.format(pre, pre_number)
+    elif dev:
+        suffix = '.dev{}'.format(dev_number)
+    elif post_number:
+        suffix = '.post{}'.format(post_number)
+    else:
+        suffix = ''
+    return int(epoch or 0), tuple(int(x) for x in release.split('.')), suffix
+
+def _format_version(epoch, release, suffix=''):
+    version = '.'.join(str(x) for x in release) + suffix
+    return '{}!{}'.format(epoch, version) if epoch else version
+
+def _pep440_version(evr):
+    fields = _parse_evr(evr)
+    if fields is None:
+        # Legacy versions are rendered as they are
+        return evr
+    return _format_version(*fields)
+
+def _pad(release, length):
+    return release + (0,) * (length - len(release))
+
+def _increment(release):
+    return release[:-1] + (release[-1] + 1,)
+
+def _atom_specs(node):
+    if node.operator is None:
+        return []
+    evr = node.evr
+    if node.operator == '=':
+        return [('==', _pep440_version(evr))]
+    if node.operator == '<' and evr.endswith('~~'):
+        # The guard that keeps pre-releases out of a < requirement
+        fields = _parse_evr(evr[:-2])
+        if fields is not None and not fields[2]:
+            return [('<', _format_version(*fields))]
+    if node.operator == '>' and evr.endswith('.0'):
+        # The guard that keeps post-releases out of a > requirement
+        fields = _parse_evr(evr[:-2])
+        if fields is not None and not fields[2]:
+            return [('>', _format_version(*fields))]
+    return [(node.operator, _pep440_version(evr))]
+
+def _compatible_specs(node):
+    # (name >= a with name < b), as rendered for ~= and ==V.*
+    if len(node.children) != 2 or not all(isinstance(x, Atom) for x in node.children):
+        return None
+    lower, upper = node.children
+    if lower.operator != '>=' or upper.operator != '<':
+        return None
+    lower_fields = _parse_evr(lower.evr)
+    upper_fields = _parse_evr(upper.evr)
+    if lower_fields is None or upper_fields is None or upper_fields[2]:
+        return None
+    epoch, release, suffix = lower_fields
+    length = len(upper_fields[1]) + 1
+    if epoch != upper_fields[0] or len(release) > length:
+        return None
+    release = _pad(release, length)
+    if _increment(release[:-1]) != upper_fields[1]:
+        return None
+    return [('~=', _format_version(epoch, release, suffix))]
+
+def _not_equal_specs(node):
+    # (name < a or name > a) for !=, and (name < a~~ or name >= b) for
+    # !=V.*
+    if len(node.children) != 2 or not all(isinstance(x, Atom) for x in node.children):
+        return None
+    lower, upper = node.children
+    if lower.operator != '<':
+        return None
+    if upper.operator == '>' and upper.evr == lower.evr:
+        return [('!=', _pep440_version(lower.evr))]
+    if upper.operator == '>=' and lower.evr.endswith('~~'):
+        lower_fields = _parse_evr(lower.evr[:-2])
+        upper_fields = _parse_evr(upper.evr)
+        if lower_fields is None or upper_fields is None or lower_fields[2] or upper_fields[2]:
+            return None
+        epoch, release, _ = lower_fields
+        if epoch != upper_fields[0] or len(release) > len(upper_fields[1]):
+            return None
+        release = _pad(release, len(upper_fields[1]))
+        if _increment(release) != upper_fields[1]:
+            return None
+        return [('!=', _format_version(epoch, release) + '.*')]
+    return None
+
+def _names(node):
+    if isinstance(node, Atom):
+        return {node.name}
+    if not isinstance(node, (With, Or)):
+        raise IrreversibleExpression('Cannot reverse {}'.format(node))
+    return set().union(*[_names(x) for x in node.children])
+
+def _specs(node, top=True):
+    if isinstance(node, Atom):
+        return _atom_specs(node)
+    if isinstance(node, Or):
+        specs = _not_equal_specs(node)
+    else:
+        specs = _compatible_specs(node)
+        if specs is None and top:
+            # Several specifiers joined by convert_specifiers()
+            specs = []
+            for child in node.children:
+                specs.extend(_specs(child, False))
+    if specs is None:
+        raise IrreversibleExpression('Cannot reverse {}'.format(node))
+    return specs
+
+def _reverse(expression):
+    node = parse_expression(expression) if isinstance(expression, str) else expression
+    if not isinstance(node, Node):
+        raise IrreversibleExpression('Cannot reverse {!r}'.format(expression))
+    names = _names(node)
+    if len(names) != 1:
+        raise IrreversibleExpression('Cannot reverse {}'.format(expression))
+    return ReversedDependency(names.pop(), _specs(node))
+
+REVERSE_CACHE_SIZE = 4096
+
+_reversed = None
+
+# Return the dependency name and a list of (operator, version)
+# specifiers that convert back to expression, a dependency string or
+# an expression node.  Results are cached by expression.
+def reverse_expression(expression):
+    global _reversed
+    cache = _reversed
+    if cache is None:
+        cache = _reversed = LRUCache(REVERSE_CACHE_SIZE)
+    result = cache.get(expression)
+    if result is None:
+        try:
+            result = _reverse(expression)
+        except ValueError as e:
+            result = e
+        cache.put(expression, result)
+    if isinstance(result, ValueError):
+        raise IrreversibleExpression(str(result))
+    return result
+
+def specifier_string(specs):
+    return ','.join('{}{}'.format(operator, version) for operator, version in specs)
+
+RoundTripMismatch = collections.namedtuple('RoundTripMismatch',
+                                           ['requirement', 'expression', 'specifiers', 'reconverted'])
+RoundTripReport = collections.namedtuple('RoundTripReport', ['checked', 'skipped', 'mismatches'])
+
+# Convert each requirement, reverse the result and convert that again.
+# Requirements that cannot be converted are skipped.  A mismatch is a
+# requirement whose reversed specifiers are missing (None, for
+# irreversible expressions) or convert to a different dependency.
+def verify_round_trip(requirements):
+    checked = skipped = 0
+    mismatches = []
+    for requirement in requirements:
+        try:
+            expression = convert_requirement(requirement)
+        except ValueError:
+            skipped += 1
+            continue
+        if 'Invalid version' in expression:
+            skipped += 1
+            continue
+        checked += 1
+        try:
+            name, specs = reverse_expression(expression)
+        except IrreversibleExpression:
+            mismatches.append(RoundTripMismatch(requirement, expression, None, None))
+            continue
+        reconverted = convert_specifiers(name, specs)
+        if reconverted != expression:
+            mismatches.append(RoundTripMismatch(requirement, expression,
+                                                specifier_string(specs), reconverted))
+    return RoundTripReport(checked, skipped, mismatches)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='pyreq2rpm-verify',
+                                     description='Check that converted requirements reverse to '
+                                                 'specifiers that convert to the same dependency')
+    parser.add_argument('files', nargs='*',
+                        help='files of requirements, one per line (default: read from stdin)')
+    args = parser.parse_args(argv)
+    def lines():
+        if not args.files:
+            yield from sys.stdin
+        for path in args.files:
+            with open(path) as f:
+                yield from f
+    def requirements():
+        for line in lines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    report = verify_round_trip(requirements())
+    for mismatch in report.mismatches:
+        print('{}: {} -> {} -> {}'.format(*mismatch))
+    print('{} checked, {} skipped, {} mismatches'.format(report.checked, report.skipped,
+                                                         len(report.mismatches)),
+          file=sys.stderr)
+    return 1 if report.mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
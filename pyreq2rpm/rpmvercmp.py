@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# rpm version comparison.
+#
+# rpmvercmp() is a port of rpm's rpmvercmp(), which compares version
+# or release strings segment by segment: runs of digits numerically,
+# runs of letters as strings, digits newer than letters, "~" older
+# than anything including the end of the string, and "^" newer than
+# the end of the string but older than anything else.
+#
+# label_compare() compares (epoch, version, release) tuples as the rpm
+# Python bindings' labelCompare() does, and uses it when the bindings
+# are installed.  compare_evr() compares "[epoch:]version[-release]"
+# strings the way rpm matches dependencies: a missing epoch is 0, and
+# releases are only compared when both strings have one.
+
+import functools
+import re
+
+_digits_regex = re.compile('[0-9]*')
+_letters_regex = re.compile('[a-zA-Z]*')
+
+def _isalnum(char):
+    return char.isascii() and char.isalnum()
+
+# Return -1, 0 or 1 as a is older than, the same as or newer than b
+def rpmvercmp(a, b):
+    if a == b:
+        return 0
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while i < len(a) and not _isalnum(a[i]) and a[i] not in '~^':
+            i += 1
+        while j < len(b) and not _isalnum(b[j]) and b[j] not in '~^':
+            j += 1
+        # A tilde sorts before everything, even the end of the string
+        a_char = a[i] if i < len(a) else ''
+        b_char = b[j] if j < len(b) else ''
+        if a_char == '~' or b_char == '~':
+            if a_char != '~':
+                return 1
+            if b_char != '~':
+                return -1
+            i += 1
+            j += 1
+            continue
+        # A caret sorts after the end of the string, before anything else
+        if a_char == '^' or b_char == '^':
+            if not a_char:
+                return -1
+            if not b_char:
+                return 1
+            if a_char != '^':
+                return 1
+            if b_char != '^':
+                return -1
+            i += 1
+            j += 1
+            continue
+        if not (a_char and b_char):
+            break
+        numeric = a_char.isdigit()
+        segment_regex = _digits_regex if numeric else _letters_regex
+        a_segment = segment_regex.match(a, i).group()
+        b_segment = segment_regex.match(b, j).group()
+        i += len(a_segment)
+        j += len(b_segment)
+        if not b_segment:
+            # Numeric segments are newer than alphabetic ones
+            return 1 if numeric else -1
+        if numeric:
+            a_segment = a_segment.lstrip('0')
+            b_segment = b_segment.lstrip('0')
+            if len(a_segment) != len(b_segment):
+                return 1 if len(a_segment) > len(b_segment) else -1
+        if a_segment != b_segment:
+            return 1 if a_segment > b_segment else -1
+    if i >= len(a) and j >= len(b):
+        return 0
+    return -1 if i >= len(a) else 1
+
+def _compare_values(a, b):
+    if a is None and b is None:
+        return 0
+    if b is None:
+        return 1
+    if a is None:
+        return -1
+    return rpmvercmp(a, b)
+
+def _label_compare(a, b):
+    a_epoch, a_version, a_release = a
+    b_epoch, b_version, b_release = b
+    return (_compare_values(a_epoch or '0', b_epoch or '0') or
+            _compare_values(a_version, b_version) or
+            _compare_values(a_release, b_release))
+
+# The rpm bindings are imported on first use, as they are large and
+# often not installed.
+_label_compare_impl = None
+
+def _get_label_compare():
+    global _label_compare_impl
+    if _label_compare_impl is None:
+        try:
+            import rpm
+            _label_compare_impl = rpm.labelCompare
+        except (ImportError, AttributeError):
+            _label_compare_impl = _label_compare
+    return _label_compare_impl
+
+# Compare (epoch, version, release) tuples of strings or None.  A
+# missing epoch is 0, and a missing version or release is older than
+# any other.
+def label_compare(a, b):
+    return _get_label_compare()(tuple(a), tuple(b))
+
+# rpm's parseEVR(): the epoch is the digits before a ":", and the
+# release follows the last "-" after it.
+_evr_regex = re.compile(r'(?:([0-9]*):)?(.*?)(?:-([^-]*))?\Z', re.DOTALL)
+
+def parse_evr(evr):
+    epoch, version, release = _evr_regex.match(evr).groups()
+    return epoch or None, version, release
+
+def compare_evr(a, b):
+    a_epoch, a_version, a_release = parse_evr(a)
+    b_epoch, b_version, b_release = parse_evr(b)
+    if a_release is None or b_release is None:
+        a_release = b_release = None
+    return label_compare((a_epoch, a_version, a_release), (b_epoch, b_version, b_release))
+
+# A sort key for EVR strings, in the order of compare_evr()
+evr_key = functools.cmp_to_key(compare_evr)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Simplification of converted specifier sets.
+#
+# convert_requirement() converts each specifier on its own and joins
+# the results with "with".  Here the expression node of each converted
+# specifier is read as a set of intervals of rpm versions, the sets are
+# intersected, and the result is rendered as the smallest equivalent
+# rich dependency:
+# the lower and upper bounds of the set, followed by one
+# "(name < a or name > b)" clause for each hole in it.  Bounds are the
+# versions that the converters produce, so the "~~" and "^post" guards
+# keep their meaning, and versions are ordered by
+# rpmvercmp.compare_evr().
+
+import functools
+
+from pyreq2rpm.expression import Atom, Or, With
+from pyreq2rpm.pyreq2rpm import _get_backend, convert_node, convert_specifiers
+from pyreq2rpm.rpmvercmp import compare_evr, parse_evr
+
+class Unsatisfiable(ValueError):
+    pass
+
+def _check_evr(evr):
+    if parse_evr(evr)[2] is not None:
+        # A release would only be compared against other releases, so
+        # versions holding one are not ordered here
+        raise ValueError('Cannot order {!r}'.format(evr))
+
+# A set of versions is a sorted list of disjoint intervals.  An
+# interval is (low, low_inclusive, high, high_inclusive), where a low
+# or high of None is unbounded.
+
+EVERYTHING = [(None, False, None, False)]
+
+def _interval_empty(interval):
+    low, low_inclusive, high, high_inclusive = interval
+    if low is None or high is None:
+        return False
+    order = compare_evr(low, high)
+    return order > 0 or (order == 0 and not (low_inclusive and high_inclusive))
+
+def _atom_intervals(operator, evr):
+    _check_evr(evr)
+    return {'<': [(None, False, evr, False)],
+            '<=': [(None, False, evr, True)],
+            '=': [(evr, True, evr, True)],
+            '>=': [(evr, True, None, False)],
+            '>': [(evr, False, None, False)]}[operator]
+
+def _max_low(a, b):
+    # The tighter of two lower bounds, as (evr, inclusive)
+    if a[0] is None:
+        return b
+    if b[0] is None:
+        return a
+    order = compare_evr(a[0], b[0])
+    if order == 0:
+        return a[0], a[1] and b[1]
+    return a if order > 0 else b
+
+def _min_high(a, b):
+    if a[0] is None:
+        return b
+    if b[0] is None:
+        return a
+    order = compare_evr(a[0], b[0])
+    if order == 0:
+        return a[0], a[1] and b[1]
+    return a if order < 0 else b
+
+def intersect(a, b):
+    result = []
+    for first in a:
+        for second in b:
+            low = _max_low(first[:2], second[:2])
+            high = _min_high(first[2:], second[2:])
+            interval = low + high
+            if not _interval_empty(interval):
+                result.append(interval)
+    return _normalize(result)
+
+def union(a, b):
+    return _normalize(a + b)
+
+def _low_key(interval):
+    # Unbounded first, then by version, inclusive before exclusive
+    if interval[0] is None:
+        return (0, None, 0)
+    return (1, interval[0], 0 if interval[1] else 1)
+
+def _compare_low(a, b):
+    a_key, b_key = _low_key(a), _low_key(b)
+    if a_key[0] != b_key[0]:
+        return a_key[0] - b_key[0]
+    if a_key[0] == 0:
+        return 0
+    return compare_evr(a_key[1], b_key[1]) or a_key[2] - b_key[2]
+
+def _touches(first, second):
+    # Whether second, starting no earlier than first, overlaps or is
+    # adjacent to it, so that their union is one interval
+    if first[2] is None or second[0] is None:
+        return True
+    order = compare_evr(second[0], first[2])
+    return order < 0 or (order == 0 and (first[3] or second[1]))
+
+def _normalize(intervals):
+    intervals = sorted(intervals, key=functools.cmp_to_key(_compare_low))
+    merged = []
+    for interval in intervals:
+        if merged and _touches(merged[-1], interval):
+            last = merged[-1]
+            if last[2] is None or interval[2] is None:
+                high = (None, False)
+            else:
+                order = compare_evr(interval[2], last[2])
+                if order == 0:
+                    high = (last[2], last[3] or interval[3])
+                else:
+                    high = interval[2:] if order > 0 else last[2:]
+            merged[-1] = last[:2] + high
+        else:
+            merged.append(interval)
+    return merged
+
+def _node_intervals(node):
+    if isinstance(node, With):
+        result = EVERYTHING
+        for child in node.children:
+            result = intersect(result, _node_intervals(child))
+        return result
+    if isinstance(node, Or):
+        result = []
+        for child in node.children:
+            result = union(result, _node_intervals(child))
+        return result
+    if not isinstance(node, Atom):
+        raise ValueError('Cannot simplify {!r}'.format(node))
+    if node.operator is None:
+        return EVERYTHING
+    return _atom_intervals(node.operator, node.evr)
+
+# Return the intervals of rpm versions that satisfy every (operator,
+# version) specifier of a project.
+def specifier_intervals(name, specs):
+    result = EVERYTHING
+    for operator, version_id in specs:
+        result = intersect(result, _node_intervals(convert_node(name, operator, version_id)))
+    return result
+
+def render(name, intervals):
+    if not intervals:
+        raise Unsatisfiable('No version of {} satisfies the requirement'.format(name))
+    first, last = intervals[0], intervals[-1]
+    clauses = []
+    if len(intervals) == 1 and first[0] is not None and first[2] is not None and \
+       first[1] and first[3] and compare_evr(first[0], first[2]) == 0:
+        return '{} = {}'.format(name, first[0])
+    if first[0] is not None:
+        clauses.append('{} {} {}'.format(name, '>=' if first[1] else '>', first[0]))
+    if last[2] is not None:
+        clauses.append('{} {} {}'.format(name, '<=' if last[3] else '<', last[2]))
+    for before, after in zip(intervals, intervals[1:]):
+        clauses.append('({} {} {} or {} {} {})'.format(
+            name, '<=' if before[3] else '<', before[2],
+            name, '>=' if after[1] else '>', after[0]))
+    if not clauses:
+        return name
+    if len(clauses) == 1:
+        return clauses[0]
+    return '({})'.format(' with '.join(clauses))
+
+# Convert (operator, version) specifiers to the smallest equivalent
+# dependency.  Raises Unsatisfiable if no version satisfies them all.
+# Specifiers that convert to something that cannot be ordered, such as
+# an invalid version, are combined as convert_specifiers() does.
+def simplify_specifiers(name, specs):
+    try:
+        intervals = specifier_intervals(name, specs)
+    except ValueError:
+        return convert_specifiers(name, specs)
+    return render(name, intervals)
+
+def convert_requirement(req):
+    project_name, specs = _get_backend().parse_requirement(req)
+    return simplify_specifiers(project_name, specs)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Gordon Messmer <gordon.messmer@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# A read-only table of pre-rendered versions, shared by memory mapping.
+#
+# Rendering a version means parsing it, and every worker of a large
+# conversion parses the same version strings again and keeps its own
+# copies in its caches.  A table built once maps each version string to
+# its rendered rpm version and to the upper bounds used by
+# the ~= and != converters.  Workers map the file
+# read-only, so the operating system shares one copy of its pages.
+#
+# Layout, all integers little endian:
+#
+#   header   8s magic, I record count, I slot count
+#   slots    slot count x I: 1 + index of a record, or 0 if empty
+#   records  record count x (I data offset, H key length,
+#            H rendered length, H compatible length,
+#            H increment length, B flags, 3x padding)
+#   data     for each record: key, rendered, compatible, increment
+#
+# Records are sorted by key.  Slots form an open-addressing hash table,
+# indexed by the CRC-32 of the key and probed linearly.  Empty
+# compatible or increment values mean the conversion is invalid.
+#
+# pyreq2rpm-versiontable builds a table from lists of versions, for the
+# --version-table option of pyreq2rpm.
+
+import argparse
+import mmap
+import struct
+import sys
+import zlib
+
+from pyreq2rpm.expression import INVALID, Atom, Or, With
+
+MAGIC = b'PYR2RVT\x01'
+
+FLAG_LEGACY = 1
+# The version has pre, dev or post components
+FLAG_QUALIFIED = 2
+
+_header = struct.Struct('<8sII')
+_slot = struct.Struct('<I')
+_record = struct.Struct('<IHHHHB3x')
+
+class InvalidTable(ValueError):
+    pass
+
+def _render(version_id):
+    from pyreq2rpm.pyreq2rpm import RpmVersion
+    version = RpmVersion(version_id)
+    rendered = str(version)
+    if version.is_legacy():
+        return rendered, '', '', FLAG_LEGACY
+    flags = FLAG_QUALIFIED if version.pre or version.dev or version.post else 0
+    compatible = ''
+    if len(version.version) > 1:
+        compatible = str(version.replace(version=version.version[:-1]).increment())
+    return rendered, compatible, str(version.increment()), flags
+
+# Write a table for version_ids to path.  Versions that cannot be
+# parsed are left out.
+def build_table(version_ids, path):
+    entries = []
+    for version_id in sorted(set(version_ids)):
+        try:
+            rendered, compatible, increment, flags = _render(version_id)
+        except ValueError:
+            continue
+        fields = [x.encode('utf-8') for x in (version_id, rendered, compatible, increment)]
+        if max(len(x) for x in fields) > 0xffff:
+            continue
+        entries.append((fields, flags))
+    slot_count = 1
+    while slot_count < 2 * len(entries):
+        slot_count *= 2
+    slots = [0] * slot_count
+    for index, (fields, flags) in enumerate(entries):
+        slot = zlib.crc32(fields[0]) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = index + 1
+    data_offset = _header.size + slot_count * _slot.size + len(entries) * _record.size
+    with open(path, 'wb') as table:
+        table.write(_header.pack(MAGIC, len(entries), slot_count))
+        table.write(struct.pack('<{}I'.format(slot_count), *slots))
+        offset = data_offset
+        for fields, flags in entries:
+            table.write(_record.pack(offset, *[len(x) for x in fields], flags))
+            offset += sum(len(x) for x in fields)
+        for fields, flags in entries:
+            table.write(b''.join(fields))
+
+class VersionTable():
+    def __init__(self, path):
+        with open(path, 'rb') as table:
+            self._map = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _header.size:
+            raise InvalidTable('{}: truncated'.format(path))
+        magic, self.count, self._slot_count = _header.unpack_from(self._map)
+        if magic != MAGIC:
+            raise InvalidTable('{}: not a version table'.format(path))
+        self._records = _header.size + self._slot_count * _slot.size
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, key):
+        mapped = self._map
+        mask = self._slot_count - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            index = _slot.unpack_from(mapped, _header.size + slot * _slot.size)[0]
+            if not index:
+                return None
+            record = _record.unpack_from(mapped, self._records + (index - 1) * _record.size)
+            offset, key_length = record[0], record[1]
+            if key_length == len(key) and mapped[offset:offset + key_length] == key:
+                return record
+            slot = (slot + 1) & mask
+
+    # Return (rendered, compatible, increment, flags) for version_id, or
+    # None if it is not in the table
+    def lookup(self, version_id):
+        record = self._find(version_id.encode('utf-8', 'surrogateescape'))
+        if record is None:
+            return None
+        offset, key_length, rendered_length, compatible_length, increment_length, flags = record
+        start = offset + key_length
+        values = []
+        for length in (rendered_length, compatible_length, increment_length):
+            values.append(self._map[start:start + length].decode('utf-8'))
+            start += length
+        values.append(flags)
+        return tuple(values)
+
+    # As pyreq2rpm.convert_node(), or None if version_id is not in the
+    # table
+    def convert_node(self, name, operator, version_id):
+        wildcard = version_id.endswith('.*')
+        if wildcard and operator == '==':
+            # Prefix matches are rewritten as ~= on a different version
+            return None
+        entry = self.lookup(version_id[:-2] if wildcard else version_id)
+        if entry is None:
+            return None
+        rendered, compatible, increment, flags = entry
+        if operator == '~=':
+            if wildcard or not compatible:
+                return INVALID
+            return With((Atom(name, '>=', rendered), Atom(name, '<', compatible)))
+        if operator in ('==', '==='):
+            if wildcard:
+                return INVALID
+            return Atom(name, '=', rendered)
+        if operator == '!=':
+            if wildcard:
+                if not increment:
+                    return INVALID
+                return Or((Atom(name, '<', rendered + '~~'), Atom(name, '>=', increment)))
+            return Or((Atom(name, '<', rendered), Atom(name, '>', rendered)))
+        if operator not in ('<', '<=', '>', '>='):
+            return None
+        if wildcard:
+            # see the notes on prefix matching in pyreq2rpm._ordered
+            if operator == '>':
+                operator = '>='
+            if operator == '<=':
+                operator = '<'
+        if not flags:
+            if operator == '<':
+                rendered = '{}~~'.format(rendered)
+            elif operator == '>':
+                rendered = '{}.0'.format(rendered)
+        return Atom(name, operator, rendered)
+
+    # As pyreq2rpm.convert(), or None if version_id is not in the table
+    def convert(self, name, operator, version_id):
+        converted = self.convert_node(name, operator, version_id)
+        return None if converted is None else converted.text()
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pyreq2rpm-versiontable',
+                                     description='Build a table of rendered versions for pyreq2rpm --version-table')
+    parser.add_argument('table', help='path of the table to write')
+    parser.add_argument('versions', nargs='*', type=argparse.FileType('r'),
+                        help='files of versions, one per line (default: read from stdin)')
+    args = parser.parse_args(argv)
+
+    version_ids = []
+    for versions in args.versions or [sys.stdin]:
+        version_ids.extend(x.strip() for x in versions if x.strip())
+        if versions is not sys.stdin:
+            versions.close()
+    build_table(version_ids, args.table)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,7 +8,13 @@ setup(
     description='Convert Python requirements to rpm',
     license='MIT',
     packages=['pyreq2rpm'],
-    install_requires=['setuptools'],
+    entry_points={'console_scripts': ['pyreq2rpm = pyreq2rpm.cli:main',
+                                      'pyreq2rpm-daemon = pyreq2rpm.daemon:serve_main',
+                                      'pyreq2rpm-client = pyreq2rpm.daemon:client_main',
+                                      'pyreq2rpm-verify = pyreq2rpm.reverse:main',
+                                      'pyreq2rpm-versiontable = pyreq2rpm.versiontable:main']},
+    extras_require={'packaging': ['packaging'],
+                    'pkg_resources': ['setuptools']},
     setup_requires=['setuptools'],
     tests_require=['pytest'],
 )
@@ -0,0 +1,8 @@
+import os
+
+# Return the non-empty, non-comment lines of a file in tests/data
+def read_corpus(name):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', name)
+    with open(path) as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.startswith('#')]
@@ -0,0 +1,135 @@
+import pytest
+
+import io
+import os
+import tarfile
+import zipfile
+from pyreq2rpm import archives
+from pyreq2rpm.cli import main
+
+def make_wheel(directory, name, version, requirements, extra_members=()):
+    path = directory / '{}-{}-py3-none-any.whl'.format(name, version)
+    dist_info = '{}-{}.dist-info'.format(name, version)
+    metadata = 'Metadata-Version: 2.1\nName: {}\nVersion: {}\n'.format(name, version)
+    metadata += ''.join('Requires-Dist: {}\n'.format(x) for x in requirements)
+    metadata += '\n' + 'Requires-Dist: body\n' * 100
+    with zipfile.ZipFile(str(path), 'w', zipfile.ZIP_DEFLATED) as wheel:
+        wheel.writestr('{}/__init__.py'.format(name), '')
+        for member in extra_members:
+            wheel.writestr(member, 'Requires-Dist: wrong\n')
+        wheel.writestr(dist_info + '/METADATA', metadata)
+        wheel.writestr(dist_info + '/RECORD', '')
+    return path
+
+@pytest.fixture
+def wheels(tmp_path):
+    make_wheel(tmp_path, 'b_pkg', '1.0', ['six>=1.10', 'requests[socks]>=2.0,<3', 'foo>=1,'])
+    make_wheel(tmp_path, 'a_pkg', '2.0', ['attrs~=19.2', 'pytest; extra == "test"'],
+               extra_members=['a_pkg/vendored/x-1.dist-info/METADATA', 'other-1.dist-info/METADATA'])
+    (tmp_path / 'broken-1.0-py3-none-any.whl').write_bytes(b'not a zip file')
+    (tmp_path / 'README').write_text('')
+    return tmp_path
+
+def test_read_wheel_requirements(wheels):
+    assert archives.read_wheel_requirements(str(wheels / 'a_pkg-2.0-py3-none-any.whl')) == [
+        'attrs~=19.2', 'pytest; extra == "test"']
+    with pytest.raises(archives.InvalidArchive):
+        archives.read_wheel_requirements(str(wheels / 'broken-1.0-py3-none-any.whl'))
+
+@pytest.mark.parametrize('names, filename, expected', [
+    (['x/__init__.py', 'x-1.dist-info/METADATA'], 'x-1-py3-none-any.whl', 'x-1.dist-info/METADATA'),
+    (['Foo_Bar-1.dist-info/METADATA', 'y-1.dist-info/METADATA'], 'foo_bar-1-py3-none-any.whl',
+     'Foo_Bar-1.dist-info/METADATA'),
+    (['x/y-1.dist-info/METADATA'], 'x-1-py3-none-any.whl', None),
+    (['y-1.dist-info/METADATA', 'z-1.dist-info/METADATA'], 'x-1-py3-none-any.whl', None),
+])
+def test_find_wheel_metadata(names, filename, expected):
+    if expected is None:
+        with pytest.raises(archives.InvalidArchive):
+            archives._find_wheel_metadata(names, filename)
+    else:
+        assert archives._find_wheel_metadata(names, filename) == expected
+
+@pytest.mark.parametrize('workers', [1, 3, None])
+def test_convert_wheels(wheels, workers):
+    results = archives.convert_wheels([str(wheels)], workers)
+    assert [x[0].rsplit('/', 1)[1] for x in results] == [
+        'a_pkg-2.0-py3-none-any.whl', 'b_pkg-1.0-py3-none-any.whl', 'broken-1.0-py3-none-any.whl']
+    assert [x[1] for x in results] == [
+        ['(python3dist(attrs) >= 19.2 with python3dist(attrs) < 20)'],
+        ['python3dist(six) >= 1.10', '(python3dist(requests[socks]) < 3~~ with python3dist(requests[socks]) >= 2)'],
+        []]
+    assert [len(x[2]) for x in results] == [0, 1, 1]
+
+def test_main_wheels(wheels, capsys):
+    wheel = str(wheels / 'a_pkg-2.0-py3-none-any.whl')
+    assert main(['--multifile', '--wheels', wheel]) == 0
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [';' + wheel, '(python3dist(attrs) >= 19.2 with python3dist(attrs) < 20)']
+    assert main(['--wheels', str(wheels), '--jobs', '2']) == 1
+
+def make_sdist(directory, name, members, suffix='.tar.gz'):
+    # members is a list of (name, content) in archive order
+    path = directory / '{}-1.0{}'.format(name, suffix)
+    if suffix == '.zip':
+        with zipfile.ZipFile(str(path), 'w') as sdist:
+            for member, content in members:
+                sdist.writestr('{}-1.0/{}'.format(name, member), content)
+        return path
+    with tarfile.open(str(path), 'w:' + suffix.rsplit('.', 1)[1].replace('tar', '')) as sdist:
+        for member, content in members:
+            info = tarfile.TarInfo('{}-1.0/{}'.format(name, member))
+            data = content.encode('utf-8') if isinstance(content, str) else content
+            info.size = len(data)
+            sdist.addfile(info, io.BytesIO(data))
+    return path
+
+PKG_INFO = 'Metadata-Version: 2.1\nName: pkg\nVersion: 1.0\n'
+REQUIRES_TXT = 'six>=1.10\n\n[test]\npytest\n'
+
+@pytest.mark.parametrize('members, expected', [
+    ([('setup.py', ''), ('PKG-INFO', PKG_INFO), ('pkg.egg-info/PKG-INFO', PKG_INFO),
+      ('pkg.egg-info/requires.txt', REQUIRES_TXT)],
+     ['six>=1.10', 'pytest; extra == "test"']),
+    ([('src/pkg.egg-info/requires.txt', REQUIRES_TXT), ('PKG-INFO', PKG_INFO)],
+     ['six>=1.10', 'pytest; extra == "test"']),
+    ([('PKG-INFO', PKG_INFO + 'Requires-Dist: attrs\n'), ('pkg.egg-info/requires.txt', 'attrs\n')],
+     ['attrs']),
+    ([('PKG-INFO', PKG_INFO)], []),
+    ([('sub/PKG-INFO', PKG_INFO + 'Requires-Dist: wrong\n'), ('PKG-INFO', PKG_INFO)], []),
+])
+@pytest.mark.parametrize('suffix', ['.tar.gz', '.tar.bz2', '.tar.xz', '.zip'])
+def test_read_sdist_requirements(tmp_path, members, expected, suffix):
+    path = make_sdist(tmp_path, 'pkg', members, suffix)
+    assert archives.read_sdist_requirements(str(path)) == expected
+
+@pytest.mark.parametrize('metadata, stops', [
+    (PKG_INFO.replace('2.1', '2.2') + 'Requires-Dist: six\n', True),
+    (PKG_INFO.replace('2.1', '2.2'), True),
+    (PKG_INFO.replace('2.1', '2.2') + 'Dynamic: Requires-Dist\n', False),
+    (PKG_INFO, False),
+])
+def test_read_sdist_stops_early(tmp_path, metadata, stops):
+    # A truncated stream is only noticed if the reader goes past the
+    # metadata
+    path = make_sdist(tmp_path, 'pkg', [('PKG-INFO', metadata), ('data.bin', os.urandom(200000))])
+    path.write_bytes(path.read_bytes()[:100000])
+    if stops:
+        assert archives.read_sdist_requirements(str(path)) == (['six'] if 'six' in metadata else [])
+    else:
+        with pytest.raises(archives.InvalidArchive):
+            archives.read_sdist_requirements(str(path))
+
+def test_convert_sdists(tmp_path, capsys):
+    make_sdist(tmp_path, 'b', [('PKG-INFO', PKG_INFO), ('b.egg-info/requires.txt', REQUIRES_TXT)])
+    make_sdist(tmp_path, 'a', [('setup.py', '')], suffix='.zip')
+    (tmp_path / 'c-1.0.tar.gz').write_bytes(b'not a tar file')
+    results = archives.convert_sdists([str(tmp_path)], workers=2)
+    assert [(x[0].rsplit('/', 1)[1], x[1], len(x[2])) for x in results] == [
+        ('a-1.0.zip', [], 1),
+        ('b-1.0.tar.gz', ['python3dist(six) >= 1.10'], 0),
+        ('c-1.0.tar.gz', [], 1)]
+    assert main(['--sdists', str(tmp_path)]) == 1
+    out, err = capsys.readouterr()
+    assert out == 'python3dist(six) >= 1.10\n'
+    assert len(err.splitlines()) == 2
@@ -0,0 +1,38 @@
+import pytest
+
+import itertools
+from pyreq2rpm.pyreq2rpm import ConversionResult, convert_requirements
+
+def test_convert_requirements():
+    items = ['six>=1.10',
+             ('foobar', '~=', '2.4.8'),
+             'foo>=1,',
+             ['foobar', '~=', '2'],
+             ('foobar', '=>', '2'),
+             ('foobar', '>='),
+             'babel>=1.3,!=2.0',
+             'six>=1.10']
+    assert list(convert_requirements(items)) == [
+        ConversionResult('six>=1.10', 'six >= 1.10', None),
+        ConversionResult(('foobar', '~=', '2.4.8'), '(foobar >= 2.4.8 with foobar < 2.5)', None),
+        ConversionResult('foo>=1,', None, 'invalid-requirement'),
+        ConversionResult(['foobar', '~=', '2'], None, 'invalid-version'),
+        ConversionResult(('foobar', '=>', '2'), None, 'invalid-operator'),
+        ConversionResult(('foobar', '>='), None, 'invalid-requirement'),
+        ConversionResult('babel>=1.3,!=2.0', '((babel < 2 or babel > 2) with babel >= 1.3)', None),
+        ConversionResult('six>=1.10', 'six >= 1.10', None),
+    ]
+
+def test_convert_requirements_malformed():
+    items = [('foo', '>=', None), ('foo', '>=', 1), None, 42, ['foo', ['>='], '1'],
+             ('foo', '>=', b'1'), 'six']
+    results = list(convert_requirements(items))
+    assert [x.input for x in results] == items
+    assert [(x.output, x.error) for x in results] == [(None, 'invalid-requirement')] * 6 + [('six', None)]
+
+def test_convert_requirements_lazy():
+    # An endless input must be consumed one item at a time
+    items = itertools.cycle(['requests>=2.0', 'requests>=2.0,<3', 'requests[socks]'])
+    results = convert_requirements(items, cache_size=2)
+    assert [x.output for x in itertools.islice(results, 4)] == [
+        'requests >= 2', '(requests < 3~~ with requests >= 2)', 'requests', 'requests >= 2']
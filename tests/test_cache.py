@@ -0,0 +1,66 @@
+import pytest
+
+from pyreq2rpm import pyreq2rpm
+from pyreq2rpm.pyreq2rpm import convert, convert_requirement
+
+@pytest.fixture
+def cache():
+    pyreq2rpm.enable_cache()
+    pyreq2rpm.cache_clear()
+    yield
+    pyreq2rpm.disable_cache()
+
+def test_cache_disabled():
+    assert not pyreq2rpm.cache_enabled()
+    assert pyreq2rpm.cache_info() == {}
+    with pytest.raises(ValueError):
+        pyreq2rpm.cache_resize(10)
+
+def test_cache_layers(cache):
+    assert convert_requirement('six>=1.10') == 'six >= 1.10'
+    assert convert_requirement('six>=1.10') == 'six >= 1.10'
+    info = pyreq2rpm.cache_info()
+    assert info['requirement'].hits == 1
+    assert info['requirement'].misses == 1
+    assert info['convert'].misses == 1
+    assert convert('six', '>=', '1.10') == 'six >= 1.10'
+    assert pyreq2rpm.cache_info()['convert'].hits == 1
+    # Plain releases are rendered without parsing, other versions use
+    # the version cache
+    assert convert('six', '==', '1.10b1') == 'six = 1.10~b1'
+    assert convert('six', '!=', '1.10b1') == '(six < 1.10~b1 or six > 1.10~b1)'
+    info = pyreq2rpm.cache_info()
+    assert info['version'].hits == 1
+    assert info['version'].currsize == 1
+
+def test_cache_invalid_version(cache):
+    assert convert('foobar', '~=', 'dev') == 'Invalid version'
+    assert convert('foobar', '~=', 'dev') == 'Invalid version'
+    assert pyreq2rpm.cache_info()['convert'].hits == 1
+
+def test_cache_eviction(cache):
+    pyreq2rpm.cache_resize({'convert': 2})
+    for version in ('1.0b1', '2.0b1', '3.0b1', '1.0b1'):
+        convert('foobar', '>=', version)
+    info = pyreq2rpm.cache_info()['convert']
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (0, 4, 2, 2)
+    # '1.0b1' was used most recently, so '3.0b1' is evicted next
+    convert('foobar', '>=', '1.0b1')
+    convert('foobar', '>=', '4.0b1')
+    convert('foobar', '>=', '1.0b1')
+    assert pyreq2rpm.cache_info()['convert'].hits == 2
+    pyreq2rpm.cache_resize(1)
+    assert pyreq2rpm.cache_info()['convert'].currsize == 1
+    assert pyreq2rpm.cache_info()['version'].maxsize == 1
+
+def test_cache_clear(cache):
+    convert_requirement('requests>=2.0')
+    pyreq2rpm.cache_clear()
+    assert all(info.currsize == info.hits == info.misses == 0
+               for info in pyreq2rpm.cache_info().values())
+
+def test_cache_invalid_size(cache):
+    with pytest.raises(ValueError):
+        pyreq2rpm.cache_resize({'compiled': 10})
+    with pytest.raises(ValueError):
+        pyreq2rpm.cache_resize(-1)
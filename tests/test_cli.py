@@ -0,0 +1,296 @@
+import pytest
+
+import io
+from pyreq2rpm.cli import main
+from pyreq2rpm.dependencies import (MergedDependencies, environments_dependencies, merge_requirements,
+                                    namespaces_dependencies, requirements_dependencies)
+from pyreq2rpm import markers
+from pyreq2rpm.markers import evaluate_marker, evaluate_marker_batch, parse_marker, python_environment
+from pyreq2rpm.metadata import find_metadata, parse_requires_txt
+from conftest import read_corpus
+
+METADATA = '''Metadata-Version: 2.1
+Name: example
+Version: 1.0
+Requires-Dist: Six>=1.10
+Requires-Dist: zope.interface
+Requires-Dist: requests[socks,security] (>=2.0,<3)
+Requires-Dist: pytest ; extra == 'Test_Suite'
+Requires-Dist: pywin32 ; sys_platform == "win32"
+Requires-Dist: six>=1.10
+Provides-Extra: test-suite
+
+A description that mentions Requires-Dist: nothing
+'''
+
+REQUIRES_TXT = '''attrs>=19.2
+
+[test]
+pytest
+
+[:python_version < "3"]
+enum34
+
+[:sys_platform != "win32"]
+pexpect>4; python_version >= "3"
+'''
+
+@pytest.fixture
+def site(tmp_path):
+    dist_info = tmp_path / 'example-1.0.dist-info'
+    dist_info.mkdir()
+    (dist_info / 'METADATA').write_text(METADATA)
+    (dist_info / 'RECORD').write_text('')
+    egg_info = tmp_path / 'other-2.0-py3.11.egg-info'
+    egg_info.mkdir()
+    (egg_info / 'PKG-INFO').write_text('Metadata-Version: 1.1\nName: other\nVersion: 2.0\n')
+    (egg_info / 'requires.txt').write_text(REQUIRES_TXT)
+    return tmp_path
+
+@pytest.mark.parametrize('path, expected', [
+    ('/usr/lib/python3/site-packages/a-1.dist-info', '/usr/lib/python3/site-packages/a-1.dist-info'),
+    ('/usr/lib/python3/site-packages/a-1.dist-info/METADATA', '/usr/lib/python3/site-packages/a-1.dist-info'),
+    ('/usr/lib/python3/site-packages/a-1.egg-info/', '/usr/lib/python3/site-packages/a-1.egg-info'),
+    ('/usr/lib/python3/site-packages/a-1.egg-info', '/usr/lib/python3/site-packages/a-1.egg-info'),
+    ('/usr/lib/python3/site-packages/a/__init__.py', None),
+])
+def test_find_metadata(path, expected):
+    assert find_metadata(path) == expected
+
+def test_parse_requires_txt():
+    assert parse_requires_txt(REQUIRES_TXT) == [
+        'attrs>=19.2',
+        'pytest; extra == "test"',
+        'enum34; python_version < "3"',
+        'pexpect>4; (python_version >= "3") and (sys_platform != "win32")',
+    ]
+    assert parse_requires_txt('[test:python_version < "3"]\nmock\n') == [
+        'mock; (extra == "test") and (python_version < "3")']
+
+@pytest.mark.parametrize('marker, environment, expected', [
+    ('python_version >= "3"', {'python_version': '3.11'}, True),
+    ('python_version < "3.10"', {'python_version': '3.9'}, True),
+    ('python_version < "3.10"', {'python_version': '3.11'}, False),
+    ('python_version == "3.*"', {'python_version': '3.11'}, True),
+    ('python_version ~= "3.8"', {'python_version': '3.11'}, True),
+    ('python_full_version < "3.11.0"', {'python_full_version': '3.11.0rc1'}, False),
+    ('python_full_version > "3.11"', {'python_full_version': '3.11.post1'}, False),
+    ('python_full_version > "3.11"', {'python_full_version': '3.11.post1.dev1'}, False),
+    ('python_full_version > "3.11rc1"', {'python_full_version': '3.11rc1.post1'}, False),
+    ('python_full_version > "3.11rc1"', {'python_full_version': '3.11.post1'}, True),
+    ('python_full_version > "3.11.dev0"', {'python_full_version': '3.11.0.post1.dev1'}, True),
+    ('python_full_version > "3.11.post1"', {'python_full_version': '3.11.post2'}, True),
+    ('python_full_version > "3.11rc1"', {'python_full_version': '3.11.1.post1'}, True),
+    # Pre-release interpreters
+    ('python_full_version >= "3.8"', {'python_full_version': '3.13.0rc1'}, True),
+    ('python_full_version >= "3.13"', {'python_full_version': '3.13.0rc1'}, False),
+    ('python_full_version < "3.13"', {'python_full_version': '3.13.0b1'}, False),
+    ('python_full_version < "3.13"', {'python_full_version': '3.12.0.dev1'}, True),
+    ('python_full_version < "3.13.0.post1"', {'python_full_version': '3.13.0.post1.dev1'}, False),
+    ('python_full_version == "3.13.*"', {'python_full_version': '3.13.0a1'}, True),
+    ('python_full_version ~= "3.12"', {'python_full_version': '3.13.0b1'}, True),
+    ('python_full_version != "3.13"', {'python_full_version': '3.13.0.dev0'}, True),
+    ('sys_platform == "win32" or os_name == "posix"', {'sys_platform': 'linux', 'os_name': 'posix'}, True),
+    ('sys_platform == "win32" and os_name == "posix"', {'sys_platform': 'linux', 'os_name': 'posix'}, False),
+    ('(os_name == "nt" or os_name == "posix") and extra == "a"', {'os_name': 'posix', 'extra': 'a'}, True),
+    ('platform_machine in "x86_64 aarch64"', {'platform_machine': 'aarch64'}, True),
+    ('"arm" not in platform_machine', {'platform_machine': 'armv7l'}, False),
+    ('extra == "Test_Suite"', {'extra': 'test-suite'}, True),
+    ('extra == "test"', None, False),
+    ('implementation_name == "cpython"', {'implementation_name': 'cpython'}, True),
+])
+def test_evaluate_marker(marker, environment, expected):
+    assert evaluate_marker(marker, environment) is expected
+    # Compiled and parsed markers agree
+    assert evaluate_marker(parse_marker(marker), environment) is expected
+
+def test_default_environment_cached(monkeypatch):
+    calls = []
+    def default_environment():
+        calls.append(None)
+        return {'os_name': 'posix'}
+    monkeypatch.setattr(markers, 'default_environment', default_environment)
+    monkeypatch.setattr(markers, '_default_marker_environment', None)
+    assert evaluate_marker('os_name == "posix"')
+    assert not evaluate_marker('os_name == "posix"', {'os_name': 'nt'})
+    assert markers.marker_environment() == {'os_name': 'posix', 'extra': ''}
+    assert len(calls) == 1
+
+def test_evaluate_marker_batch():
+    environments = [python_environment('2.7', platform_machine='i686'),
+                    python_environment('3.12', platform_machine='aarch64'),
+                    python_environment('3.12', platform_machine='x86_64', extra='test')]
+    assert evaluate_marker_batch('python_version >= "3"', environments) == [False, True, True]
+    assert evaluate_marker_batch('platform_machine == "x86_64" or extra == "Test"',
+                                 environments) == [False, False, True]
+    assert evaluate_marker_batch('python_full_version >= "3.12.0"', environments) == [False, True, True]
+    # Pre-release targets are selected like final releases
+    environments = [python_environment('3.13'),
+                    python_environment('3.14', python_full_version='3.14.0rc1'),
+                    python_environment('3.15', python_full_version='3.15.0a1.dev0')]
+    assert evaluate_marker_batch('python_full_version >= "3.8"', environments) == [True, True, True]
+    assert evaluate_marker_batch('python_full_version < "3.14"', environments) == [True, False, False]
+    assert evaluate_marker_batch('python_full_version >= "3.14.0a1"', environments) == [False, True, True]
+
+def test_environments_dependencies():
+    requirements = ['six',
+                    'enum34; python_version < "3"',
+                    'numpy>=1.26; python_version >= "3.12" and platform_machine != "s390x"',
+                    'pytest; extra == "test"',
+                    'bad>=1,; python_version < "3"']
+    environments = [{'python_version': '2.7'},
+                    {'python_version': '3.12', 'platform_machine': 's390x'},
+                    {'python_version': '3.12', 'platform_machine': 'x86_64', 'extra': 'test'}]
+    errors = []
+    assert environments_dependencies(requirements, 'example', environments, 'python3.12dist',
+                                     errors) == [
+        ['python3.12dist(six)', 'python3.12dist(enum34)'],
+        ['python3.12dist(six)'],
+        ['python3.12dist(six)', 'python3.12dist(numpy) >= 1.26', 'python3.12dist(pytest)'],
+    ]
+    assert len(errors) == 1 and errors[0].startswith('example: ')
+    assert environments_dependencies(['six; python_full_version >= "3.8"'], 'example',
+                                     [{'python_full_version': '3.14.0rc1'},
+                                      {'python_full_version': '3.15.0a1.dev0'}]) == [
+        ['python3dist(six)'], ['python3dist(six)']]
+
+def test_main(site, monkeypatch, capsys):
+    paths = [site / 'example-1.0.dist-info' / 'METADATA',
+             site / 'example-1.0.dist-info' / 'RECORD',
+             site / 'example' / '__init__.py',
+             site / 'other-2.0-py3.11.egg-info']
+    monkeypatch.setattr('sys.stdin', io.StringIO(''.join('{}\n'.format(x) for x in paths)))
+    assert main([]) == 0
+    out, err = capsys.readouterr()
+    assert err == ''
+    assert out.splitlines() == [
+        'python3dist(six) >= 1.10',
+        'python3dist(zope-interface)',
+        '(python3dist(requests[security]) < 3~~ with python3dist(requests[security]) >= 2)',
+        '(python3dist(requests[socks]) < 3~~ with python3dist(requests[socks]) >= 2)',
+        'python3dist(attrs) >= 19.2',
+        'python3dist(pexpect) > 4.0',
+    ]
+
+def test_main_multifile(site, capsys):
+    metadata = str(site / 'example-1.0.dist-info' / 'METADATA')
+    egg_info = str(site / 'other-2.0-py3.11.egg-info')
+    assert main(['--multifile', '--namespace', 'python3.11dist', metadata, egg_info]) == 0
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [
+        ';' + metadata,
+        'python3.11dist(six) >= 1.10',
+        'python3.11dist(zope-interface)',
+        '(python3.11dist(requests[security]) < 3~~ with python3.11dist(requests[security]) >= 2)',
+        '(python3.11dist(requests[socks]) < 3~~ with python3.11dist(requests[socks]) >= 2)',
+        ';' + egg_info,
+        'python3.11dist(attrs) >= 19.2',
+        'python3.11dist(pexpect) > 4.0',
+    ]
+
+def test_main_namespaces(site, capsys):
+    egg_info = str(site / 'other-2.0-py3.11.egg-info')
+    assert main(['--namespace', 'python3dist', '--namespace', 'python3.11dist', egg_info]) == 0
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [
+        'python3dist(attrs) >= 19.2',
+        'python3dist(pexpect) > 4.0',
+        'python3.11dist(attrs) >= 19.2',
+        'python3.11dist(pexpect) > 4.0',
+    ]
+    with pytest.raises(SystemExit):
+        main(['--namespace', 'python3dist', '--namespace', 'python3.11dist', '--tree', str(site)])
+
+def test_main_errors(tmp_path, capsys):
+    dist_info = tmp_path / 'bad-1.0.dist-info'
+    dist_info.mkdir()
+    (dist_info / 'METADATA').write_text('Name: bad\nRequires-Dist: foo>=1,\nRequires-Dist: bar ~= 2\n'
+                                        'Requires-Dist: baz; os_name === \nRequires-Dist: six\n')
+    assert main([str(dist_info)]) == 1
+    out, err = capsys.readouterr()
+    assert out.splitlines() == ['python3dist(six)']
+    assert len(err.splitlines()) == 3
+
+def test_main_unreadable(site, capsys):
+    broken = site / 'broken-1.0.dist-info'
+    broken.mkdir()
+    metadata = str(site / 'example-1.0.dist-info' / 'METADATA')
+    assert main(['--multifile', str(broken), metadata]) == 1
+    out, err = capsys.readouterr()
+    assert out.splitlines()[0] == ';' + metadata
+    assert len(out.splitlines()) == 5
+    assert err.splitlines() == ['{}: No such file or directory'.format(broken / 'METADATA')]
+
+def test_merge_requirements():
+    requirements = ['pyparsing>=2.0.1',
+                    'pyparsing!=2.0.4,!=2.1.2',
+                    'Requests[socks]>=2.0',
+                    'requests>=2.0',
+                    'requests>=2.20,<3; python_version >= "3"',
+                    'requests<2; python_version < "3"',
+                    'six']
+    assert merge_requirements(requirements, None) == MergedDependencies([
+        '(python3dist(pyparsing) >= 2.0.1 with (python3dist(pyparsing) < 2.0.4 or '
+        'python3dist(pyparsing) > 2.0.4) with (python3dist(pyparsing) < 2.1.2 or '
+        'python3dist(pyparsing) > 2.1.2))',
+        'python3dist(requests[socks]) >= 2',
+        '(python3dist(requests) >= 2.20 with python3dist(requests) < 3~~)',
+        'python3dist(six)',
+    ], 1)
+
+def test_merge_requirements_errors():
+    requirements = ['foo>=2', 'foo<1', 'bar>=1,', 'six']
+    errors = []
+    assert merge_requirements(requirements, 'example', errors=errors).dependencies == [
+        'python3dist(foo) >= 2', 'python3dist(foo) < 1~~', 'python3dist(six)']
+    assert len(errors) == 2
+    assert all(x.startswith('example: ') for x in errors)
+    with pytest.raises(ValueError):
+        merge_requirements(requirements[:2], 'example')
+
+@pytest.mark.parametrize('os_name, expected', [('posix', 'python3dist(six) >= 1.12'),
+                                                ('nt', 'python3dist(six) >= 1.14')])
+def test_main_merge(tmp_path, capsys, monkeypatch, os_name, expected):
+    default_environment = markers.default_environment()
+    default_environment['os_name'] = os_name
+    monkeypatch.setattr(markers, 'default_environment', lambda: dict(default_environment))
+    monkeypatch.setattr(markers, '_default_marker_environment', None)
+    dist_info = tmp_path / 'merged-1.0.dist-info'
+    dist_info.mkdir()
+    (dist_info / 'METADATA').write_text('Name: merged\nRequires-Dist: six\nRequires-Dist: six>=1.10\n'
+                                        'Requires-Dist: six>=1.12; os_name == "posix"\n'
+                                        'Requires-Dist: six>=1.14; os_name == "nt"\n')
+    assert main(['--merge', str(dist_info)]) == 0
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [expected]
+    assert err == ''
+    # Three of the four requirements apply, and are merged into one
+    # clause, with or without a cache
+    database = str(tmp_path / 'cache.db')
+    for arguments in ([], ['--cache', database], ['--cache', database]):
+        assert main(['--merge', '--merge-stats', str(dist_info)] + arguments) == 0
+        out, err = capsys.readouterr()
+        assert out.splitlines() == [expected]
+        assert err == 'merge: 2 clauses removed\n'
+
+def test_namespaces_dependencies():
+    requirements = read_corpus('requirements.txt')
+    namespaces = ['python3dist', 'python3.12dist', 'pypi', '%py3dist']
+    errors = []
+    results = namespaces_dependencies(requirements, None, namespaces, errors=errors)
+    for namespace, dependencies in zip(namespaces, results):
+        namespace_errors = []
+        assert dependencies == requirements_dependencies(requirements, None, namespace,
+                                                         errors=namespace_errors)
+        assert errors == namespace_errors
+    assert namespaces_dependencies(['Zope.Interface[Test,docs]>=5,!=5.1', 'six; extra == "x"'],
+                                   None, ['python3dist', 'python3.12dist']) == [
+        ['((python3dist(zope-interface[docs]) < 5.1 or python3dist(zope-interface[docs]) > 5.1) '
+         'with python3dist(zope-interface[docs]) >= 5)',
+         '((python3dist(zope-interface[test]) < 5.1 or python3dist(zope-interface[test]) > 5.1) '
+         'with python3dist(zope-interface[test]) >= 5)'],
+        ['((python3.12dist(zope-interface[docs]) < 5.1 or python3.12dist(zope-interface[docs]) > 5.1) '
+         'with python3.12dist(zope-interface[docs]) >= 5)',
+         '((python3.12dist(zope-interface[test]) < 5.1 or python3.12dist(zope-interface[test]) > 5.1) '
+         'with python3.12dist(zope-interface[test]) >= 5)'],
+    ]
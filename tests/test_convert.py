@@ -1,7 +1,7 @@
 import pytest
 
 import subprocess
-from pyreq2rpm.pyreq2rpm import convert, convert_requirement
+from pyreq2rpm.pyreq2rpm import OPERATORS, convert, convert_requirement
 
 def run_rpmbuild(dep):
     e = subprocess.run(['rpmbuild', '--nobuild', '--define',
@@ -129,3 +129,13 @@ def test_convert(arg, expected):
 def test_convert_requirement(arg, expected):
     assert convert_requirement(arg) == expected
     assert run_rpmbuild(convert_requirement(arg)) == 0
+
+@pytest.mark.parametrize('operator', list(OPERATORS))
+@pytest.mark.parametrize('version_id', [
+    '0', '0.0', '1', '1.0', '1.0.0', '2.4.8', '2.4.8.0', '2.4.8.1', '01.02',
+    '1.0.0.5', '2.*', '2.0.*', '2.4.8.*', '0.*', '10.9.*', '1.09', '10.0', '1.10',
+    '1.10.*', '9.9', '9.9.*',
+])
+def test_convert_plain_release(operator, version_id):
+    # The fast path for plain releases must match the general one
+    assert convert('foobar', operator, version_id) == OPERATORS[operator]('foobar', operator, version_id)
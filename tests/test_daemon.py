@@ -0,0 +1,168 @@
+import pytest
+
+import io
+import json
+import os
+import socket
+import threading
+from pyreq2rpm import daemon, pyreq2rpm
+
+ITEMS = ['six>=1.10',
+         'foo>=1,',
+         ['foobar', '~=', '2.4.8'],
+         ['foobar', '=>', '2'],
+         'babel>=1.3,!=2.0']
+
+EXPECTED = [('six >= 1.10', None),
+            (None, 'invalid-requirement'),
+            ('(foobar >= 2.4.8 with foobar < 2.5)', None),
+            (None, 'invalid-operator'),
+            ('((babel < 2 or babel > 2) with babel >= 1.3)', None)]
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / 'pyreq2rpm.sock')
+    server = daemon.ConversionServer(path, cache_size=64, warm=['six>=1.10', 'foo>=1,'])
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+    pyreq2rpm.disable_cache()
+
+def test_server_warm(server):
+    assert pyreq2rpm.cache_info()['requirement'].currsize == 1
+
+def test_client(server):
+    with daemon.Client(server.server_address) as client:
+        assert client.convert(ITEMS) == EXPECTED
+        # Warmed and repeated requirements come from the cache
+        hits = pyreq2rpm.cache_info()['requirement'].hits
+        assert client.convert(['six>=1.10']) == [('six >= 1.10', None)]
+        assert pyreq2rpm.cache_info()['requirement'].hits == hits + 1
+
+def test_malformed_items(server):
+    # One bad item does not cost the rest of the batch
+    with daemon.Client(server.server_address) as client:
+        assert client.convert([['foo', '>=', None], None, 7, 'six']) == [
+            (None, 'invalid-requirement')] * 3 + [('six', None)]
+
+def test_invalid_request(server):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.server_address)
+        stream = sock.makefile('rwb')
+        stream.write(b'not json\n{"requirements": ["six"]}\n')
+        stream.flush()
+        assert 'error' in json.loads(stream.readline())
+        assert json.loads(stream.readline()) == {'results': [['six', None]]}
+
+def test_convert(server):
+    assert daemon.convert(ITEMS, server.server_address) == EXPECTED
+
+def test_convert_fallback(tmp_path):
+    assert daemon.convert(ITEMS, str(tmp_path / 'missing.sock')) == EXPECTED
+
+def test_stale_socket(tmp_path):
+    path = str(tmp_path / 'stale.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = daemon.ConversionServer(path)
+    server.server_close()
+    pyreq2rpm.disable_cache()
+
+def test_default_socket_path(tmp_path, monkeypatch):
+    monkeypatch.delenv('PYREQ2RPM_SOCKET', raising=False)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', '/run/user/1000')
+    assert daemon.default_socket_path() == '/run/user/1000/pyreq2rpm.sock'
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    path = daemon.default_socket_path()
+    assert path == str(tmp_path / 'pyreq2rpm-{}'.format(os.getuid()) / 'pyreq2rpm.sock')
+    server = daemon.ConversionServer(path)
+    server.server_close()
+    pyreq2rpm.disable_cache()
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+def test_shared_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    directory = tmp_path / 'pyreq2rpm-{}'.format(os.getuid())
+    directory.mkdir(mode=0o777)
+    directory.chmod(0o777)
+    with pytest.raises(daemon.UnsafeSocket):
+        daemon.ConversionServer(str(directory / 'pyreq2rpm.sock'))
+
+def test_stale_file(tmp_path):
+    # Only sockets are replaced
+    path = tmp_path / 'stale.sock'
+    path.write_text('')
+    with pytest.raises(daemon.UnsafeSocket):
+        daemon.ConversionServer(str(path))
+    assert path.exists()
+
+def test_foreign_socket(server, monkeypatch):
+    uid = os.getuid()
+    monkeypatch.setattr('os.getuid', lambda: uid + 1)
+    with pytest.raises(daemon.UnsafeSocket):
+        daemon.Client(server.server_address)
+    with pytest.raises(daemon.UnsafeSocket):
+        daemon._remove_stale_socket(server.server_address)
+    assert daemon.convert(ITEMS, server.server_address) == EXPECTED
+
+def test_convert_connection_lost(tmp_path):
+    # A server that drops the request falls back to in-process conversion
+    path = str(tmp_path / 'closing.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    def drop():
+        connection, _ = listener.accept()
+        connection.close()
+    thread = threading.Thread(target=drop)
+    thread.start()
+    try:
+        assert daemon.convert(ITEMS, path) == EXPECTED
+    finally:
+        thread.join()
+        listener.close()
+
+def test_convert_no_reply(tmp_path):
+    # A server that accepts but never answers times out
+    path = str(tmp_path / 'silent.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    try:
+        assert daemon.convert(ITEMS, path, timeout=0.2) == EXPECTED
+    finally:
+        listener.close()
+
+def test_convert_server_error(server, monkeypatch):
+    # An error response also falls back to in-process conversion
+    def handle(self):
+        for line in self.rfile:
+            self.wfile.write(b'{"error": "Invalid request: x"}\n')
+    monkeypatch.setattr(daemon._RequestHandler, 'handle', handle)
+    with daemon.Client(server.server_address) as client:
+        with pytest.raises(ValueError):
+            client.convert(ITEMS)
+    assert daemon.convert(ITEMS, server.server_address) == EXPECTED
+
+def test_server_running(server):
+    with pytest.raises(OSError):
+        daemon.ConversionServer(server.server_address)
+
+def test_client_main(server, monkeypatch, capsys):
+    monkeypatch.setattr('sys.stdin', io.StringIO('six>=1.10\n\nfoo>=1,\n'))
+    assert daemon.client_main(['--socket', server.server_address]) == 1
+    out, err = capsys.readouterr()
+    assert out == 'six >= 1.10\n'
+    assert err == 'foo>=1,: invalid-requirement\n'
+
+def test_concurrent_clients(server):
+    # A connected client does not block others
+    with daemon.Client(server.server_address) as first:
+        with daemon.Client(server.server_address, timeout=5) as second:
+            assert second.convert(ITEMS) == EXPECTED
+        assert first.convert(ITEMS) == EXPECTED
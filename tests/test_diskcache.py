@@ -0,0 +1,137 @@
+import pytest
+
+import multiprocessing
+import sqlite3
+from pyreq2rpm import diskcache, parallel
+from pyreq2rpm.cli import main
+from pyreq2rpm.dependencies import convert_metadata
+
+@pytest.fixture
+def cache(tmp_path):
+    with diskcache.ResultCache(str(tmp_path / 'cache.db')) as cache:
+        yield cache
+
+def test_result_cache(cache):
+    calls = []
+    def convert():
+        calls.append(1)
+        return [['python3dist(six)'], []]
+    options = {'namespace': 'python3dist'}
+    assert cache.convert('METADATA', b'Requires-Dist: six\n', options, convert) == [['python3dist(six)'], []]
+    assert cache.convert('METADATA', b'Requires-Dist: six\n', options, convert) == [['python3dist(six)'], []]
+    assert len(calls) == 1
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    assert cache.stats.hit_rate() == 0.5
+    # Every part of the key matters
+    assert cache.convert('requires.txt', b'Requires-Dist: six\n', options, convert)
+    assert cache.convert('METADATA', b'Requires-Dist: six \n', options, convert)
+    assert cache.convert('METADATA', b'Requires-Dist: six\n', {'namespace': 'python3.11dist'}, convert)
+    assert len(calls) == 4
+
+def test_converter_version():
+    version = diskcache.converter_version()
+    assert '+' in version
+    assert diskcache.converter_version() is version
+
+def test_prune(cache):
+    for index in range(10):
+        cache.put(cache.key('METADATA', str(index).encode(), {}), ['x' * 100], 0.0)
+    # Reading an entry makes it recently used
+    assert cache.get(cache.key('METADATA', b'0', {})) == ['x' * 100]
+    size = cache.size()
+    assert cache.prune(size // 2) == 5
+    assert cache.size() <= size // 2
+    assert cache.get(cache.key('METADATA', b'0', {})) is not None
+    assert cache.get(cache.key('METADATA', b'1', {})) is None
+    assert cache.prune(size) == 0
+
+def test_prune_unlimited(tmp_path):
+    with diskcache.ResultCache(str(tmp_path / 'cache.db'), max_bytes=None) as cache:
+        cache.put(cache.key('METADATA', b'0', {}), ['x' * 100], 0.0)
+        assert cache.prune() == 0
+        assert cache.get(cache.key('METADATA', b'0', {})) == ['x' * 100]
+        # An explicit limit still applies
+        assert cache.prune(0) == 1
+
+def test_get_does_not_write(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    with diskcache.ResultCache(path, max_bytes=None) as cache:
+        key = cache.key('METADATA', b'0', {})
+        cache.put(key, ['x'], 0.0)
+    writer = sqlite3.connect(path, isolation_level=None)
+    accessed = writer.execute('SELECT accessed FROM results').fetchone()[0]
+    cache = diskcache.ResultCache(path, max_bytes=None, timeout=0.1)
+    # Hits succeed while another connection holds the write lock
+    writer.execute('BEGIN IMMEDIATE')
+    assert cache.get(key) == ['x']
+    writer.execute('COMMIT')
+    # and their access times are written on close
+    cache.close()
+    assert writer.execute('SELECT accessed FROM results').fetchone()[0] > accessed
+    writer.close()
+
+def write_entries(path, worker):
+    with diskcache.ResultCache(path, max_bytes=None, timeout=30) as cache:
+        for index in range(100):
+            key = cache.key('METADATA', '{}-{}'.format(worker, index).encode(), {})
+            cache.put(key, [worker, index], 0.0)
+            cache.get(cache.key('METADATA', '{}-{}'.format(worker - 1, index).encode(), {}))
+
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=write_entries, args=(path, x)) for x in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [x.exitcode for x in processes] == [0] * 4
+    with diskcache.ResultCache(path, max_bytes=None) as cache:
+        for worker in range(4):
+            for index in range(100):
+                assert cache.get(cache.key('METADATA', '{}-{}'.format(worker, index).encode(), {})) == [worker, index]
+
+@pytest.fixture
+def site(tmp_path):
+    for index in range(5):
+        dist_info = tmp_path / 'site-packages' / 'pkg{}-1.0.dist-info'.format(index)
+        dist_info.mkdir(parents=True)
+        (dist_info / 'METADATA').write_text('Name: pkg{}\nRequires-Dist: six>={}\nRequires-Dist: foo>=1,\n'.format(index, index % 2))
+    return tmp_path
+
+def test_main_cache(site, capsys):
+    database = str(site / 'cache.db')
+    paths = sorted(str(x) for x in (site / 'site-packages').iterdir())
+    assert main(['--cache', database, '--cache-stats'] + paths) == 1
+    first = capsys.readouterr()
+    assert '0 hits, 5 misses' in first.err
+    assert main(['--cache', database, '--cache-stats'] + paths) == 1
+    second = capsys.readouterr()
+    assert '5 hits, 0 misses (100.0% hit rate)' in second.err
+    assert second.out == first.out == 'python3dist(six) >= 0\npython3dist(six) >= 1\n'
+    # Errors are reported for the distribution they come from
+    assert [x for x in second.err.splitlines() if 'pkg3' in x] == [x for x in first.err.splitlines() if 'pkg3' in x]
+
+def test_convert_tree_cache(site):
+    expected = parallel.convert_tree(str(site), workers=1)
+    with diskcache.ResultCache(str(site / 'cache.db')) as cache:
+        assert parallel.convert_tree(str(site), workers=2, cache=cache) == expected
+        assert parallel.convert_tree(str(site), workers=2, cache=cache) == expected
+        assert (cache.stats.hits, cache.stats.misses) == (5, 5)
+
+@pytest.mark.parametrize('marker, hits', [
+    ('', 1),
+    ('; platform_release in "6.1.0 6.2.0"', 0),
+    ('; "SMP" in platform.version', 0),
+])
+def test_volatile_environment(tmp_path, marker, hits):
+    dist_info = tmp_path / 'pkg-1.0.dist-info'
+    dist_info.mkdir()
+    (dist_info / 'METADATA').write_text('Name: pkg\nRequires-Dist: six{}\n'.format(marker))
+    with diskcache.ResultCache(str(tmp_path / 'cache.db')) as cache:
+        for release in ('6.1.0', '6.2.0'):
+            environment = {'platform_release': release, 'platform_version': '#1 SMP ' + release}
+            assert convert_metadata(str(dist_info), environment=environment, cache=cache) == ['python3dist(six)']
+        # Kernel updates only change the key of requirements that
+        # depend on them
+        assert cache.stats.hits == hits
@@ -0,0 +1,102 @@
+import pytest
+
+import pickle
+import random
+from pyreq2rpm import encoding
+from pyreq2rpm.pyreq2rpm import RpmVersion, convert_requirement
+from conftest import read_corpus
+
+def random_version(rng):
+    if rng.random() < 0.1:
+        return RpmVersion._from_fields(0, rng.choice(['dev', 'french toast', 'café', '1.0-x']), None, None, None)
+    def number():
+        return rng.choice([0, 1, rng.randrange(128), rng.randrange(2 ** 14), rng.randrange(2 ** 70)])
+    def letter(choices):
+        return (rng.choice(choices), number()) if rng.random() < 0.3 else None
+    return RpmVersion._from_fields(number() if rng.random() < 0.2 else 0,
+                                   tuple(number() for _ in range(rng.randint(1, 6))),
+                                   letter(['a', 'b', 'rc', 'zeta']), letter(['dev']), letter(['post']))
+
+def random_expression(rng, depth=0):
+    name = rng.choice(['foo', 'python3dist(foo)', 'python3.12dist(zope-interface[test])', 'x'])
+    if depth < 3 and rng.random() < 0.3:
+        joiner = rng.choice([' with ', ' or '])
+        return '({})'.format(joiner.join(random_expression(rng, depth + 1)
+                                         for _ in range(rng.randint(2, 4))))
+    if rng.random() < 0.1:
+        return name
+    version = str(random_version(rng))
+    if ' ' in version or '(' in version:
+        return name
+    return '{} {} {}'.format(name, rng.choice(encoding.RPM_OPERATORS), version)
+
+@pytest.mark.parametrize('seed', range(20))
+def test_version_round_trip(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        version = random_version(rng)
+        encoded = encoding.encode_version(version)
+        for data in (encoded, bytearray(encoded), memoryview(encoded)):
+            decoded = encoding.decode_version(data)
+            assert decoded == version
+            assert str(decoded) == str(version)
+
+def test_version_corpus():
+    for version_id in read_corpus('versions.txt'):
+        version = RpmVersion(version_id)
+        assert encoding.decode_version(encoding.encode_version(version)) == version
+        assert len(encoding.encode_version(version)) < len(pickle.dumps(version))
+
+@pytest.mark.parametrize('seed', range(20))
+def test_expression_round_trip(seed):
+    rng = random.Random(seed)
+    expressions = [random_expression(rng) for _ in range(rng.randint(0, 50))]
+    encoded = encoding.encode_expressions(expressions)
+    assert encoding.decode_expressions(memoryview(encoded)) == expressions
+    for expression in expressions:
+        assert encoding.decode_expression(encoding.encode_expression(expression)) == expression
+    # Any iterable can be encoded
+    assert encoding.encode_expressions(iter(expressions)) == encoded
+
+def test_expression_corpus():
+    expressions = []
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            converted = convert_requirement(requirement)
+        except ValueError:
+            continue
+        if 'Invalid version' not in converted:
+            expressions.append(converted)
+    encoded = encoding.encode_expressions(expressions)
+    assert encoding.decode_expressions(encoded) == expressions
+    assert len(encoded) < len('\n'.join(expressions))
+
+def test_decode_in_place():
+    # A value can be decoded from the middle of a larger buffer
+    encoded = encoding.encode_version(RpmVersion('1.0rc1'))
+    buffer = memoryview(b'xx' + encoded + b'yy')
+    assert encoding.decode_version(buffer[2:2 + len(encoded)]) == RpmVersion('1.0rc1')
+
+@pytest.mark.parametrize('expression', ['Invalid version', 'foo >= ', '(foo with bar or baz)', '(foo)',
+                                        'foo ~= 1', '(foo with bar'])
+def test_encode_invalid(expression):
+    with pytest.raises(ValueError):
+        encoding.encode_expression(expression)
+
+@pytest.mark.parametrize('decode, data', [
+    (encoding.decode_version, b''),
+    (encoding.decode_version, b'\x02\x00\x01\x01'),
+    (encoding.decode_version, b'\x01\x00\x02\x01'),
+    (encoding.decode_version, b'\x01\x00\x01\x81'),
+    (encoding.decode_version, b'\x01\x04\x01\x01\x09\x01'),
+    (encoding.decode_version, b'\x01\x01\x05abc'),
+    (encoding.decode_version, b'\x01\x00\x01\x01\x00'),
+    (encoding.decode_expressions, b'\x01\x01\x03foo\x01\x09'),
+    (encoding.decode_expressions, b'\x01\x01\x03foo\x01\x00\x05'),
+    (encoding.decode_expression, b'\x01\x00\x00'),
+    # Nesting deep enough to exhaust the stack
+    (encoding.decode_expressions, b'\x01\x01\x03foo\x01' + b'\x06\x01' * 100000 + b'\x00\x00'),
+])
+def test_decode_invalid(decode, data):
+    with pytest.raises(encoding.DecodeError):
+        decode(data)
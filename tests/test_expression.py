@@ -0,0 +1,96 @@
+import pytest
+
+import pickle
+from pyreq2rpm.expression import INVALID, Atom, Or, With, parse_expression
+from pyreq2rpm.pyreq2rpm import (convert, convert_node, convert_requirement, convert_requirement_node,
+                                 convert_specifiers_node, convert_specifiers_nodes, disable_cache,
+                                 enable_cache)
+from conftest import read_corpus
+
+@pytest.mark.parametrize(('arg', 'expected'), [
+    (['foobar', '~=', '2.4.8'], With((Atom('foobar', '>=', '2.4.8'), Atom('foobar', '<', '2.5')))),
+    (['foobar', '~=', '2.4.8b5'], With((Atom('foobar', '>=', '2.4.8~b5'), Atom('foobar', '<', '2.5')))),
+    (['foobar', '~=', '2'], INVALID),
+    (['foobar', '==', '2.4.*'], With((Atom('foobar', '>=', '2.4'), Atom('foobar', '<', '2.5')))),
+    (['foobar', '!=', '2.4.8'], Or((Atom('foobar', '<', '2.4.8'), Atom('foobar', '>', '2.4.8')))),
+    (['foobar', '!=', '2.4.*'], Or((Atom('foobar', '<', '2.4~~'), Atom('foobar', '>=', '2.5')))),
+    (['foobar', '<', '2.4.8'], Atom('foobar', '<', '2.4.8~~')),
+    (['foobar', '>', '2.4.8'], Atom('foobar', '>', '2.4.8.0')),
+    (['foobar', '>=', '1!2.4.8.post1'], Atom('foobar', '>=', '1:2.4.8^post1')),
+    (['foobar', '===', 'french toast'], Atom('foobar', '=', 'french toast')),
+])
+def test_convert_node(arg, expected):
+    node = convert_node(*arg)
+    assert node == expected
+    assert hash(node) == hash(expected)
+    assert str(node) == convert(*arg)
+
+def test_convert_requirement_node():
+    node = convert_requirement_node('babel>=1.3,!=2.0')
+    assert node == With((Or((Atom('babel', '<', '2'), Atom('babel', '>', '2'))), Atom('babel', '>=', '1.3')))
+    assert node.text() == '((babel < 2 or babel > 2) with babel >= 1.3)'
+    assert convert_specifiers_node('six', []) == Atom('six')
+
+def test_rename():
+    node = convert_requirement_node('foo>=1.0,!=1.5')
+    assert node.rename('bar') == convert_requirement_node('bar>=1.0,!=1.5')
+    assert node.text() == '((foo < 1.5 or foo > 1.5) with foo >= 1)'
+    assert INVALID.rename('bar') is INVALID
+
+@pytest.mark.parametrize('specs', [[], [('>=', '1.0')], [('>=', '1.0'), ('!=', '1.5')], [('~=', '2')]])
+def test_convert_specifiers_nodes(specs):
+    # Clauses are sorted for each name, which may sort before "("
+    names = ['python3dist(foo)', '%py3dist(foo)', 'foo']
+    assert convert_specifiers_nodes(names, specs) == [convert_specifiers_node(x, specs) for x in names]
+
+def test_lazy_text():
+    node = Or((Atom('foo', '<', '2'), Atom('foo', '>', '2')))
+    assert node._text is None
+    assert str(node) == '(foo < 2 or foo > 2)'
+    # str() renders without keeping the string
+    assert node._text is None
+    assert node.text() == '(foo < 2 or foo > 2)'
+    assert node._text == node.text()
+    assert all(x._text is not None for x in node.children)
+
+def test_immutable():
+    node = Or((Atom('foo', '<', '2'), Atom('foo', '>', '2')))
+    with pytest.raises(AttributeError):
+        node.children[0].name = 'bar'
+    with pytest.raises(AttributeError):
+        node.children = ()
+    with pytest.raises(AttributeError):
+        del node.children[1].evr
+    with pytest.raises(AttributeError):
+        node.children.append(Atom('bar'))
+    assert node.text() == '(foo < 2 or foo > 2)'
+    assert pickle.loads(pickle.dumps(node)) == node
+    assert pickle.loads(pickle.dumps(INVALID)) is INVALID
+
+def test_shared_nodes():
+    enable_cache()
+    try:
+        first = convert_requirement_node('foo>=1.0,!=1.5')
+        second = convert_requirement_node('foo!=1.5,<3')
+        # Both requirements hold the one cached node for !=1.5
+        shared = [x for x in first.children if x in second.children]
+        assert len(shared) == 1
+        assert any(x is shared[0] for x in second.children)
+        # and the string converters return its rendered text
+        assert convert('foo', '!=', '1.5') is shared[0].text()
+    finally:
+        disable_cache()
+
+def test_parse_expression_corpus():
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            node = convert_requirement_node(requirement)
+        except ValueError:
+            continue
+        assert parse_expression(str(node)) == node
+        assert str(node) == convert_requirement(requirement)
+
+@pytest.mark.parametrize('text', ['', '(foo)', '(foo < 1 with foo > 2 or foo = 3)', 'foo < 1 )', '(foo < 1'])
+def test_parse_expression_invalid(text):
+    with pytest.raises(ValueError):
+        parse_expression(text)
@@ -0,0 +1,54 @@
+import pytest
+
+import os
+import subprocess
+import sys
+
+# Import time budget for pyreq2rpm.pyreq2rpm, in microseconds.  The
+# dependency generator is run once per package file, so anything
+# pulled in at import time is paid for thousands of times.
+IMPORT_BUDGET_US = 50000
+
+def import_times(module):
+    e = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                        'import {}'.format(module)],
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in e.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+def test_import_stdlib_only():
+    times = import_times('pyreq2rpm.pyreq2rpm')
+    assert 'pkg_resources' not in times
+    assert 'packaging' not in times
+
+def test_import_budget():
+    # Take the best of a few runs to avoid noise from a busy machine
+    best = min(import_times('pyreq2rpm.pyreq2rpm')['pyreq2rpm.pyreq2rpm']
+               for x in range(3))
+    assert best < IMPORT_BUDGET_US
+
+@pytest.mark.parametrize('backend', ['builtin', 'pkg_resources', 'packaging'])
+def test_backend(backend):
+    if backend != 'builtin':
+        pytest.importorskip(backend)
+    from pyreq2rpm import pyreq2rpm
+    try:
+        pyreq2rpm.set_backend(backend)
+        assert pyreq2rpm.get_backend() == backend
+        assert pyreq2rpm.convert('foobar', '~=', '2.4.8b5') == '(foobar >= 2.4.8~b5 with foobar < 2.5)'
+        assert pyreq2rpm.convert('foobar', '>', '1.0.0.dev4') == 'foobar > 1~~dev4'
+        assert pyreq2rpm.convert('foobar', '!=', '2.0.post1') == '(foobar < 2^post1 or foobar > 2^post1)'
+        assert pyreq2rpm.convert_requirement('babel>=1.3,!=2.0') == '((babel < 2 or babel > 2) with babel >= 1.3)'
+    finally:
+        pyreq2rpm.set_backend('builtin')
+
+def test_unknown_backend():
+    from pyreq2rpm import pyreq2rpm
+    with pytest.raises(ValueError):
+        pyreq2rpm.set_backend('distutils')
@@ -0,0 +1,228 @@
+import pytest
+
+import asyncio
+import hashlib
+import http.server
+import json
+import socket
+import threading
+from pyreq2rpm import index
+
+def metadata(name, version, requirements):
+    text = 'Metadata-Version: 2.1\nName: {}\nVersion: {}\n'.format(name, version)
+    return (text + ''.join('Requires-Dist: {}\n'.format(x) for x in requirements)).encode('utf-8')
+
+FILES = {
+    '/files/six-1.16.0-py2.py3-none-any.whl.metadata': metadata('six', '1.16.0', []),
+    '/files/requests-2.31.0-py3-none-any.whl.metadata': metadata(
+        'requests', '2.31.0', ['charset-normalizer<4,>=2', 'idna<4,>=2.5', 'PySocks!=1.5.7,>=1.5.6; extra == "socks"']),
+    '/files/requests-2.31.0.tar.gz.metadata': metadata('requests', '2.31.0', ['wrong']),
+    '/files/requests-2.0.tar.gz.metadata': metadata('requests', '2.0', ['foo>=1,']),
+    '/files/bad-1.0-py3-none-any.whl.metadata': metadata('bad', '1.0', []),
+}
+
+def file_entry(filename, **extra):
+    entry = {'filename': filename, 'url': '../../files/' + filename, 'hashes': {}}
+    body = FILES.get('/files/{}.metadata'.format(filename))
+    if body is not None:
+        entry['core-metadata'] = {'sha256': hashlib.sha256(body).hexdigest()}
+    entry.update(extra)
+    return entry
+
+PROJECTS = {
+    'six': [file_entry('six-1.16.0.tar.gz'),
+            file_entry('six-1.16.0-py2.py3-none-any.whl', url='../../old-files/six-1.16.0-py2.py3-none-any.whl')],
+    'requests': [file_entry('requests-2.31.0.tar.gz'),
+                 file_entry('requests-2.31.0-py3-none-any.whl'),
+                 file_entry('requests-2.30.0-py3-none-any.whl', **{'data-dist-info-metadata': True}),
+                 {'filename': 'requests-2.0.tar.gz', 'url': '/files/requests-2.0.tar.gz',
+                  'hashes': {}, 'data-dist-info-metadata': True}],
+    'bad': [file_entry('bad-1.0-py3-none-any.whl', **{'core-metadata': {'sha256': '0' * 64}})],
+    'malformed': [file_entry('malformed-1.0-py3-none-any.whl'), {'filename': 'malformed-1.0.tar.gz'}],
+    # Not a JSON object
+    'listed': [],
+}
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            self.respond()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def respond(self):
+        self.server.event.wait(0.01)
+        if self.path.startswith('/old-files/'):
+            self.send(301, b'', headers={'Location': self.path.replace('/old-files/', '/files/', 1)})
+        elif self.path.startswith('/simple/') and self.path[8:-1] in PROJECTS:
+            if self.headers['Accept'] != index.SIMPLE_JSON:
+                self.send(406, b'')
+                return
+            if self.path[8:-1] == 'listed':
+                body = b'[]'
+            else:
+                body = json.dumps({'meta': {'api-version': '1.1'}, 'name': self.path[8:-1],
+                                   'files': PROJECTS[self.path[8:-1]]}).encode('utf-8')
+            self.send(200, body, index.SIMPLE_JSON, chunked=self.path[8:-1] == 'requests')
+        elif self.path in FILES:
+            self.send(200, FILES[self.path])
+        else:
+            self.send(404, b'')
+
+    def send(self, status, body, content_type='application/octet-stream', headers={}, chunked=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(body), 100):
+                chunk = body[start:start + 100]
+                self.wfile.write('{:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.event = threading.Event()
+    server.connections = server.requests = server.active = server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+def index_url(server):
+    return 'http://127.0.0.1:{}/simple/'.format(server.server_address[1])
+
+def test_fetch_requirements(server):
+    releases = [('six', '1.16'), ('Requests', '2.31.0'), ('requests', '2.30.0'), ('requests', '2.0'),
+                ('requests', '9.9'), ('missing', '1.0'), ('bad', '1.0')]
+    results = index.fetch_requirements(index_url(server), releases, concurrency=2)
+    assert [x[:2] for x in results] == releases
+    assert results[0].dependencies == []
+    assert results[1].dependencies == [
+        '(python3dist(charset-normalizer) < 4~~ with python3dist(charset-normalizer) >= 2)',
+        '(python3dist(idna) < 4~~ with python3dist(idna) >= 2.5)']
+    assert results[1].errors == []
+    # Not served
+    assert 'HTTP 404' in results[2].errors[0]
+    assert 'Unexpected text' in results[3].errors[0]
+    assert 'no file with separate metadata' in results[4].errors[0]
+    assert 'HTTP 404' in results[5].errors[0]
+    assert 'sha256 mismatch' in results[6].errors[0]
+
+def test_invalid_project_page(server):
+    releases = [('malformed', '1.0'), ('listed', '1.0'), ('six', '1.16.0')]
+    results = index.fetch_requirements(index_url(server), releases)
+    assert [x[:2] for x in results] == releases
+    assert 'bad file entry' in results[0].errors[0]
+    assert 'invalid project page' in results[1].errors[0]
+    # Other projects are unaffected
+    assert results[2].errors == []
+
+def test_connection_pool(server):
+    releases = [('six', '1.16.0'), ('requests', '2.31.0')] * 20
+    results = index.fetch_requirements(index_url(server), releases, concurrency=3)
+    assert all(not x.errors for x in results)
+    # Project pages are fetched once, and metadata for every release
+    # (six's through a redirect), over at most three kept-alive
+    # connections
+    assert server.requests == 2 + 20 * 2 + 20
+    assert server.connections <= 3
+    assert server.max_active <= 3
+
+def test_fetch_error():
+    results = index.fetch_requirements('http://127.0.0.1:1/simple/', [('six', '1.0')])
+    assert len(results[0].errors) == 1
+
+class RawServer():
+    # Answers one connection with the bytes in response, then leaves it
+    # open until closed
+    def __init__(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.url = 'http://127.0.0.1:{}/simple/'.format(self.listener.getsockname()[1])
+        self.response = b''
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def serve(self):
+        connection, _ = self.listener.accept()
+        self.request = connection.recv(65536)
+        connection.sendall(self.response)
+        self.done.wait(5)
+        connection.close()
+
+    def close(self):
+        self.done.set()
+        self.thread.join()
+        self.listener.close()
+
+@pytest.fixture
+def raw_server():
+    server = RawServer()
+    yield server
+    server.close()
+
+def test_timeout(raw_server):
+    results = index.fetch_requirements(raw_server.url, [('six', '1.0')], timeout=0.2)
+    assert results[0].errors == ['{}six/: timed out'.format(raw_server.url)]
+
+def test_host_header(raw_server):
+    url = raw_server.url.replace('127.0.0.1', 'user:secret@127.0.0.1')
+    index.fetch_requirements(url, [('six', '1.0')], timeout=0.2)
+    port = url.split(':')[-1].split('/')[0]
+    assert b'\r\nHost: 127.0.0.1:' + port.encode('ascii') + b'\r\n' in raw_server.request
+    assert b'secret' not in raw_server.request
+
+def test_oversized_headers(raw_server):
+    raw_server.response = b'HTTP/1.1 200 OK\r\nX-Padding: ' + b'x' * 100000
+    results = index.fetch_requirements(raw_server.url, [('six', '1.0')], timeout=5)
+    assert len(results[0].errors) == 1
+    assert results[0].errors[0].startswith(raw_server.url)
+
+def read_response(data, head=False):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        # The connection stays open, so reading to the end would hang
+        return await asyncio.wait_for(index._read_response(reader, head), 1)
+    return asyncio.run(read())
+
+@pytest.mark.parametrize('data, head, status', [
+    (b'HTTP/1.1 204 No Content\r\n\r\n', False, 204),
+    (b'HTTP/1.1 304 Not Modified\r\nETag: "x"\r\n\r\n', False, 304),
+    (b'HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n', False, 204),
+    (b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n', True, 200),
+])
+def test_read_response_no_body(data, head, status):
+    response, keep_alive = read_response(data, head)
+    assert response.status == status
+    assert response.body == b''
+    assert keep_alive
@@ -0,0 +1,62 @@
+import pytest
+
+import email.parser
+import random
+import re
+from pyreq2rpm.metadata import MetadataHeaders, scan_metadata, scan_requires_txt
+
+def email_headers(path):
+    with open(path, encoding='utf-8', errors='surrogateescape') as f:
+        message = email.parser.HeaderParser().parse(f)
+    # The email parser leaves folded values folded
+    unfold = lambda values: [re.sub('\r?\n', '', x).rstrip() for x in values]
+    return MetadataHeaders(unfold(message.get_all('Requires-Dist', [])),
+                           unfold(message.get_all('Provides-Extra', [])))
+
+HEADERS = ['Metadata-Version: 2.1',
+           'Name: example',
+           'Version: 1.0',
+           'Summary: Requires-Dist: not a header',
+           'Requires-Dist: six>=1.10',
+           'requires-dist:requests[socks] (>=2.0,<3)',
+           'REQUIRES-DIST: pytest ; extra == "test"',
+           'Requires-Dist: pywin32 ;\n  sys_platform == "win32"',
+           'Requires-Dist: trailing   ',
+           'Requires-Dist: café',
+           'Provides-Extra: test',
+           'Provides-Extra:\ttest-suite',
+           'Classifier: Programming Language :: Python',
+           'Description: first line\n        Requires-Dist: continuation']
+
+BODIES = ['',
+          'Requires-Dist: in the body\nProvides-Extra: body\n',
+          '\n\nRequires-Dist: after blank lines\n' + 'x' * 10000]
+
+@pytest.mark.parametrize('seed', range(40))
+def test_scan_metadata(tmp_path, seed):
+    rng = random.Random(seed)
+    headers = rng.sample(HEADERS, rng.randint(0, len(HEADERS)))
+    newline = rng.choice(['\n', '\r\n'])
+    text = '\n'.join(headers) + '\n'
+    body = rng.choice(BODIES)
+    if body:
+        text += '\n' + body
+    path = tmp_path / 'METADATA'
+    path.write_bytes(text.replace('\n', newline).encode('utf-8'))
+    assert scan_metadata(str(path)) == email_headers(str(path))
+
+def test_scan_metadata_empty(tmp_path):
+    path = tmp_path / 'METADATA'
+    path.write_bytes(b'')
+    assert scan_metadata(str(path)) == MetadataHeaders([], [])
+    path.write_bytes(b'\nRequires-Dist: body\n')
+    assert scan_metadata(str(path)) == MetadataHeaders([], [])
+    path.write_bytes(b'Requires-Dist: no newline')
+    assert scan_metadata(str(path)) == MetadataHeaders(['no newline'], [])
+
+def test_scan_requires_txt(tmp_path):
+    path = tmp_path / 'requires.txt'
+    path.write_bytes(b'attrs>=19.2\r\n\r\n[test:python_version < "3"]\r\nmock\r\n')
+    assert scan_requires_txt(str(path)) == ['attrs>=19.2', 'mock; (extra == "test") and (python_version < "3")']
+    path.write_bytes(b'')
+    assert scan_requires_txt(str(path)) == []
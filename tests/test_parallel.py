@@ -0,0 +1,76 @@
+import pytest
+
+from pyreq2rpm import parallel
+from pyreq2rpm.cli import main
+
+REQUIREMENTS = ['six>=1.10', 'requests[socks]>=2.0,<3', 'pywin32; sys_platform == "win32"',
+                'foo>=1,', 'babel>=1.3,!=2.0', 'attrs~=19.2']
+
+@pytest.fixture
+def tree(tmp_path):
+    for index in range(40):
+        site = tmp_path / 'usr' / 'lib{}'.format(index % 3) / 'site-packages'
+        requirements = REQUIREMENTS[index % len(REQUIREMENTS):] + ['dep{}>={}'.format(index, index)]
+        if index % 2:
+            dist_info = site / 'pkg{}-1.0.dist-info'.format(index)
+            dist_info.mkdir(parents=True)
+            (dist_info / 'METADATA').write_text('Name: pkg{}\n'.format(index) + ''.join(
+                'Requires-Dist: {}\n'.format(x) for x in requirements))
+        else:
+            egg_info = site / 'pkg{}-1.0-py3.11.egg-info'.format(index)
+            egg_info.mkdir(parents=True)
+            (egg_info / 'PKG-INFO').write_text('Name: pkg{}\n'.format(index))
+            (egg_info / 'requires.txt').write_text(''.join('{}\n'.format(x) for x in requirements
+                                                           if ';' not in x))
+    # Not a distribution, and not searched for nested metadata
+    (tmp_path / 'usr' / 'lib0' / 'site-packages' / 'pkg0').mkdir()
+    (tmp_path / 'usr' / 'lib0' / 'site-packages' / 'pkg3-1.0.dist-info' / 'x.dist-info').mkdir()
+    return tmp_path
+
+def test_find_distributions(tree):
+    found = parallel.find_distributions(str(tree))
+    assert len(found) == 40
+    assert found == sorted(found)
+
+@pytest.mark.parametrize('count, workers, expected', [
+    (0, 4, 1),
+    (40, 4, 2),
+    (10000, 4, 64),
+])
+def test_chunksize(count, workers, expected):
+    assert parallel.chunksize(count, workers) == expected
+
+def test_convert_tree(tree):
+    serial = parallel.convert_tree(str(tree), workers=1)
+    assert [x[0] for x in serial] == parallel.find_distributions(str(tree))
+    assert parallel.convert_tree(str(tree), workers=3) == serial
+    path, dependencies, errors = serial[0]
+    assert path.endswith('pkg0-1.0-py3.11.egg-info')
+    assert dependencies == ['python3dist(six) >= 1.10',
+                            '(python3dist(requests[socks]) < 3~~ with python3dist(requests[socks]) >= 2)',
+                            '((python3dist(babel) < 2 or python3dist(babel) > 2) with python3dist(babel) >= 1.3)',
+                            '(python3dist(attrs) >= 19.2 with python3dist(attrs) < 20)',
+                            'python3dist(dep0) >= 0']
+    assert len(errors) == 1
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_convert_tree_unreadable(tree, workers):
+    broken = tree / 'usr' / 'lib1' / 'site-packages' / 'broken-1.0.dist-info'
+    broken.mkdir()
+    results = parallel.convert_tree(str(tree), workers=workers)
+    assert len(results) == 41
+    path, dependencies, errors = [x for x in results if x[0] == str(broken)][0]
+    assert dependencies == []
+    assert len(errors) == 1 and 'METADATA' in errors[0]
+    assert sum(1 for x in results if x[1]) == 40
+
+def test_measure_scaling(tree):
+    results = parallel.measure_scaling(str(tree), [1, 2])
+    assert [x.workers for x in results] == [1, 2]
+    assert results[0].speedup == results[0].efficiency == 1.0
+
+def test_main_tree(tree, capsys):
+    assert main(['--multifile', '--jobs', '2', '--tree', str(tree)]) == 1
+    out, err = capsys.readouterr()
+    assert out.count('\n;') == 39
+    assert len(err.splitlines()) == 28
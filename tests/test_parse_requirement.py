@@ -0,0 +1,107 @@
+import pytest
+
+import random
+from pyreq2rpm.pyreq2rpm import InvalidRequirement, parse_requirement
+from conftest import read_corpus
+
+NAMES = ['foo', 'Foo_Bar', 'foo.bar', 'foo-bar', 'a', 'f00', 'foo-', '-foo',
+         'foo..bar', 'foo_', '_foo', 'foo bar', 'foo\tbar', '']
+EXTRAS = ['', '[]', '[a]', '[a,b]', '[ a , b ]', '[a,]', '[,a]', '[a b]', '[A_B]',
+          '[a.b-c]', '[a', ' [a]', '[a,a]']
+OPERATORS = ['~=', '==', '===', '!=', '<=', '>=', '<', '>', '=', '=>', '<>', '~']
+VERSIONS = ['1', '1.0', '1.0.*', '1.*', '1.0+local', '1.0+A-1', '1.0a1', 'v1.0',
+            '1!2.0', 'dev', '1.0-SNAPSHOT', '', '1.0)', '1 .0', '1.0.post1.dev2',
+            '2.0.x', '1.0.0', '01.0', '1.0;', 'a,b', '1.0,', '1.0.*.*']
+SEPARATORS = [',', ', ', ' ,', ' , ', ',,']
+MARKERS = ['', '; python_version < "3"', ';os_name=="a"', '; extra == "test"',
+           "; extra == 'test' and python_version >= '3.6'",
+           '; (os_name == "a" or os_name == "b") and sys_platform != "win32"',
+           '; python_versionx == "3"', '; os_name === "a"', '; os_name not in "a b"',
+           '; os_name not  in "a"', '; "a" in os_name', '; os_name', '; os_name == "a',
+           '; (os_name == "a"', ';', '; os_name=="a"andextra=="b"', '; os_name == "a" or',
+           '; os.name == "a"', '; python_implementation == "CPython"',
+           "; os_name == 'a\"'", '; ((os_name == "a"))', ' ; os_name == "a" ']
+URLS = [' @ http://x/y', '@http://x', ' @ file:///tmp/x', ' @ foo', ' @ ',
+        ' @ http://x;os_name=="a"', ' @ file:tmp']
+PREFIXES = ['', ' ', '# comment\n', '\n']
+SUFFIXES = ['', ' ', ' # comment', ' \\', '\nbar', ' \\\n']
+
+def random_requirement(rng):
+    req = rng.choice(PREFIXES) + rng.choice(NAMES) + rng.choice(EXTRAS)
+    if rng.random() < 0.1:
+        req += rng.choice(URLS)
+    else:
+        specs = []
+        for x in range(rng.choice([0, 1, 1, 2, 3])):
+            specs.append(rng.choice(OPERATORS) + rng.choice(['', '', ' ']) + rng.choice(VERSIONS))
+        spec = rng.choice(SEPARATORS).join(specs)
+        if rng.random() < 0.2:
+            spec = '({})'.format(spec)
+        req += rng.choice(['', '', ' ']) + spec
+    req += rng.choice(MARKERS) + rng.choice(SUFFIXES)
+    return req
+
+def mutate(rng, req):
+    chars = list(req)
+    for x in range(rng.randint(1, 3)):
+        pos = rng.randint(0, len(chars))
+        if chars and rng.random() < 0.5:
+            del chars[min(pos, len(chars) - 1)]
+        else:
+            chars.insert(pos, rng.choice(' ,;()[]@=<>!~.*#"\'\\\tax0'))
+    return ''.join(chars)
+
+def requirement_corpus():
+    rng = random.Random(508)
+    corpus = read_corpus('requirements.txt')
+    generated = [random_requirement(rng) for x in range(6000)]
+    mutated = [mutate(rng, rng.choice(corpus + generated)) for x in range(6000)]
+    return corpus + generated + mutated
+
+@pytest.mark.filterwarnings('ignore')
+def test_parse_requirement_matches_pkg_resources():
+    pkg_resources = pytest.importorskip('pkg_resources')
+    # Markers are normalized by the Marker class that pkg_resources
+    # uses, whether it vendors packaging or imports it
+    Marker = type(pkg_resources.Requirement.parse('foo; os_name == "posix"').marker)
+
+    def reference(req):
+        try:
+            r = pkg_resources.Requirement.parse(req)
+        except ValueError:
+            return None
+        return (r.project_name, sorted(r.specs), sorted(r.extras),
+                str(r.marker) if r.marker else None, r.url)
+
+    def builtin(req):
+        try:
+            r = parse_requirement(req)
+        except InvalidRequirement:
+            return None
+        return (r.name, sorted(r.specs), sorted(r.extras),
+                str(Marker(r.marker)) if r.marker else None, r.url)
+
+    mismatches = [(req, reference(req), builtin(req)) for req in requirement_corpus()
+                  if reference(req) != builtin(req)]
+    assert mismatches == []
+
+@pytest.mark.parametrize(('arg', 'expected'), [
+    ('foo', ('foo', (), [], None, None)),
+    ('Foo_Bar [Quux, a.b] (>= 1.0, != 1.5) ; python_version < "3"',
+     ('Foo-Bar', ('quux', 'a.b'), [('>=', '1.0'), ('!=', '1.5')], 'python_version < "3"', None)),
+    ('foo>=1,>=1.0,<2', ('foo', (), [('>=', '1'), ('<', '2')], None, None)),
+    ('foo===1,>=2', ('foo', (), [('===', '1'), ('>=', '2')], None, None)),
+    ('foo > dev', ('foo', (), [('>', 'dev')], None, None)),
+    ('foo @ http://x/y ; os_name == "a"', ('foo', (), [], 'os_name == "a"', 'http://x/y')),
+    ('foo>=1 # comment', ('foo', (), [('>=', '1')], None, None)),
+])
+def test_parse_requirement(arg, expected):
+    assert tuple(parse_requirement(arg)) == expected
+
+@pytest.mark.parametrize('arg', [
+    '', 'foo>=1,', 'foo (>=1', 'foo[a,]', 'foo; os_name', 'foo @ bar',
+    'foo\nbar', 'foo; os_name == "a" or', '-foo',
+])
+def test_parse_requirement_invalid(arg):
+    with pytest.raises(InvalidRequirement):
+        parse_requirement(arg)
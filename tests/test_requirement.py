@@ -1,8 +1,8 @@
 import pytest
 
 import pkg_resources
-import subprocess
 from pyreq2rpm.pyreq2rpm import RpmVersion, convert
+from pyreq2rpm.rpmvercmp import compare_evr
 
 @pytest.mark.parametrize(('version', 'op', 'arg', 'expected'), [
     ('2.4.8', '~=', '2.4.8', True),
@@ -868,8 +868,8 @@ from pyreq2rpm.pyreq2rpm import RpmVersion, convert
 def test_requirement(version, op, arg, expected):
     assert (version in pkg_resources.Requirement.parse('foobar {} {}'.format(op, arg))) == expected
     # The section below will attempt further validation of accurate conversion using
-    # rpmdev-vercmp.  However, that can only tell us that two versions are equal or
-    # that one is greater than the other.  We can't test rich deps.
+    # rpm's version comparison.  However, that can only tell us that two versions are
+    # equal or that one is greater than the other.  We can't test rich deps.
     requirement = convert('foobar', op, arg)
     if op == '===':
         # We treat '===' as '==', which is not entirely the same behavior
@@ -930,17 +930,16 @@ def test_requirement(version, op, arg, expected):
         # True
         # >>> '2.0b5' in pkg_resources.Requirement.parse('foo>2')
         # False
-        ver_a.pre = None
-        ver_a.dev = None
+        ver_a = ver_a.replace(pre=None, dev=None)
 
-    vercmp = subprocess.run(['rpmdev-vercmp', str(ver_a), str(ver_b)])
+    vercmp = compare_evr(str(ver_a), ver_b)
     if rpm_op == '=':
-        assert (vercmp.returncode == 0) == expected
+        assert (vercmp == 0) == expected
     if rpm_op == '>=':
-        assert (vercmp.returncode in [0, 11]) == expected
+        assert (vercmp >= 0) == expected
     if rpm_op == '>':
-        assert (vercmp.returncode == 11) == expected
+        assert (vercmp > 0) == expected
     if rpm_op == '<=':
-        assert (vercmp.returncode in [0, 12]) == expected
+        assert (vercmp <= 0) == expected
     if rpm_op == '<':
-        assert (vercmp.returncode == 12) == expected
+        assert (vercmp < 0) == expected
@@ -0,0 +1,81 @@
+import pytest
+
+import io
+import random
+from pyreq2rpm import reverse
+from pyreq2rpm.expression import parse_expression
+from pyreq2rpm.pyreq2rpm import OPERATORS, convert_specifiers
+from conftest import read_corpus
+
+@pytest.mark.parametrize(('expression', 'expected'), [
+    ('foo', []),
+    ('six >= 1.10', [('>=', '1.10')]),
+    ('foo < 3~~', [('<', '3')]),
+    ('foo < 3~rc1', [('<', '3rc1')]),
+    ('foo > 4.0', [('>', '4')]),
+    ('foo > 1~~dev4', [('>', '1.dev4')]),
+    ('foo <= 1:2^post1', [('<=', '1!2.post1')]),
+    ('foo = 1~rc1', [('==', '1rc1')]),
+    ('foo = dev', [('==', 'dev')]),
+    ('(foobar >= 2.4.8 with foobar < 2.5)', [('~=', '2.4.8')]),
+    ('(foobar >= 2 with foobar < 3)', [('~=', '2.0')]),
+    ('(foobar >= 2.4.8~b5 with foobar < 2.5)', [('~=', '2.4.8b5')]),
+    ('(foobar < 2 or foobar > 2)', [('!=', '2')]),
+    ('(foobar < 2.4~~ or foobar >= 2.5)', [('!=', '2.4.*')]),
+    ('(foobar < 2~~ or foobar >= 2.1)', [('!=', '2.0.*')]),
+    ('((babel < 2 or babel > 2) with babel >= 1.3)', [('!=', '2'), ('>=', '1.3')]),
+    ('((foo >= 1 with foo < 2) with foo < 1.5~~)', [('~=', '1.0'), ('<', '1.5')]),
+    ('(python3dist(foo[bar]) < 2~~ with python3dist(foo[bar]) >= 1)', [('<', '2'), ('>=', '1')]),
+])
+def test_reverse_expression(expression, expected):
+    name, specs = reverse.reverse_expression(expression)
+    assert specs == expected
+    assert convert_specifiers(name, specs) == expression
+    # Nodes reverse as their text does
+    assert reverse.reverse_expression(parse_expression(expression)).specs == expected
+
+@pytest.mark.parametrize('expression', [
+    'Invalid version',
+    '(foo >= 1 with bar < 2)',
+    '(foo < 1 or foo > 2)',
+    '(foo >= 1 with (foo >= 2 with foo < 2.5~~))',
+    '(foo < 2 or (foo > 3 with foo < 4))',
+])
+def test_irreversible(expression):
+    for _ in range(2):
+        # Failures are cached too
+        with pytest.raises(reverse.IrreversibleExpression):
+            reverse.reverse_expression(expression)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_round_trip_random(seed):
+    rng = random.Random(seed)
+    versions = read_corpus('versions.txt') + ['1.*', '1.0.*', '2.4.*', '1!2.0.*']
+    for _ in range(300):
+        specs = [(rng.choice(list(OPERATORS)), rng.choice(versions)) for _ in range(rng.randint(0, 3))]
+        try:
+            expression = convert_specifiers('foo', specs)
+        except ValueError:
+            continue
+        if 'Invalid version' in expression:
+            continue
+        name, reversed_specs = reverse.reverse_expression(expression)
+        assert name == 'foo'
+        assert convert_specifiers(name, reversed_specs) == expression
+
+def test_verify_round_trip():
+    requirements = read_corpus('requirements.txt') + ['foo ~= 2', 'foo>=1,']
+    report = reverse.verify_round_trip(requirements)
+    assert report.mismatches == []
+    assert report.skipped == 2
+    assert report.checked == len(requirements) - 2
+
+def test_main(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'requirements.txt'
+    path.write_text('# comment\nsix>=1.10\n\nbabel>=1.3,!=2.0\n')
+    assert reverse.main([str(path)]) == 0
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err == '2 checked, 0 skipped, 0 mismatches\n'
+    monkeypatch.setattr('sys.stdin', io.StringIO('foo~=2.4.8\n'))
+    assert reverse.main([]) == 0
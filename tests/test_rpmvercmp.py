@@ -0,0 +1,94 @@
+import pytest
+
+import random
+from pyreq2rpm import rpmvercmp
+from pyreq2rpm.pyreq2rpm import RpmVersion
+from conftest import read_corpus
+
+@pytest.mark.parametrize(('a', 'b', 'expected'), [
+    ('1.0', '1.0', 0),
+    ('1.0', '2.0', -1),
+    ('2.0', '1.0', 1),
+    ('2.0.1', '2.0.1', 0),
+    ('2.0', '2.0.1', -1),
+    ('5.5p1', '5.5p10', -1),
+    ('10xyz', '10.1xyz', -1),
+    ('xyz10', 'xyz10.1', -1),
+    ('1.0010', '1.9', 1),
+    ('1.05', '1.5', 0),
+    ('1.0', '1', 1),
+    ('2.0', '2_0', 0),
+    ('a', 'b', -1),
+    ('1.0a', '1.0', 1),
+    ('1.0~rc1', '1.0', -1),
+    ('1.0~rc1', '1.0~rc2', -1),
+    ('1.0~rc1~git123', '1.0~rc1', -1),
+    ('1~~', '1~a1', -1),
+    ('1.0^', '1.0', 1),
+    ('1.0^git1', '1.0', 1),
+    ('1.0^git1', '1.0.1', -1),
+    ('1.0^git1~pre', '1.0^git1', -1),
+    ('1.0^20160101', '1.0.1', -1),
+    ('1^post1', '1.0', -1),
+    ('1.0', '1.0.', 0),
+    ('1..0', '1.0', 0),
+    ('01', '1', 0),
+    ('1a', '1.a', 0),
+    ('1.a', '1.1', -1),
+])
+def test_rpmvercmp(a, b, expected):
+    assert rpmvercmp.rpmvercmp(a, b) == expected
+    assert rpmvercmp.rpmvercmp(b, a) == -expected
+
+@pytest.mark.parametrize(('evr', 'expected'), [
+    ('1.0', (None, '1.0', None)),
+    ('1:2.0-3', ('1', '2.0', '3')),
+    ('2.0-1-2', (None, '2.0-1', '2')),
+    ('a:b', (None, 'a:b', None)),
+    ('0:1~rc1', ('0', '1~rc1', None)),
+])
+def test_parse_evr(evr, expected):
+    assert rpmvercmp.parse_evr(evr) == expected
+
+@pytest.mark.parametrize(('a', 'b', 'expected'), [
+    ('1.0-1', '1-3', 1),
+    ('1.0-1', '1.0-3', -1),
+    ('1.0', '1.0-3', 0),
+    ('0:1.0', '1.0', 0),
+    ('1:1.0', '2.0', 1),
+    ('1.0~rc1-5', '1.0-1', -1),
+])
+def test_compare_evr(a, b, expected):
+    assert rpmvercmp.compare_evr(a, b) == expected
+    assert rpmvercmp.compare_evr(b, a) == -expected
+
+@pytest.mark.parametrize(('a', 'b', 'expected'), [
+    ((None, '1.0', None), ('0', '1.0', None), 0),
+    (('0', '1.0', '1'), ('0', '1.0', None), 1),
+    (('1', '1.0', None), (None, '2.0', '1'), 1),
+])
+def test_label_compare(a, b, expected):
+    assert rpmvercmp._label_compare(a, b) == expected
+    assert rpmvercmp.label_compare(a, b) == expected
+
+def test_evr_key():
+    evrs = ['1.0', '1.0~rc1', '1.0^git1', '1:0.5', '1.0.1', '1.0~~', '1.0~rc1~git2']
+    assert sorted(evrs, key=rpmvercmp.evr_key) == [
+        '1.0~~', '1.0~rc1~git2', '1.0~rc1', '1.0', '1.0^git1', '1.0.1', '1:0.5']
+
+def random_evrs():
+    rng = random.Random(0)
+    evrs = [str(RpmVersion(x)) for x in read_corpus('versions.txt')]
+    evrs += [''.join(rng.choice('0123456789abc.~^_-:') for _ in range(rng.randint(1, 8)))
+             for _ in range(500)]
+    return evrs
+
+def test_label_compare_differential():
+    # The pure Python comparison agrees with librpm
+    rpm = pytest.importorskip('rpm')
+    evrs = random_evrs()
+    rng = random.Random(1)
+    for _ in range(5000):
+        a = rpmvercmp.parse_evr(rng.choice(evrs))
+        b = rpmvercmp.parse_evr(rng.choice(evrs))
+        assert rpmvercmp._label_compare(a, b) == rpm.labelCompare(a, b), (a, b)
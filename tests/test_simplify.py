@@ -0,0 +1,95 @@
+import pytest
+
+from pyreq2rpm import simplify
+from pyreq2rpm.expression import Atom, With, parse_expression
+from pyreq2rpm.pyreq2rpm import RpmVersion, convert_requirement, convert_specifiers
+from pyreq2rpm.rpmvercmp import compare_evr
+from conftest import read_corpus
+
+def test_release_not_ordered():
+    # A version with a release is combined, not simplified
+    specs = [('===', 'foo-bar'), ('>=', '1')]
+    with pytest.raises(ValueError):
+        simplify.specifier_intervals('foo', specs)
+    assert simplify.simplify_specifiers('foo', specs) == convert_specifiers('foo', specs)
+
+@pytest.mark.parametrize(('requirement', 'expected'), [
+    ('foo', 'foo'),
+    ('foo>=1.0', 'foo >= 1'),
+    ('foo~=2.4.8', '(foo >= 2.4.8 with foo < 2.5)'),
+    ('babel>=1.3,!=2.0', '(babel >= 1.3 with (babel < 2 or babel > 2))'),
+    ('pyparsing>=2.0.1,!=2.0.4,!=2.1.2,!=2.1.6',
+     '(pyparsing >= 2.0.1 with (pyparsing < 2.0.4 or pyparsing > 2.0.4) with '
+     '(pyparsing < 2.1.2 or pyparsing > 2.1.2) with (pyparsing < 2.1.6 or pyparsing > 2.1.6))'),
+    ('foo>=1.0,>=1.2,<3,<2.5', '(foo >= 1.2 with foo < 2.5~~)'),
+    ('foo>=1,<=1', 'foo = 1'),
+    ('foo==1.0,>=0.5', 'foo = 1'),
+    # Exclusions outside of the range are dropped
+    ('foo>=2,!=1.5,!=3', '(foo >= 2 with (foo < 3 or foo > 3))'),
+    ('foo~=1.4,!=1.5.*', '(foo >= 1.4 with foo < 2 with (foo < 1.5~~ or foo >= 1.6))'),
+    ('foo<2,!=1.5.*,!=1.5.2', '(foo < 2~~ with (foo < 1.5~~ or foo >= 1.6))'),
+    ('foo>1,>=1', 'foo > 1.0'),
+    ('foo>=1,>1', 'foo > 1.0'),
+    ('foo!=1,!=1', '(foo < 1 or foo > 1)'),
+    ('foo>=1.0a1,<1.1', '(foo >= 1~a1 with foo < 1.1~~)'),
+    ('foo==1.0,===1.0', 'foo = 1'),
+    ('foo>=1.0,==1!2.0', 'foo = 1:2'),
+    # Invalid versions are left as convert_requirement() joins them
+    ('foo>=1.0,==1.0-x,<2', convert_requirement('foo>=1.0,==1.0-x,<2')),
+])
+def test_simplify(requirement, expected):
+    assert simplify.convert_requirement(requirement) == expected
+
+@pytest.mark.parametrize('requirement', [
+    'foo>=2,<1',
+    'foo==1.0,!=1.0',
+    'foo>1.0a1,<1.0a1',
+    # < excludes pre-releases of its version
+    'foo>=1.0a1,<1.0',
+    'foo==1.*,==2.*',
+    'foo>1,<=1',
+])
+def test_unsatisfiable(requirement):
+    with pytest.raises(simplify.Unsatisfiable):
+        simplify.convert_requirement(requirement)
+
+def satisfies(node, evr):
+    if not isinstance(node, Atom):
+        results = [satisfies(x, evr) for x in node.children]
+        return all(results) if isinstance(node, With) else any(results)
+    if node.operator is None:
+        return True
+    order = compare_evr(evr, node.evr)
+    return {'<': order < 0, '<=': order <= 0, '=': order == 0,
+            '>=': order >= 0, '>': order > 0}[node.operator]
+
+def test_simplify_corpus():
+    # Simplified dependencies accept exactly the rpm versions that the
+    # joined conversions accept.
+    candidates = set()
+    for version_id in read_corpus('versions.txt'):
+        version = RpmVersion(version_id)
+        if not version.is_legacy:
+            for evr in (str(version), str(version) + '~~', str(version) + '^post1'):
+                candidates.add(evr)
+                candidates.add(evr + '.1')
+    for requirement in read_corpus('requirements.txt'):
+        try:
+            converted = convert_requirement(requirement)
+        except ValueError:
+            continue
+        if 'Invalid version' in converted:
+            continue
+        try:
+            simplified = simplify.convert_requirement(requirement)
+        except simplify.Unsatisfiable:
+            simplified = None
+        original = parse_expression(converted)
+        for evr in candidates:
+            if simplified is None:
+                assert not satisfies(original, evr)
+                continue
+            node = parse_expression(simplified)
+            assert satisfies(node, evr) == satisfies(original, evr), (requirement, evr)
+        if simplified is not None:
+            assert simplified.count(' ') <= converted.count(' ')
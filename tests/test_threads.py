@@ -0,0 +1,85 @@
+import pytest
+
+import itertools
+import random
+import threading
+from pyreq2rpm import pyreq2rpm
+from pyreq2rpm.pyreq2rpm import convert_requirements, convert_requirements_threaded
+from conftest import read_corpus
+
+REQUIREMENTS = read_corpus('requirements.txt')
+VERSIONS = read_corpus('versions.txt')
+
+def serial_results(items):
+    return [(x.output, x.error) for x in convert_requirements(items)]
+
+def hammer(items, threads=8, rounds=20):
+    # Every thread converts the items in its own order, sharing the
+    # module caches, and records the results by position
+    results = [[None] * len(items) for _ in range(threads)]
+    barrier = threading.Barrier(threads)
+    def worker(index):
+        order = list(range(len(items)))
+        random.Random(index).shuffle(order)
+        barrier.wait()
+        for _ in range(rounds):
+            for position in order:
+                results[index][position] = pyreq2rpm._convert_item(items[position])
+    workers = [threading.Thread(target=worker, args=(x,)) for x in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+@pytest.mark.parametrize('cache_size', [None, 16, 4096])
+def test_shared_caches(cache_size):
+    items = REQUIREMENTS + [('foo', op, version) for op in ('~=', '!=', '==', '>') for version in VERSIONS]
+    expected = serial_results(items)
+    if cache_size is not None:
+        pyreq2rpm.enable_cache(cache_size)
+    try:
+        for results in hammer(items, rounds=3):
+            assert results == expected
+        if cache_size is not None:
+            info = pyreq2rpm.cache_info()
+            assert info['requirement'].currsize <= cache_size
+            assert info['requirement'].hits + info['requirement'].misses == 8 * 3 * len(REQUIREMENTS)
+    finally:
+        pyreq2rpm.disable_cache()
+
+def test_toggle_caches():
+    # Enabling, resizing and disabling caches while other threads
+    # convert must not disturb the results
+    expected = serial_results(REQUIREMENTS)
+    done = threading.Event()
+    def toggle():
+        for size in itertools.cycle([1, 8, None, 4096]):
+            if done.is_set():
+                break
+            if size is None:
+                pyreq2rpm.disable_cache()
+            else:
+                pyreq2rpm.enable_cache(size)
+                pyreq2rpm.cache_clear()
+    toggler = threading.Thread(target=toggle)
+    toggler.start()
+    try:
+        for results in hammer(REQUIREMENTS, threads=4, rounds=5):
+            assert results == expected
+    finally:
+        done.set()
+        toggler.join()
+        pyreq2rpm.disable_cache()
+
+@pytest.mark.parametrize('max_workers, chunksize', [(1, 1), (4, 7), (None, 256)])
+def test_convert_requirements_threaded(max_workers, chunksize):
+    items = REQUIREMENTS * 5 + [('foobar', '~=', '2.4.8'), ('foobar', '=>', '2'), ['foobar', '~=', '2']]
+    expected = list(convert_requirements(items))
+    assert list(convert_requirements_threaded(items, max_workers, chunksize)) == expected
+
+def test_convert_requirements_threaded_lazy():
+    items = itertools.cycle(['requests>=2.0', 'requests>=2.0,<3', 'requests[socks]'])
+    results = convert_requirements_threaded(items, max_workers=2, chunksize=2)
+    assert [x.output for x in itertools.islice(results, 4)] == [
+        'requests >= 2', '(requests < 3~~ with requests >= 2)', 'requests', 'requests >= 2']
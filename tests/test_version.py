@@ -0,0 +1,84 @@
+import pytest
+
+from pyreq2rpm import pyreq2rpm
+from pyreq2rpm.pyreq2rpm import RpmVersion
+from conftest import read_corpus
+
+VERSIONS = read_corpus('versions.txt')
+
+def render_all(backend):
+    pyreq2rpm.set_backend(backend)
+    try:
+        return [(str(RpmVersion(x)), str(RpmVersion(x).increment())
+                 if not RpmVersion(x).is_legacy() else None)
+                for x in VERSIONS]
+    finally:
+        pyreq2rpm.set_backend('builtin')
+
+@pytest.mark.filterwarnings('ignore')
+def test_builtin_matches_pkg_resources():
+    pytest.importorskip('pkg_resources')
+    assert render_all('builtin') == render_all('pkg_resources')
+
+@pytest.mark.parametrize(('version_id', 'expected'), [
+    ('2.4.8', '2.4.8'),
+    ('2.4.8.0', '2.4.8'),
+    ('v2.4.8', '2.4.8'),
+    ('1!2.0', '1:2'),
+    ('2.0.0alpha1', '2~a1'),
+    ('2.0.0.beta', '2~b0'),
+    ('2.0.0c1', '2~rc1'),
+    ('2.0.0-preview2', '2~rc2'),
+    ('2.0.0.DEV3', '2~~dev3'),
+    ('2.0.0-1', '2^post1'),
+    ('2.0.0.rev4', '2^post4'),
+    ('2.0.0+local.1', '2'),
+    ('2.0rc1.post1', '2~rc1'),
+    ('1!2.0.post1.dev2', '1:2~~dev2'),
+    ('2.10.0', '2.10'),
+    ('02.0', '2'),
+    ('dev', 'dev'),
+    ('1.0-SNAPSHOT', '1.0-SNAPSHOT'),
+])
+def test_rpm_version(version_id, expected):
+    assert str(RpmVersion(version_id)) == expected
+
+def test_rpm_version_immutable():
+    version = RpmVersion('2.4.8.0')
+    with pytest.raises(AttributeError):
+        version.pre = None
+    with pytest.raises(AttributeError):
+        version.extra = None
+    assert not hasattr(version, '__dict__')
+    assert str(version) == '2.4.8'
+    assert version.version == (2, 4, 8, 0)
+
+def test_rpm_version_increment():
+    version = RpmVersion('2.4.8b5')
+    upper = version.increment()
+    assert str(upper) == '2.4.9'
+    assert str(version) == '2.4.8~b5'
+    assert str(version.replace(version=version.version[:-1]).increment()) == '2.5'
+    with pytest.raises(TypeError):
+        version.replace(local='abc')
+
+def test_rpm_version_value():
+    assert RpmVersion('2.4.8') == RpmVersion('v2.4.8')
+    assert RpmVersion('2.4.8') != RpmVersion('2.4.8.0')
+    assert hash(RpmVersion('1!2.0rc1')) == hash(RpmVersion('1!2.0c1'))
+    assert hash(RpmVersion('2.4.8')) == hash(RpmVersion('v2.4.8'))
+    assert len({RpmVersion('2.0'), RpmVersion('2.0'), RpmVersion('dev')}) == 2
+    assert str(RpmVersion('2.4.8')) is str(RpmVersion('2.4.8.0'))
+
+def test_rpm_version_pickle():
+    import pickle
+    for version_id in ('2.4.8', '2.4.8b5', '1!2.0.post1', 'dev'):
+        version = RpmVersion(version_id)
+        assert pickle.loads(pickle.dumps(version)) == version
+
+def test_rpm_version_shared():
+    pyreq2rpm.enable_cache()
+    try:
+        assert RpmVersion('2.4.8b5') is RpmVersion('2.4.8b5')
+    finally:
+        pyreq2rpm.disable_cache()
@@ -0,0 +1,98 @@
+import pytest
+
+from pyreq2rpm import cli, parallel, pyreq2rpm, versiontable
+from pyreq2rpm.pyreq2rpm import OPERATORS, convert
+from pyreq2rpm.versiontable import FLAG_LEGACY, FLAG_QUALIFIED, InvalidTable, VersionTable, build_table
+from conftest import read_corpus
+
+VERSIONS = read_corpus('versions.txt') + ['1!2.0', '2.0.post1.dev3', 'dev', '1.0-beta', '2.0rc1.*', '1.4.2']
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('table') / 'versions.table')
+    build_table(VERSIONS + VERSIONS, path)
+    with VersionTable(path) as table:
+        yield table
+
+def expected(operator, version_id):
+    try:
+        return OPERATORS[operator]('foo', operator, version_id)
+    except Exception as e:
+        return type(e)
+
+def test_lookup(table):
+    assert len(table) <= len(set(VERSIONS))
+    rendered, compatible, increment, flags = table.lookup('2.0.post1.dev3')
+    assert rendered == str(pyreq2rpm.RpmVersion('2.0.post1.dev3'))
+    assert (compatible, increment, flags) == ('3', '2.1', FLAG_QUALIFIED)
+    rendered, compatible, increment, flags = table.lookup('1.4.2')
+    assert (rendered, compatible, increment, flags) == ('1.4.2', '1.5', '1.4.3', 0)
+    assert table.lookup('1!2.0')[:3] == ('1:2', '1:3', '1:2.1')
+    assert table.lookup('dev')[1:] == ('', '', FLAG_LEGACY)
+    assert table.lookup('not-in-table') is None
+
+@pytest.mark.parametrize('operator', sorted(OPERATORS))
+@pytest.mark.parametrize('wildcard', ['', '.*'])
+def test_convert(table, operator, wildcard):
+    for version_id in VERSIONS:
+        version_id += wildcard
+        converted = table.convert('foo', operator, version_id)
+        if converted is not None:
+            assert converted == expected(operator, version_id), version_id
+
+def test_invalid_operator(table):
+    assert table.convert('foo', '=>', '1.0b1') is None
+
+def test_set_version_table(table):
+    specifiers = [(op, v) for op in OPERATORS for v in VERSIONS if not v.endswith('.*')]
+    def convert_all():
+        results = []
+        for operator, version_id in specifiers:
+            try:
+                results.append(convert('foo', operator, version_id))
+            except ValueError as e:
+                results.append(type(e))
+        return results
+    without_table = convert_all()
+    pyreq2rpm.set_version_table(table)
+    try:
+        assert convert_all() == without_table
+    finally:
+        pyreq2rpm.set_version_table(None)
+
+def test_invalid_table(tmp_path):
+    path = tmp_path / 'bad.table'
+    path.write_bytes(b'not a version table at all')
+    with pytest.raises(InvalidTable):
+        VersionTable(str(path))
+
+def test_convert_tree_version_table(tmp_path, table):
+    for index, version_id in enumerate(['1.0b1', '2.0.post1', '3.0rc2']):
+        dist_info = tmp_path / 'site' / 'pkg{}-1.0.dist-info'.format(index)
+        dist_info.mkdir(parents=True)
+        (dist_info / 'METADATA').write_text('Requires-Dist: dep~={}\n'.format(version_id))
+    path = str(tmp_path / 'versions.table')
+    build_table(['1.0b1', '2.0.post1', '3.0rc2'], path)
+    assert parallel.convert_tree(str(tmp_path / 'site'), workers=2, version_table=path) == \
+        parallel.convert_tree(str(tmp_path / 'site'), workers=1)
+
+def test_main_version_table(tmp_path, capsys):
+    dist_info = tmp_path / 'site' / 'pkg-1.0.dist-info'
+    dist_info.mkdir(parents=True)
+    (dist_info / 'METADATA').write_text('Requires-Dist: dep~=2.0.post1\nRequires-Dist: other!=1.0b1\n')
+    versions = tmp_path / 'versions.txt'
+    versions.write_text('1.0b1\n\n2.0.post1\n')
+    path = str(tmp_path / 'versions.table')
+    assert versiontable.main([path, str(versions)]) == 0
+    with VersionTable(path) as table:
+        assert len(table) == 2
+    assert cli.main([str(dist_info)]) == 0
+    expected = capsys.readouterr().out
+    for arguments in ([str(dist_info)], ['--tree', str(tmp_path / 'site'), '--jobs', '2']):
+        assert cli.main(['--version-table', path] + arguments) == 0
+        assert capsys.readouterr().out == expected
+        # The table is only used for the one run
+        assert pyreq2rpm._version_table is None
+    with pytest.raises(SystemExit):
+        cli.main(['--version-table', str(versions), str(dist_info)])
+